@@ -6,15 +6,46 @@
 #                     '$request_time';
 import sys
 import os
+import shutil
 import re
 import gzip
+import glob
+import zlib
+import mmap
+import queue
+import threading
 import logging
 import datetime
 import json
+import time
 import argparse
+import heapq
+import random
+import asyncio
+import signal
+import cProfile
+import tracemalloc
+import tempfile
+import hashlib
+from array import array
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
 from string import Template
 from collections import defaultdict
-from statistics import median
+from functools import partial
+from itertools import chain, islice, groupby, count as sequence_count
+from operator import itemgetter
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 
 def global_exception_handler(*_):
@@ -23,6 +54,58 @@ def global_exception_handler(*_):
 
 sys.excepthook = global_exception_handler
 
+
+class ParseErrorBudgetExceeded(ValueError):
+    """Share of not parsed log lines after warm-up window is over error budget"""
+
+
+STAT_MODE_EXACT = 'exact'
+STAT_MODE_SKETCH = 'sketch'
+URL_QUERY_KEEP = 'keep'
+URL_QUERY_STRIP = 'strip'
+URL_QUERY_WHITELIST = 'whitelist'
+LOG_PARSER_REGEXP = 'regexp'
+LOG_PARSER_LOG_FORMAT = 'log_format'
+REPORT_FIELDS = ('request', 'request_time')
+TIME_BUCKET_FIELDS = REPORT_FIELDS + ('time_local',)
+TIME_BUCKET_UNKNOWN = 'unknown'
+PARSE_ERROR_SAMPLE_LENGTH = 500
+MEDIAN_SELECT_MIN_COUNT = 256
+MEDIAN_WINDOW_MIN_COUNT = 32768
+FLOAT_FIELDS = ('request_time',)
+CHECKPOINT_VERSION = 3
+CHECKPOINT_HEAD_SIZE = 4096
+TABLE_JSON_PLACEHOLDER = '\0table_json\0'
+REPORT_CHUNKS_VERSION = 2
+REPORT_DATA_CALLBACK = 'reportDataLoaded'
+REPORT_DATA_SUFFIX = '.data'
+REPORT_DATA_DIR_REGEXP = re.compile(r'"data_dir": ("(?:[^"\\]|\\.)*")')
+JSON_GZIP_COMPRESS_LEVEL = 6
+AGGREGATE_STORE_VERSION = 1
+MANIFEST_VERSION = 1
+PARTIAL_AGGREGATE_VERSION = 1
+AGGREGATE_BACKEND_PYTHON = 'python'
+AGGREGATE_BACKEND_NUMPY = 'numpy'
+PARSED_CACHE_MAGIC = b'LAPC'
+PARSED_CACHE_VERSION = 1
+PARSED_CACHE_STATUS_MAX = 0xFFFF
+PARSED_CACHE_SUFFIX = '.columns'
+MANIFEST_RACY_NS = 2 * 10 ** 9
+RUN_MODE_DAILY = 'daily'
+RUN_MODE_BACKFILL = 'backfill'
+RUN_MODE_PERIOD = 'period'
+RUN_MODE_INCREMENTAL = 'incremental'
+RUN_MODE_DAEMON = 'daemon'
+RUN_MODE_MAP = 'map'
+RUN_MODE_REDUCE = 'reduce'
+RUN_STATUS_OK = 'ok'
+RUN_STATUS_IDLE = 'idle'
+RUN_STATUS_FAILED = 'failed'
+METRICS_PREFIX = 'log_analyzer_'
+PROFILE_TOP_ALLOCATIONS = 20
+PROFILE_FILEDATE_FORMAT = '%Y%m%d-%H%M%S'
+PROFILE_RUN_COUNTER_FILENAME = 'profile_run_counter.json'
+
 config = {
     "REPORT_SIZE": 1000,
     "REPORT_DIR": "./data/reports",
@@ -39,23 +122,336 @@ def main():
                         filemode="a",
                         format="%(asctime)s %(levelname)s %(message)s")
 
-    is_launch, log_filename, report_filename = get_source_destination_filenames(config_dict)
+    run_metrics = RunMetrics()
+    if is_profiled_run(config_dict):
+        run_metrics.profiler = RunProfiler(config_dict['profile_top_allocations'])
+        run_metrics.profiler.start()
+    try:
+        run_analyzer(config_dict, run_metrics)
+    except BaseException:
+        run_metrics.status = RUN_STATUS_FAILED
+        raise
+    finally:
+        if run_metrics.profiler is not None:
+            run_metrics.profiler.stop()
+            store_run_profile(config_dict, run_metrics, run_metrics.profiler)
+        if config_dict['is_launch']:
+            store_run_metrics(config_dict, run_metrics)
+
+
+def run_analyzer(config_dict, run_metrics):
+    """Run analyzer mode selected by settings, stages are recorded to run_metrics"""
+    if config_dict['map_log_path'] is not None:
+        run_metrics.mode = RUN_MODE_MAP
+        if config_dict['is_launch']:
+            map_partial(config_dict, config_dict['map_log_path'],
+                        config_dict['map_reduce_output_path'],
+                        *(config_dict['map_byte_range'] or (0, None)),
+                        run_metrics=run_metrics)
+        return
+
+    if config_dict['reduce_partial_paths'] is not None:
+        run_metrics.mode = RUN_MODE_REDUCE
+        if config_dict['is_launch']:
+            reduce_partials(config_dict, config_dict['reduce_partial_paths'],
+                            config_dict['map_reduce_output_path'], run_metrics)
+        return
+
+    if config_dict['daemon']:
+        run_metrics.mode = RUN_MODE_DAEMON
+        if config_dict['is_launch']:
+            asyncio.run(LogWatcher(config_dict, run_metrics).run())
+        return
+
+    if config_dict['incremental']:
+        run_metrics.mode = RUN_MODE_INCREMENTAL
+        if config_dict['is_launch']:
+            try:
+                incremental_report(config_dict, run_metrics)
+            except (FileNotFoundError, PermissionError):
+                run_metrics.status = RUN_STATUS_FAILED
+                logging.exception('File access error')
+        return
+
+    if config_dict['backfill']:
+        run_metrics.mode = RUN_MODE_BACKFILL
+        if config_dict['is_launch']:
+            backfill_reports(config_dict, run_metrics)
+        return
+
+    if config_dict['period_report'] is not None:
+        run_metrics.mode = RUN_MODE_PERIOD
+        if config_dict['is_launch']:
+            try:
+                period_report(config_dict, *config_dict['period_report'],
+                              run_metrics=run_metrics)
+            except (FileNotFoundError, PermissionError):
+                run_metrics.status = RUN_STATUS_FAILED
+                logging.exception('File access error')
+        return
+
+    with run_metrics.stage('discovery'):
+        is_launch, log_filename, report_filename = get_source_destination_filenames(config_dict)
     if is_launch:
         try:
+            build_report(config_dict, log_filename, report_filename, run_metrics)
+        except (FileNotFoundError, PermissionError):
+            run_metrics.status = RUN_STATUS_FAILED
+            logging.exception('File access error')
+        except ParseErrorBudgetExceeded:
+            run_metrics.status = RUN_STATUS_FAILED
+            logging.exception('Log rejected:{}'.format(log_filename))
+    else:
+        run_metrics.status = RUN_STATUS_IDLE
+
+
+def build_report(config_dict, log_filename, report_filename, run_metrics=None):
+    """Parse log file and render its report
+
+    config_dict -- dictionary with application settings
+    log_filename -- log file path or tuple of logs paths of one date from several hosts
+    run_metrics -- RunMetrics for stages timings and counters (optional)
+    """
+    if run_metrics is None:
+        run_metrics = RunMetrics()
+    log_filenames = get_log_filenames(log_filename)
+    log_filename = log_filenames[0]
+    run_metrics.add('bytes_read', sum(map(os.path.getsize, log_filenames)))
+    time_bucket_minutes = config_dict['report_time_bucket_minutes']
+    if len(log_filenames) > 1:
+        with run_metrics.stage('parse_aggregate'):
+            report_aggregate = hosts_aggregate(config_dict, log_filenames)
+        run_metrics.set('log_files', len(log_filenames))
+        log_parse_statistic(report_aggregate.lines_count,
+                            report_aggregate.parse_errors_count,
+                            config_dict['log_parse_error_threshold'])
+    elif config_dict['parsed_cache'] and not time_bucket_minutes:
+        parsed_columns = load_parsed_columns(config_dict, log_filename, run_metrics)
+        log_parse_statistic(parsed_columns.lines_count,
+                            parsed_columns.parse_errors_count,
+                            config_dict['log_parse_error_threshold'])
+        with run_metrics.stage('aggregate'):
+            report_aggregate = create_report_aggregate(get_aggregate_options(config_dict),
+                                                       backend=config_dict['aggregate_backend'])
+            report_aggregate.update(parsed_columns)
+    elif config_dict['parallel_workers'] > 1 and not log_filename.endswith('.gz'):
+        with run_metrics.stage('parse_aggregate'):
+            report_aggregate = parallel_aggregate(log_filename,
+                                                  config_dict['log_line_parser'],
+                                                  config_dict['parallel_workers'],
+                                                  get_aggregate_options(config_dict),
+                                                  config_dict['log_mmap'],
+                                                  time_bucket_minutes,
+                                                  get_parse_error_options(config_dict))
+        log_parse_statistic(report_aggregate.lines_count,
+                            report_aggregate.parse_errors_count,
+                            config_dict['log_parse_error_threshold'])
+    else:
+        with run_metrics.stage('parse_aggregate'):
             with LogRecordGen(log_filename,
-                              config_dict['log_line_regexp'],
-                              config_dict['log_parse_error_threshold']) as log_record_gen:
-                log_json = json.dumps(create_report_dict(log_record_gen,
-                                                         config_dict['report_size'])
-                                      )
+                              config_dict['log_line_parser'],
+                              config_dict['log_parse_error_threshold'],
+                              fields=get_report_fields(time_bucket_minutes),
+                              gzip_pipeline=config_dict['gzip_pipeline'],
+                              use_mmap=config_dict['log_mmap'],
+                              **get_parse_error_options(config_dict)) as log_record_gen:
+                report_aggregate = create_report_aggregate(get_aggregate_options(config_dict),
+                                                           time_bucket_minutes,
+                                                           config_dict['aggregate_backend'])
+                report_aggregate.update(log_record_gen)
+        if isinstance(log_record_gen.file_descr, PipelinedGzipReader):
+            run_metrics.add_stage_seconds('decompress',
+                                          log_record_gen.file_descr.decompress_seconds)
+    run_metrics.add_aggregate(report_aggregate)
+    with run_metrics.stage('sort'):
+        url_statistic_list = report_aggregate.report_list(config_dict['report_size'])
+    with run_metrics.stage('render'):
+        write_report(config_dict, report_filename, url_statistic_list)
 
-            with open(config_dict['report_template_path'], mode='r', encoding='utf-8') as rtf:
-                with open(report_filename, mode='w', encoding='utf-8') as rof:
-                    for data in rtf:
-                        rof.write(Template(data).safe_substitute(table_json=log_json))
+    if config_dict['aggregate_store_dir']:
+        log_filedate = get_file_date(log_filename,
+                                     config_dict['log_filename_regexp'],
+                                     config_dict['log_filedate_format'])
+        if log_filedate is not None:
+            with run_metrics.stage('store_aggregate'):
+                store_day_aggregate(config_dict['aggregate_store_dir'], log_filedate,
+                                    report_aggregate.to_sketch_aggregate(config_dict['sketch_k']))
+    run_metrics.add('reports_created', 1)
+    return report_filename
+
+
+def split_report_template(report_template_path):
+    """Return list of template text parts around $table_json placeholders"""
+    with open(report_template_path, mode='r', encoding='utf-8') as rtf:
+        template_text = rtf.read()
+    return Template(template_text).safe_substitute(
+        table_json=TABLE_JSON_PLACEHOLDER).split(TABLE_JSON_PLACEHOLDER)
+
+
+@contextmanager
+def atomic_write(filename, mode='w', opener=open, **open_kwargs):
+    """Open temporary file for writing and rename it to filename when block succeeds
+
+    Partial file is never picked up as ready one: temporary file is removed when
+    block raises, opener (open, gzip.open) gets mode and open_kwargs. Temporary file
+    name is unique, so processes writing the same file do not clobber each other.
+    New file gets mode by current umask, replaced file keeps its mode.
+    """
+    dirname = os.path.dirname(os.path.abspath(filename))
+    os.makedirs(dirname, exist_ok=True)
+    while True:
+        temp_filename = os.path.join(dirname, '{}.{}.tmp'.format(os.path.basename(filename),
+                                                                 os.urandom(6).hex()))
+        try:
+            os.close(os.open(temp_filename, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666))
+            break
+        except FileExistsError:
+            continue
+    try:
+        if os.path.exists(filename):
+            shutil.copymode(filename, temp_filename)
+        with opener(temp_filename, mode=mode, **open_kwargs) as temp_file:
+            yield temp_file
+        os.replace(temp_filename, filename)
+    except BaseException:
+        if os.path.exists(temp_filename):
+            os.remove(temp_filename)
+        raise
+
+
+def render_report(report_template_path, report_filename, url_statistic_list):
+    """Write report rows into template, rows are encoded to JSON one by one"""
+    template_parts = split_report_template(report_template_path)
+    if len(template_parts) > 2:
+        url_statistic_list = list(url_statistic_list)
+    json_encoder = json.JSONEncoder()
+    with atomic_write(report_filename, encoding='utf-8') as rof:
+        rof.write(template_parts[0])
+        for template_part in template_parts[1:]:
+            rof.write('[')
+            for record_no, record_dict in enumerate(url_statistic_list):
+                if record_no:
+                    rof.write(', ')
+                rof.write(json_encoder.encode(record_dict))
+            rof.write(']')
+            rof.write(template_part)
+
+
+def get_report_columns(url_statistic_list):
+    """Return report columns in order of report template: last sorted column, then others"""
+    columns = sorted(url_statistic_list[0]) if url_statistic_list else []
+    return columns[-1:] + columns[:-1]
+
+
+def get_column_sort_key(value):
+    """Return sort key of report cell, numbers and percents are compared as numbers"""
+    if isinstance(value, (int, float)):
+        return 0, value, ''
+    try:
+        return 0, float(str(value).rstrip('%')), ''
+    except ValueError:
+        return 1, 0, '' if value is None else str(value)
+
+
+def write_report_data_script(filename, data):
+    """Write JSON data as script calling REPORT_DATA_CALLBACK with file name and data
+
+    Report loads data files by script tags, browsers block fetch of files for reports
+    opened from file:// but run local scripts.
+    """
+    write_text_atomic(filename, '{}({},{});\n'.format(
+        REPORT_DATA_CALLBACK, json.dumps(os.path.basename(filename)),
+        json.dumps(data, separators=(',', ':'))))
 
-        except (FileNotFoundError, PermissionError):
-            logging.exception('File access error')
+
+def get_report_data_path(report_filename):
+    """Return path prefix of chunked report data directories, they are next to report"""
+    return os.path.join(os.path.dirname(os.path.abspath(report_filename)),
+                        os.path.splitext(os.path.basename(report_filename))[0]
+                        + REPORT_DATA_SUFFIX)
+
+
+def read_report_data_path(report_filename):
+    """Return data directory path referenced by index of existing report or None"""
+    try:
+        with open(report_filename, mode='r', encoding='utf-8') as report_file:
+            data_dir_match = REPORT_DATA_DIR_REGEXP.search(report_file.read())
+    except FileNotFoundError:
+        return None
+    if data_dir_match is None:
+        return None
+    data_dirname = json.loads(data_dir_match.group(1))
+    if not data_dirname or os.path.basename(data_dirname) != data_dirname:
+        return None
+    return os.path.join(os.path.dirname(os.path.abspath(report_filename)), data_dirname)
+
+
+def render_chunked_report(report_template_path, report_filename, url_statistic_list, chunk_rows):
+    """Write report rows as chunks of script data files to data directory next to report
+
+    Data directory has chunks of chunk_rows rows (lists of cells in columns order) and
+    ascending rows order of every column, so template loads only visible rows and sorts
+    without loading all of them. Report index (columns, rows and files names) is written
+    into template $report_index. Every run writes new uniquely named data directory,
+    data directory of replaced report is removed after report is written.
+    """
+    url_statistic_list = list(url_statistic_list)
+    columns = get_report_columns(url_statistic_list)
+    previous_data_path = read_report_data_path(report_filename)
+    report_dir = os.path.dirname(os.path.abspath(report_filename))
+    os.makedirs(report_dir, exist_ok=True)
+    data_path = tempfile.mkdtemp(
+        dir=report_dir, prefix=os.path.basename(get_report_data_path(report_filename)) + '.')
+    index = {
+        'version': REPORT_CHUNKS_VERSION,
+        'data_dir': os.path.basename(data_path),
+        'columns': columns,
+        'rows': len(url_statistic_list),
+        'chunk_rows': chunk_rows,
+        'chunks': [],
+        'orderings': {},
+    }
+    try:
+        # mkdtemp creates directory readable by owner only
+        shutil.copymode(report_dir, data_path)
+        for chunk_no, chunk_start in enumerate(range(0, len(url_statistic_list), chunk_rows)):
+            chunk_filename = 'chunk-{:05d}.js'.format(chunk_no)
+            write_report_data_script(os.path.join(data_path, chunk_filename),
+                                     [[url_statistic.get(column) for column in columns]
+                                      for url_statistic in
+                                      url_statistic_list[chunk_start:chunk_start + chunk_rows]])
+            index['chunks'].append(chunk_filename)
+        for column_no, column in enumerate(columns):
+            order_filename = 'order-{:02d}.js'.format(column_no)
+            write_report_data_script(os.path.join(data_path, order_filename),
+                                     sorted(range(len(url_statistic_list)),
+                                            key=lambda row_no: get_column_sort_key(
+                                                url_statistic_list[row_no].get(column))))
+            index['orderings'][column] = order_filename
+        with open(report_template_path, mode='r', encoding='utf-8') as rtf:
+            template_text = rtf.read()
+        write_text_atomic(report_filename, Template(template_text).safe_substitute(
+            report_index=json.dumps(index)))
+    except BaseException:
+        shutil.rmtree(data_path, ignore_errors=True)
+        raise
+    if previous_data_path is not None:
+        shutil.rmtree(previous_data_path, ignore_errors=True)
+
+
+def write_report(config_dict, report_filename, url_statistic_list):
+    """Render report inline or with chunked rows data when report_chunk_rows is set
+
+    Data directory of earlier chunked report is removed after inline report is written
+    """
+    if config_dict['report_chunk_rows']:
+        render_chunked_report(config_dict['report_chunked_template_path'], report_filename,
+                              url_statistic_list, config_dict['report_chunk_rows'])
+    else:
+        previous_data_path = read_report_data_path(report_filename)
+        render_report(config_dict['report_template_path'], report_filename, url_statistic_list)
+        if previous_data_path is not None:
+            shutil.rmtree(previous_data_path, ignore_errors=True)
 
 
 def init_analyzer(default_config=None):
@@ -65,6 +461,8 @@ def init_analyzer(default_config=None):
         "report_size": default_config['REPORT_SIZE'],
         "report_dir": os.path.abspath(default_config['REPORT_DIR']),
         "report_template_path": os.path.abspath(default_config['REPORT_TEMPLATE_PATH']),
+        "report_chunk_rows": 0,
+        "report_chunked_template_path": os.path.abspath('./data/templates/report_chunked.html'),
         "report_filename_template": r"^report-(?P<file_date>[0-9]{4}\.[0-9]{2}\.[0-9]{2})\.html$",
         "report_filename_root": "report-{}.html",
         "report_filedate_format": "%Y.%m.%d",
@@ -82,9 +480,60 @@ def init_analyzer(default_config=None):
                              r'\"(?P<http_user_agent>[^\"]+)\"\s+'
                              r'\"(?P<http_x_forwarded_for>[^\"]+)\"\s+'
                              r'\"(?P<http_x_request_id>[^\"]+)\"\s+'
-                             r'\"(?P<http_rb_user>[^\"]+)\"\s+'
+                             r'\"(?P<http_x_rb_user>[^\"]+)\"\s+'
                              r'(?P<request_time>\S+)',
+        "log_format": '$remote_addr  $remote_user $http_x_real_ip [$time_local] "$request" '
+                      '$status $body_bytes_sent "$http_referer" '
+                      '"$http_user_agent" "$http_x_forwarded_for" '
+                      '"$http_X_REQUEST_ID" "$http_X_RB_USER" '
+                      '$request_time',
+        "log_parser": LOG_PARSER_REGEXP,
         "log_parse_error_threshold": 0.01,
+        "log_parse_error_budget": 0.5,
+        "log_parse_error_warmup_lines": 10000,
+        "log_parse_errors_lines_limit": 1000,
+        "log_parse_errors_sample_size": 10,
+        "parallel_workers": 1,
+        "gzip_pipeline": True,
+        "log_mmap": True,
+        "parsed_cache": False,
+        "parsed_cache_dir": "",
+        "report_stat_mode": STAT_MODE_EXACT,
+        "aggregate_backend": AGGREGATE_BACKEND_PYTHON,
+        "report_time_bucket_minutes": 0,
+        "sketch_k": 200,
+        "report_top_urls_capacity": 0,
+        "url_normalize": False,
+        "url_replace_ids": True,
+        "url_query_mode": URL_QUERY_KEEP,
+        "url_query_whitelist": [],
+        "url_rules": [],
+        "backfill": False,
+        "backfill_workers": os.cpu_count() or 1,
+        "log_hosts_workers": os.cpu_count() or 1,
+        "log_hosts_grace_seconds": 3600,
+        "aggregate_store_dir": os.path.abspath('./data/aggregates'),
+        "period_report": None,
+        "period_report_filename_root": "report-{}-{}.html",
+        "incremental": False,
+        "incremental_log_path": os.path.join(os.path.abspath(default_config['LOG_DIR']),
+                                             'nginx-access-ui.log'),
+        "incremental_report_filename_root": "report-{}.intraday.html",
+        "checkpoint_path": os.path.join(os.path.abspath(default_config['LOG_DIR']),
+                                        '.incremental_checkpoint.json.gz'),
+        "discovery_manifest_path": os.path.abspath('./data/discovery_manifest.json.gz'),
+        "map_log_path": None,
+        "map_byte_range": None,
+        "reduce_partial_paths": None,
+        "map_reduce_output_path": None,
+        "daemon": False,
+        "daemon_poll_interval": 2.0,
+        "daemon_settle_seconds": 10.0,
+        "daemon_status_path": os.path.abspath('./data/daemon_status.json'),
+        "metrics_path": os.path.abspath('./data/metrics/analyzer_metrics.json'),
+        "metrics_prometheus_path": None,
+        "profile_every_nth_run": 0,
+        "profile_top_allocations": PROFILE_TOP_ALLOCATIONS,
         "internal_log_path": os.path.abspath(default_config['INTERNAL_LOG_PATH'])
     }
 
@@ -102,6 +551,68 @@ def init_analyzer(default_config=None):
                                  '(Makes sense when required export config to file',
                             action='store_false',
                             default=True)
+    parser_cli.add_argument('--workers', dest='parallel_workers',
+                            help='Parse plain log file by byte-range chunks '
+                                 'in N worker processes',
+                            action='store',
+                            type=int,
+                            default=None)
+    parser_cli.add_argument('--backfill', dest='backfill',
+                            help='Create reports for every log in log directory '
+                                 'which has no report yet',
+                            action='store_true',
+                            default=None)
+    parser_cli.add_argument('--period-report', dest='period_report',
+                            help='Create report for dates range (YYYY-MM-DD YYYY-MM-DD) '
+                                 'by merging stored daily aggregates',
+                            action='store',
+                            nargs=2,
+                            metavar=('DATE_FROM', 'DATE_TO'),
+                            default=None)
+    parser_cli.add_argument('--incremental', dest='incremental',
+                            help='Parse only new lines of growing log since last run '
+                                 'and refresh intraday report',
+                            action='store_true',
+                            default=None)
+    parser_cli.add_argument('--daemon', dest='daemon',
+                            help='Watch log directory and create report for every new log '
+                                 'as soon as its rotation completes',
+                            action='store_true',
+                            default=None)
+    parser_cli.add_argument('--map', dest='map_log_path',
+                            help='Aggregate log file (or its byte range) and store partial '
+                                 'aggregate to --output path',
+                            action='store',
+                            metavar='LOG_FILENAME',
+                            default=None)
+    parser_cli.add_argument('--byte-range', dest='map_byte_range',
+                            help='Byte range of plain log for --map, bounds are moved '
+                                 'to the beginning of lines',
+                            action='store',
+                            nargs=2,
+                            type=int,
+                            metavar=('START', 'END'),
+                            default=None)
+    parser_cli.add_argument('--reduce', dest='reduce_partial_paths',
+                            help='Merge partial aggregates and render report to --output path '
+                                 '(default - report of partials log date)',
+                            action='store',
+                            nargs='+',
+                            metavar='PARTIAL_FILENAME',
+                            default=None)
+    parser_cli.add_argument('--output', dest='map_reduce_output_path',
+                            help='Partial aggregate path for --map, report path for --reduce',
+                            action='store',
+                            default=None)
+    parser_cli.add_argument('--profile', dest='profile_every_nth_run',
+                            help='Profile run with cProfile and tracemalloc, profile is stored '
+                                 'next to internal log. With N profile only every Nth run',
+                            action='store',
+                            nargs='?',
+                            type=int,
+                            const=1,
+                            metavar='N',
+                            default=None)
     args = parser_cli.parse_args()
 
     if args.config_import_filename:
@@ -129,6 +640,25 @@ def init_analyzer(default_config=None):
             raise
 
     current_config.update({'is_launch': args.is_launch})
+    if args.parallel_workers is not None:
+        current_config.update({'parallel_workers': args.parallel_workers})
+    if args.backfill is not None:
+        current_config.update({'backfill': args.backfill})
+    if args.period_report is not None:
+        current_config.update({'period_report': args.period_report})
+    if args.incremental is not None:
+        current_config.update({'incremental': args.incremental})
+    if args.daemon is not None:
+        current_config.update({'daemon': args.daemon})
+    if args.profile_every_nth_run is not None:
+        current_config.update({'profile_every_nth_run': args.profile_every_nth_run})
+    for config_key in ('map_log_path', 'map_byte_range',
+                       'reduce_partial_paths', 'map_reduce_output_path'):
+        if getattr(args, config_key) is not None:
+            current_config.update({config_key: getattr(args, config_key)})
+    if current_config['map_log_path'] is not None \
+            and current_config['map_reduce_output_path'] is None:
+        parser_cli.error('--map (map_log_path) requires --output (map_reduce_output_path)')
 
     current_config.update({'report_filename_regexp': re.compile(
         current_config['report_filename_template'])})
@@ -136,47 +666,199 @@ def init_analyzer(default_config=None):
         current_config['log_filename_template'])})
     current_config.update({'log_line_regexp': re.compile(
         current_config['log_line_template'])})
+    if current_config['log_parser'] == LOG_PARSER_LOG_FORMAT:
+        current_config.update({'log_line_parser': LogFormatParser(
+            current_config['log_format'], current_config['log_line_regexp'])})
+    else:
+        current_config.update({'log_line_parser': current_config['log_line_regexp']})
     current_config.update({'internal_log_path': Template(current_config['internal_log_path']).
                           safe_substitute(date=datetime.datetime.strftime(datetime.date.today(),
                                                                           '%Y-%m-%d'))})
     return current_config
 
 
+def get_file_date(filename, filename_regexp, date_format):
+    """Return date from file name (path basename) matched by regexp or None"""
+    file_match = filename_regexp.search(os.path.basename(filename))
+    if file_match is None:
+        return None
+    try:
+        return datetime.datetime.strptime(file_match.group('file_date'), date_format).date()
+    except ValueError:
+        logging.error('File date parsing error:' + filename)
+        return None
+
+
 def gen_match_files(file_path, filename_regexp, date_format):
-    for filename in os.listdir(file_path):
-        if os.path.isfile(os.path.join(file_path, filename)):
-            file_match = filename_regexp.search(filename)
-            if file_match is not None:
-                try:
-                    file_date = datetime.datetime.strptime(file_match.group('file_date'),
-                                                           date_format).date()
-                except ValueError:
-                    logging.error('File date parsing error:' + filename)
-                else:
-                    yield os.path.abspath(os.path.join(file_path, filename)), file_date
+    with os.scandir(file_path) as dir_entries:
+        for dir_entry in dir_entries:
+            if dir_entry.is_file():
+                file_date = get_file_date(dir_entry.name, filename_regexp, date_format)
+                if file_date is not None:
+                    yield os.path.abspath(dir_entry.path), file_date
+
+
+def get_last_match(matched_files):
+    """Return (filename, date) with max date in one pass or (None, None)"""
+    return max(matched_files, key=itemgetter(1), default=(None, None))
 
 
 def get_last_filename(path_dir, filename_regexp, file_date_suffix):
-    try:
-        return (sorted(((file[0], file[1])
-                        for file in gen_match_files(path_dir, filename_regexp, file_date_suffix)),
-                       key=lambda file: file[1], reverse=True)[0])
-    except IndexError:
-        return None, None
+    return get_last_match(gen_match_files(path_dir, filename_regexp, file_date_suffix))
+
+
+class DiscoveryManifest:
+    """Persisted lists of matched files of log and report directories
+
+    Directory is listed again only when its mtime changed, then dates are parsed
+    only for new file names. Directory mtime which is too recent is not stored,
+    because files added within the same mtime tick would be missed.
+
+    manifest_path -- gzipped json manifest path, None keeps manifest in memory only
+    """
+    def __init__(self, manifest_path):
+        self.manifest_path = manifest_path
+        self.directories = self.load(manifest_path) if manifest_path else dict()
+        self.is_changed = False
+
+    @staticmethod
+    def load(manifest_path):
+        try:
+            manifest = load_json_gzip(manifest_path)
+        except FileNotFoundError:
+            return dict()
+        except (OSError, ValueError):
+            logging.exception('Discovery manifest read error, directories will be listed')
+            return dict()
+        if manifest.get('version') != MANIFEST_VERSION:
+            return dict()
+        return manifest['directories']
+
+    def store(self):
+        if self.manifest_path and self.is_changed:
+            dump_json_gzip(self.manifest_path, {'version': MANIFEST_VERSION,
+                                                'directories': self.directories})
+            self.is_changed = False
+
+    def match_files(self, file_path, filename_regexp, date_format):
+        """Return list of (filename, date) for directory files matched by regexp"""
+        file_path = os.path.abspath(file_path)
+        dir_mtime_ns = os.stat(file_path).st_mtime_ns
+        match_key = [filename_regexp.pattern, date_format]
+        directory = self.directories.get(file_path)
+        if directory is None or directory['match'] != match_key:
+            directory = {'match': match_key, 'mtime_ns': None, 'files': dict()}
+        if directory['mtime_ns'] != dir_mtime_ns:
+            known_files = directory['files']
+            files = dict()
+            with os.scandir(file_path) as dir_entries:
+                for dir_entry in dir_entries:
+                    if dir_entry.name in known_files:
+                        files[dir_entry.name] = known_files[dir_entry.name]
+                    elif dir_entry.is_file():
+                        file_date = get_file_date(dir_entry.name, filename_regexp, date_format)
+                        if file_date is not None:
+                            files[dir_entry.name] = file_date.isoformat()
+            if time.time_ns() - dir_mtime_ns < MANIFEST_RACY_NS:
+                dir_mtime_ns = None
+            directory = {'match': match_key, 'mtime_ns': dir_mtime_ns, 'files': files}
+            self.directories[file_path] = directory
+            self.is_changed = True
+        return [(os.path.join(file_path, filename), datetime.date.fromisoformat(file_date))
+                for filename, file_date in directory['files'].items()]
+
+
+def get_log_dirs(config_dict):
+    """Return list of log directories, log_dir is path, glob or list of them (several hosts)"""
+    log_dir = config_dict['log_dir']
+    log_dir_list = list()
+    for dir_pattern in [log_dir] if isinstance(log_dir, str) else log_dir:
+        if glob.has_magic(dir_pattern):
+            log_dir_list.extend(sorted(dir_path for dir_path in glob.glob(dir_pattern)
+                                       if os.path.isdir(dir_path)))
+        else:
+            log_dir_list.append(dir_pattern)
+    return list(dict.fromkeys(map(os.path.abspath, log_dir_list)))
+
+
+def get_log_filenames(log_source):
+    """Return list of log paths of log path or tuple of paths"""
+    return [log_source] if isinstance(log_source, str) else list(log_source)
+
+
+def get_log_host(log_filename, log_filenames):
+    """Return log directory relative to common parent directory of logs (host name)"""
+    log_dirs = [os.path.dirname(os.path.abspath(filename)) for filename in log_filenames]
+    if len(set(log_dirs)) < 2:
+        return os.path.basename(os.path.dirname(os.path.abspath(log_filename)))
+    return os.path.relpath(os.path.dirname(os.path.abspath(log_filename)),
+                           os.path.commonpath(log_dirs))
+
+
+def match_log_files(config_dict, manifest, reported_dates=(), now=None):
+    """Return dictionary of logs by date, one log of every log directory (plain or gzipped)
+
+    Logs are path for single log directory and tuple of paths of several log directories.
+    Date of several log directories is held back until every directory has its log, or
+    until log_hosts_grace_seconds passed since the first of its logs was written, then
+    it is taken with logs present and warning naming missing hosts.
+
+    reported_dates -- dates which already have reports, they are skipped
+    now -- current timestamp for grace period (optional)
+    """
+    log_dirs = get_log_dirs(config_dict)
+    log_files = dict()
+    for log_dir in log_dirs:
+        dir_files = dict()
+        for log_filename, log_filedate in manifest.match_files(log_dir,
+                                                               config_dict['log_filename_regexp'],
+                                                               config_dict['log_filedate_format']):
+            dir_files.setdefault(log_filedate, log_filename)
+        for log_filedate, log_filename in dir_files.items():
+            if log_filedate not in reported_dates:
+                log_files.setdefault(log_filedate, dict())[log_dir] = log_filename
+    if len(log_dirs) == 1:
+        return {log_filedate: dir_logs[log_dirs[0]] for log_filedate, dir_logs in log_files.items()}
+
+    if now is None:
+        now = time.time()
+    ready_files = dict()
+    for log_filedate, dir_logs in log_files.items():
+        if len(dir_logs) < len(log_dirs):
+            try:
+                first_written = min(map(os.path.getmtime, dir_logs.values()))
+            except OSError:
+                continue
+            if now - first_written < config_dict['log_hosts_grace_seconds']:
+                continue
+            logging.warning('logs of hosts:{} are missing for date:{}, report is built without '
+                            'them'.format(', '.join(os.path.relpath(log_dir,
+                                                                    os.path.commonpath(log_dirs))
+                                                    for log_dir in log_dirs
+                                                    if log_dir not in dir_logs),
+                                          log_filedate.isoformat()))
+        ready_files[log_filedate] = tuple(dir_logs.values())
+    return ready_files
 
 
 def get_source_destination_filenames(config_dict):
     """Return source log and destination report filenames in tuple
 
+    Source log is tuple of logs of several hosts for several log directories
+
     config_dict -- dictionary with application settings
     """
-    (log_filename, log_filedate) = get_last_filename(config_dict['log_dir'],
-                                                     config_dict['log_filename_regexp'],
-                                                     config_dict['log_filedate_format'])
+    manifest = DiscoveryManifest(config_dict.get('discovery_manifest_path'))
+    report_files = manifest.match_files(config_dict['report_dir'],
+                                        config_dict['report_filename_regexp'],
+                                        config_dict['report_filedate_format'])
+    log_files = match_log_files(config_dict, manifest,
+                                {report_date for _, report_date in report_files})
+    log_filedate = max(log_files, default=None)
+    log_filename = log_files.get(log_filedate)
 
-    (report_filename, report_filedate) = get_last_filename(config_dict['report_dir'],
-                                                           config_dict['report_filename_regexp'],
-                                                           config_dict['report_filedate_format'])
+    (report_filename, report_filedate) = get_last_match(report_files)
+    manifest.store()
 
     if log_filedate is not None:
         if (log_filedate > report_filedate) if report_filedate is not None else True:
@@ -190,63 +872,2475 @@ def get_source_destination_filenames(config_dict):
     return False, None, None
 
 
-def create_report_dict(log_record_gen, top_records_no):
-    total_request_qty = 0
-    total_request_time = 0
-    url_request_time = defaultdict(list)
+def get_unreported_filenames(config_dict, manifest=None):
+    """Return list of (log filename, report filename) for every log without report
+
+    Logs are ordered by date, only one log of log directory is taken for the date
+    (plain or gzipped), logs of several log directories are tuples
+
+    config_dict -- dictionary with application settings
+    manifest -- DiscoveryManifest kept between calls (optional, loaded from settings path)
+    """
+    if manifest is None:
+        manifest = DiscoveryManifest(config_dict.get('discovery_manifest_path'))
+    report_dates = {report_date for _, report_date in
+                    manifest.match_files(config_dict['report_dir'],
+                                         config_dict['report_filename_regexp'],
+                                         config_dict['report_filedate_format'])}
+    log_files = match_log_files(config_dict, manifest, report_dates)
+    manifest.store()
+    return [(log_files[log_filedate],
+             os.path.join(config_dict['report_dir'],
+                          config_dict['report_filename_root'].format(log_filedate.strftime(
+                              config_dict['report_filedate_format']))))
+            for log_filedate in sorted(log_files)]
+
+
+def prefetch_file(filename):
+    """Advise OS to read file into page cache in background"""
+    if not hasattr(os, 'posix_fadvise'):
+        return
+    try:
+        file_descr = os.open(filename, os.O_RDONLY)
+        try:
+            os.posix_fadvise(file_descr, 0, 0, os.POSIX_FADV_WILLNEED)
+        finally:
+            os.close(file_descr)
+    except OSError:
+        pass
+
+
+def backfill_reports(config_dict, run_metrics=None):
+    """Create reports for all logs without reports in process pool
+
+    No more than backfill_workers logs are processed at once, the next log
+    file is prefetched into page cache while workers are busy.
+    """
+    if run_metrics is None:
+        run_metrics = RunMetrics(RUN_MODE_BACKFILL)
+    with run_metrics.stage('discovery'):
+        unreported_list = get_unreported_filenames(config_dict)
+    if not unreported_list:
+        run_metrics.status = RUN_STATUS_IDLE
+    workers_no = max(1, config_dict['backfill_workers'])
+    worker_config = dict(config_dict, parallel_workers=1, log_hosts_workers=1)
+    logging.info('backfill logs count:{}'.format(len(unreported_list)))
+    with run_metrics.stage('backfill'), ProcessPoolExecutor(max_workers=workers_no) as executor:
+        futures = dict()
+        for file_no, (log_filename, report_filename) in enumerate(unreported_list):
+            if len(futures) >= workers_no:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    log_backfill_result(future, futures.pop(future), run_metrics)
+            futures[executor.submit(build_report, worker_config,
+                                    log_filename, report_filename)] = log_filename
+            run_metrics.add('bytes_read',
+                            sum(map(os.path.getsize, get_log_filenames(log_filename))))
+            if file_no + 1 < len(unreported_list):
+                for next_filename in get_log_filenames(unreported_list[file_no + 1][0]):
+                    prefetch_file(next_filename)
+        for future in list(futures):
+            log_backfill_result(future, futures.pop(future), run_metrics)
+
+
+def log_backfill_result(future, log_filename, run_metrics=None):
+    try:
+        logging.info('backfill report created:{}'.format(future.result()))
+        if run_metrics is not None:
+            run_metrics.add('reports_created', 1)
+    except Exception:
+        # any worker error (zlib.error of corrupt gzip too) must not stop other logs backfill
+        logging.exception('backfill report error:{}'.format(log_filename))
+        if run_metrics is not None:
+            run_metrics.add('reports_failed', 1)
+            run_metrics.status = RUN_STATUS_FAILED
+
+
+class LogWatcher:
+    """Daemon which reports new logs of log directory as they arrive
+
+    Log directory is polled every daemon_poll_interval seconds through DiscoveryManifest
+    loaded from discovery_manifest_path, so directory is listed only when its mtime
+    changed. Manifest is written back to discovery_manifest_path after poll which
+    listed directory (and shared with daily runs), empty path keeps it in memory. Log is
+    taken as rotated when its size and mtime are unchanged since previous poll and
+    mtime is older than daemon_settle_seconds (web server may still write to renamed
+    log until it reopens logs). Reports are built in process pool of
+    backfill_workers processes, failed log is retried only after it changes.
+    Broken worker processes pool is replaced before the next poll.
+    Health and status of daemon is written to daemon_status_path after every poll.
+
+    config_dict -- dictionary with application settings
+    run_metrics -- RunMetrics for counters of daemon run (optional)
+    """
+    def __init__(self, config_dict, run_metrics=None):
+        self.config_dict = config_dict
+        self.run_metrics = run_metrics if run_metrics is not None else RunMetrics(RUN_MODE_DAEMON)
+        self.manifest = DiscoveryManifest(config_dict.get('discovery_manifest_path'))
+        self.worker_config = dict(config_dict, parallel_workers=1, log_hosts_workers=1)
+        self.file_states = dict()
+        self.failed_states = dict()
+        self.in_progress = dict()
+        self.reports_created = 0
+        self.reports_failed = 0
+        self.last_report = None
+        self.last_error = None
+        self.is_executor_broken = False
+        self.started = time.time()
+        self.status = 'starting'
+        self.stop_event = None
+
+    @staticmethod
+    def get_file_state(log_filename):
+        """Return tuple of (size, mtime) of log or logs of several hosts"""
+        return tuple((file_stat.st_size, file_stat.st_mtime_ns) for file_stat
+                     in map(os.stat, get_log_filenames(log_filename)))
+
+    def poll(self, now=None):
+        """Return list of (log filename, report filename) ready for reporting"""
+        if now is None:
+            now = time.time()
+        settle_ns = self.config_dict['daemon_settle_seconds'] * 10 ** 9
+        unreported_list = get_unreported_filenames(self.config_dict, self.manifest)
+        self.manifest.store()
+        file_states = dict()
+        ready_list = list()
+        for log_filename, report_filename in unreported_list:
+            if log_filename in self.in_progress:
+                continue
+            try:
+                file_state = self.get_file_state(log_filename)
+            except FileNotFoundError:
+                continue
+            file_states[log_filename] = file_state
+            if self.failed_states.get(log_filename) == file_state:
+                continue
+            if self.file_states.get(log_filename) == file_state \
+                    and now * 10 ** 9 - max(mtime_ns for _, mtime_ns in file_state) >= settle_ns:
+                ready_list.append((log_filename, report_filename))
+        self.file_states = file_states
+        return ready_list
+
+    async def build(self, executor, log_filename, report_filename):
+        loop = asyncio.get_running_loop()
+        file_state = self.file_states.get(log_filename)
+        self.in_progress[log_filename] = report_filename
+        started = time.perf_counter()
+        try:
+            await loop.run_in_executor(executor, build_report, self.worker_config,
+                                       log_filename, report_filename)
+        except Exception as error:
+            # any worker error must not stop daemon or make it dispatch the same log every poll
+            logging.exception('daemon report error:{}'.format(log_filename))
+            if isinstance(error, BrokenProcessPool):
+                self.is_executor_broken = True
+            self.reports_failed += 1
+            self.run_metrics.add('reports_failed', 1)
+            self.failed_states[log_filename] = file_state
+            self.last_error = {'log': log_filename, 'error': repr(error),
+                               'time': datetime.datetime.now().isoformat()}
+        else:
+            logging.info('daemon report created:{}'.format(report_filename))
+            self.reports_created += 1
+            self.run_metrics.add('reports_created', 1)
+            self.run_metrics.add('bytes_read', sum(size for size, _ in file_state or ()))
+            self.failed_states.pop(log_filename, None)
+            self.last_report = {'log': log_filename, 'report': report_filename,
+                                'seconds': round(time.perf_counter() - started, 6),
+                                'time': datetime.datetime.now().isoformat()}
+        finally:
+            del self.in_progress[log_filename]
+        self.write_status()
+
+    def get_status(self):
+        return {
+            'pid': os.getpid(),
+            'status': self.status,
+            'started': datetime.datetime.fromtimestamp(self.started).isoformat(),
+            'heartbeat': datetime.datetime.now().isoformat(),
+            'heartbeat_timestamp': time.time(),
+            'poll_interval': self.config_dict['daemon_poll_interval'],
+            'log_dirs': get_log_dirs(self.config_dict),
+            'in_progress': sorted(self.in_progress),
+            'waiting': sorted(set(self.file_states) - set(self.failed_states)),
+            'failed': sorted(self.failed_states),
+            'reports_created': self.reports_created,
+            'reports_failed': self.reports_failed,
+            'last_report': self.last_report,
+            'last_error': self.last_error,
+        }
+
+    def write_status(self):
+        status_path = self.config_dict['daemon_status_path']
+        if not status_path:
+            return
+        try:
+            write_text_atomic(status_path, json.dumps(self.get_status(), indent=2))
+        except OSError:
+            logging.exception('Daemon status write error')
+
+    def stop(self):
+        if self.stop_event is not None:
+            self.stop_event.set()
+
+    async def run(self):
+        """Poll log directory until stop() is called or SIGINT/SIGTERM is received"""
+        loop = asyncio.get_running_loop()
+        self.stop_event = asyncio.Event()
+        for signal_no in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(signal_no, self.stop)
+            except (NotImplementedError, RuntimeError):
+                pass
+        workers_no = max(1, self.config_dict['backfill_workers'])
+        logging.info('daemon started, watching:{}'.format(
+            ', '.join(get_log_dirs(self.config_dict))))
+        self.status = 'running'
+        tasks = set()
+        executor = ProcessPoolExecutor(max_workers=workers_no)
+        try:
+            while not self.stop_event.is_set():
+                if self.is_executor_broken:
+                    logging.warning('daemon worker processes pool is broken, restarting it')
+                    executor.shutdown(wait=False)
+                    executor = ProcessPoolExecutor(max_workers=workers_no)
+                    self.is_executor_broken = False
+                try:
+                    ready_list = self.poll()
+                except OSError:
+                    logging.exception('Daemon log directory poll error')
+                    ready_list = list()
+                for log_filename, report_filename in ready_list:
+                    task = asyncio.ensure_future(
+                        self.build(executor, log_filename, report_filename))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                self.write_status()
+                try:
+                    await asyncio.wait_for(self.stop_event.wait(),
+                                           self.config_dict['daemon_poll_interval'])
+                except asyncio.TimeoutError:
+                    pass
+            self.status = 'stopping'
+            self.write_status()
+            if tasks:
+                await asyncio.wait(tasks)
+        finally:
+            executor.shutdown()
+            for signal_no in (signal.SIGINT, signal.SIGTERM):
+                try:
+                    loop.remove_signal_handler(signal_no)
+                except (NotImplementedError, RuntimeError):
+                    pass
+            self.status = 'stopped'
+            self.write_status()
+            logging.info('daemon stopped, reports created:{} failed:{}'.format(
+                self.reports_created, self.reports_failed))
+
+
+def get_parse_error_options(config_dict):
+    """Return LogRecordGen parse errors keyword arguments from application settings"""
+    return {
+        'error_budget': config_dict['log_parse_error_budget'],
+        'error_warmup_lines': config_dict['log_parse_error_warmup_lines'],
+        'errors_lines_limit': config_dict['log_parse_errors_lines_limit'],
+        'errors_sample_size': config_dict['log_parse_errors_sample_size'],
+    }
+
+
+def get_aggregate_options(config_dict):
+    """Return ReportAggregate keyword arguments from application settings"""
+    return {
+        'stat_mode': config_dict['report_stat_mode'],
+        'sketch_k': config_dict['sketch_k'],
+        'top_urls_capacity': config_dict['report_top_urls_capacity'] or None,
+        'url_normalization': {
+            'replace_ids': config_dict['url_replace_ids'],
+            'query_mode': config_dict['url_query_mode'],
+            'query_whitelist': config_dict['url_query_whitelist'],
+            'rules': config_dict['url_rules'],
+        } if config_dict['url_normalize'] else None,
+        'errors_lines_limit': config_dict['log_parse_errors_lines_limit'],
+    }
+
+
+def create_report_dict(log_record_gen, top_records_no, backend=AGGREGATE_BACKEND_PYTHON,
+                       time_bucket_minutes=0, **aggregate_options):
+    """Return report rows of top urls, with time_bucket_minutes rows of every time bucket"""
+    report_aggregate = create_report_aggregate(aggregate_options, time_bucket_minutes, backend)
+    report_aggregate.update(log_record_gen)
+    return report_aggregate.report_list(top_records_no)
+
+
+def create_report_aggregate(aggregate_options, time_bucket_minutes=0,
+                            backend=AGGREGATE_BACKEND_PYTHON):
+    """Return empty aggregate, TimeBucketAggregate when time_bucket_minutes is set
+
+    NumPy backend supports exact statistic of every url without time buckets only and
+    its aggregates are not mergeable, python backend is used for other modes or when
+    numpy is not installed
+    """
+    if time_bucket_minutes:
+        if backend == AGGREGATE_BACKEND_NUMPY:
+            logging.warning('numpy aggregate backend does not support time buckets, '
+                            'python aggregate backend is used')
+        return TimeBucketAggregate(time_bucket_minutes, **aggregate_options)
+    if backend == AGGREGATE_BACKEND_NUMPY:
+        if numpy is None:
+            logging.warning('numpy is not installed, python aggregate backend is used')
+        elif aggregate_options.get('stat_mode', STAT_MODE_EXACT) != STAT_MODE_EXACT \
+                or aggregate_options.get('top_urls_capacity') is not None:
+            logging.warning('numpy aggregate backend supports exact statistic of every url '
+                            'only, python aggregate backend is used')
+        else:
+            return NumpyReportAggregate(**aggregate_options)
+    return ReportAggregate(**aggregate_options)
+
+
+def get_report_fields(time_bucket_minutes=0):
+    """Return parsed fields of report records, time_local is added for time buckets"""
+    return TIME_BUCKET_FIELDS if time_bucket_minutes else REPORT_FIELDS
+
+
+def iter_report_records(log_record_gen, fields=REPORT_FIELDS):
+    """Return records of log_record_gen projected to fields values in fields order
+
+    LogRecordGen with fields yields tuples of its fields, log dicts of generator
+    without fields are projected by keys
+    """
+    record_fields = getattr(log_record_gen, 'fields', None)
+    if record_fields is None:
+        return map(itemgetter(*fields), log_record_gen)
+    if record_fields == fields:
+        return log_record_gen
+    return map(itemgetter(*(record_fields.index(field) for field in fields)), log_record_gen)
+
+
+def exact_median(request_times):
+    """Return median of request times, the same value as statistics.median
+
+    Middle values of array of MEDIAN_SELECT_MIN_COUNT and more times are found by
+    linear time numpy.partition of array buffer when numpy is installed. Without numpy
+    array of MEDIAN_WINDOW_MIN_COUNT and more times is narrowed to values around the
+    median by select_median_window, smaller ones are sorted.
+    """
+    count = len(request_times)
+    middle = count // 2
+    if isinstance(request_times, array) and numpy is not None \
+            and count >= MEDIAN_SELECT_MIN_COUNT:
+        request_times = numpy.partition(numpy.frombuffer(request_times, dtype=numpy.float64),
+                                        (middle - 1, middle) if count % 2 == 0 else middle)
+    elif isinstance(request_times, array) and count >= MEDIAN_WINDOW_MIN_COUNT:
+        below_count, request_times = select_median_window(request_times)
+        middle -= below_count
+    else:
+        request_times = sorted(request_times)
+    if count % 2:
+        return float(request_times[middle])
+    return (float(request_times[middle - 1]) + float(request_times[middle])) / 2
+
+
+def select_median_window(request_times):
+    """Return count of values below window and sorted window of array middle values
+
+    Window bounds are taken around the median of sorted strided sample of about
+    count ** (2/3) values, counting and filtering passes are run by map and filter with
+    float methods, so only sample and window values are boxed to Python floats. Whole
+    array is sorted when window misses middle values.
+    """
+    count = len(request_times)
+    middle = count // 2
+    sample = sorted(request_times[::max(1, int(count ** (1 / 3)))])
+    margin = 2 * int(len(sample) ** 0.5) + 1
+    sample_middle = middle * len(sample) // count
+    low = sample[max(0, sample_middle - margin)]
+    high = sample[min(len(sample) - 1, sample_middle + margin)]
+    below_count = sum(map(low.__gt__, request_times))
+    window = sorted(filter(high.__ge__, filter(low.__le__, request_times)))
+    if below_count <= middle - 1 + count % 2 and middle < below_count + len(window):
+        return below_count, window
+    return 0, sorted(request_times)
+
+
+def format_url_statistic(url_line, count, time_sum, time_avg, time_max, time_med,
+                         total_request_qty, total_request_time):
+    return {
+        'url': url_line,
+        'count': count,
+        'count_perc': '{:.3%}'.format(count / total_request_qty),
+        'time_sum': round(time_sum, 3),
+        'time_perc': '{:.3%}'.format(time_sum / total_request_time),
+        'time_avg': '{:.3f}'.format(time_avg),
+        'time_max': '{:.3f}'.format(time_max),
+        'time_med': '{:.3f}'.format(time_med)
+    }
+
+
+class ParseStatistic:
+    """Lines and parse errors counters of aggregate, base of aggregate classes
+
+    errors_lines_limit -- max quantity of stored errors lines numbers of merged
+                          statistics, None - unlimited
+    """
+    def __init__(self, errors_lines_limit=None):
+        self.errors_lines_limit = errors_lines_limit
+        self.lines_count = 0
+        self.parse_errors_count = 0
+        self.parse_errors_lines_list = list()
+
+    def add_parse_statistic(self, lines_count, parse_errors_count, parse_errors_lines_list):
+        self.parse_errors_lines_list.extend(line_no + self.lines_count
+                                            for line_no in parse_errors_lines_list)
+        if self.errors_lines_limit is not None:
+            del self.parse_errors_lines_list[self.errors_lines_limit:]
+        self.lines_count += lines_count
+        self.parse_errors_count += parse_errors_count
+
+    def merge_parse_statistic(self, source):
+        """Add parse statistic of LogRecordGen, ParsedLogColumns or other aggregate"""
+        self.add_parse_statistic(source.lines_count, source.parse_errors_count,
+                                 source.parse_errors_lines_list)
+
+
+class ReportAggregate(ParseStatistic):
+    """Mergeable per-url request time aggregate of whole log file or its part
+
+    Aggregates are merged in file order, so errors line numbers stay global
+
+    stat_mode -- STAT_MODE_EXACT keeps every request time in array('d') for exact median,
+                 STAT_MODE_SKETCH keeps bounded QuantileSketch per url and adds
+                 time_p90/time_p99 columns
+    sketch_k -- QuantileSketch accuracy parameter
+    url_normalization -- UrlNormalizer keyword arguments, None disables urls normalization
+    top_urls_capacity -- max quantity of tracked urls (weighted Space-Saving heavy hitters
+                         ranked by time_sum), None keeps every url. Url admitted to full
+                         table replaces url with minimal time_sum and inherits it as
+                         error, so reported time_sum is upper bound and true value is
+                         not less than time_sum - time_sum_error. Count and timing
+                         statistics are collected since url admission.
+    errors_lines_limit -- ParseStatistic errors lines numbers limit
+    """
+    def __init__(self, stat_mode=STAT_MODE_EXACT, sketch_k=200, url_normalization=None,
+                 top_urls_capacity=None, errors_lines_limit=None):
+        super().__init__(errors_lines_limit)
+        if stat_mode not in (STAT_MODE_EXACT, STAT_MODE_SKETCH):
+            raise ValueError('Unknown report statistic mode: {}'.format(stat_mode))
+        self.stat_mode = stat_mode
+        self.sketch_k = sketch_k
+        self.top_urls_capacity = top_urls_capacity
+        self.url_time_weight = dict()
+        self.url_time_error = dict()
+        self.weight_heap = list()
+        self.heap_sequence = sequence_count()
+        self.url_normalization = url_normalization
+        self.url_normalizer = UrlNormalizer(**url_normalization) \
+            if url_normalization is not None else None
+        self.total_request_qty = 0
+        self.total_request_time = 0
+        self.url_request_time = defaultdict(partial(array, 'd') if stat_mode == STAT_MODE_EXACT
+                                            else partial(QuantileSketch, sketch_k))
+
+    def update(self, log_record_gen):
+        self.add_records(iter_report_records(log_record_gen))
+        self.merge_parse_statistic(log_record_gen)
+
+    def add_records(self, records):
+        """Aggregate (request, request_time) records without parse statistic"""
+        url_normalizer = self.url_normalizer
+        is_heavy_hitters = self.top_urls_capacity is not None
+        url_request_time = self.url_request_time
+        url_time_weight = self.url_time_weight
+        for request, request_time in records:
+            url_list = request.split(' ')
+            url_line = url_list[1] if len(url_list) > 1 else None
+            if url_normalizer is not None:
+                url_line = url_normalizer(url_line)
+            self.total_request_qty += 1
+            self.total_request_time += request_time
+            if not is_heavy_hitters:
+                url_request_time[url_line].append(request_time)
+            elif url_line in url_time_weight:
+                url_request_time[url_line].append(request_time)
+                url_time_weight[url_line] += request_time
+            else:
+                self.add_heavy_hitter(url_line, request_time)
+
+    def add_heavy_hitter(self, url_line, request_time):
+        request_time_list = self.url_request_time.get(url_line)
+        if request_time_list is None:
+            error = 0
+            if len(self.url_request_time) >= self.top_urls_capacity:
+                error = self.evict_min_url()
+            request_time_list = self.url_request_time[url_line] = \
+                self.url_request_time.default_factory()
+            self.url_time_error[url_line] = error
+            self.url_time_weight[url_line] = error
+            heapq.heappush(self.weight_heap, (error, next(self.heap_sequence), url_line))
+        request_time_list.append(request_time)
+        self.url_time_weight[url_line] += request_time
+
+    def evict_min_url(self):
+        """Remove url with minimal time_sum and return its time_sum
+
+        Heap entries are updated lazily: outdated entry is pushed back with actual weight
+        """
+        while True:
+            weight, _, url_line = heapq.heappop(self.weight_heap)
+            actual_weight = self.url_time_weight[url_line]
+            if actual_weight != weight:
+                heapq.heappush(self.weight_heap,
+                               (actual_weight, next(self.heap_sequence), url_line))
+                continue
+            del self.url_request_time[url_line]
+            del self.url_time_weight[url_line]
+            del self.url_time_error[url_line]
+            return weight
+
+    def get_min_url_weight(self):
+        """Return minimal time_sum of full heavy hitters table (bound for untracked urls)"""
+        if self.top_urls_capacity is None or len(self.url_time_weight) < self.top_urls_capacity:
+            return 0
+        return min(self.url_time_weight.values())
+
+    def merge_heavy_hitters(self, other):
+        """Merge Space-Saving tables, url missing in full table gets its minimal time_sum"""
+        self_min_weight = self.get_min_url_weight()
+        other_min_weight = other.get_min_url_weight()
+        url_time_weight = other.url_time_weight if other.top_urls_capacity is not None \
+            else {url_line: sum(request_time_list) if other.stat_mode == STAT_MODE_EXACT
+                  else request_time_list.sum
+                  for url_line, request_time_list in other.url_request_time.items()}
+        url_time_error = other.url_time_error if other.top_urls_capacity is not None else {}
+        for url_line in set(self.url_time_weight).union(url_time_weight):
+            self.url_time_weight[url_line] = \
+                self.url_time_weight.get(url_line, self_min_weight) + \
+                url_time_weight.get(url_line, other_min_weight)
+            self.url_time_error[url_line] = \
+                self.url_time_error.get(url_line, self_min_weight) + \
+                url_time_error.get(url_line, other_min_weight if url_line not in url_time_weight
+                                   else 0)
+            if url_line in other.url_request_time:
+                self.merge_url_timings(url_line, other.url_request_time[url_line])
+        for url_line in sorted(self.url_time_weight, key=self.url_time_weight.get,
+                               reverse=True)[self.top_urls_capacity:]:
+            del self.url_request_time[url_line]
+            del self.url_time_weight[url_line]
+            del self.url_time_error[url_line]
+        self.rebuild_weight_heap()
+
+    def rebuild_weight_heap(self):
+        self.weight_heap = [(weight, next(self.heap_sequence), url_line)
+                            for url_line, weight in self.url_time_weight.items()]
+        heapq.heapify(self.weight_heap)
+
+    def merge_url_timings(self, url_line, request_time_list):
+        if self.stat_mode == STAT_MODE_SKETCH:
+            self.url_request_time[url_line].merge(request_time_list)
+        else:
+            self.url_request_time[url_line].extend(request_time_list)
+
+    def merge(self, other):
+        self.merge_parse_statistic(other)
+        self.total_request_qty += other.total_request_qty
+        self.total_request_time += other.total_request_time
+        if self.top_urls_capacity is not None:
+            self.merge_heavy_hitters(other)
+            return self
+        for url_line, request_time_list in other.url_request_time.items():
+            self.merge_url_timings(url_line, request_time_list)
+        return self
+
+    def to_sketch_aggregate(self, sketch_k):
+        """Return aggregate with QuantileSketch per url, parse errors line numbers are omitted"""
+        sketch_aggregate = ReportAggregate(STAT_MODE_SKETCH, sketch_k, self.url_normalization,
+                                           self.top_urls_capacity, self.errors_lines_limit)
+        sketch_aggregate.url_time_weight = dict(self.url_time_weight)
+        sketch_aggregate.url_time_error = dict(self.url_time_error)
+        sketch_aggregate.rebuild_weight_heap()
+        sketch_aggregate.lines_count = self.lines_count
+        sketch_aggregate.parse_errors_count = self.parse_errors_count
+        sketch_aggregate.total_request_qty = self.total_request_qty
+        sketch_aggregate.total_request_time = self.total_request_time
+        for url_line, request_time_list in self.url_request_time.items():
+            if self.stat_mode == STAT_MODE_SKETCH:
+                sketch_aggregate.url_request_time[url_line].merge(request_time_list)
+            else:
+                sketch_aggregate.url_request_time[url_line].extend(request_time_list)
+        return sketch_aggregate
+
+    def to_dict(self, request_times=True):
+        """Return JSON serializable representation of aggregate
+
+        request_times -- False omits exact request times arrays, stored separately
+        """
+        return {
+            'stat_mode': self.stat_mode,
+            'sketch_k': self.sketch_k,
+            'url_normalization': self.url_normalization,
+            'top_urls_capacity': self.top_urls_capacity,
+            'errors_lines_limit': self.errors_lines_limit,
+            'url_time_weight': [[url_line, weight, self.url_time_error[url_line]]
+                                for url_line, weight in self.url_time_weight.items()],
+            'lines_count': self.lines_count,
+            'parse_errors_count': self.parse_errors_count,
+            'parse_errors_lines_list': self.parse_errors_lines_list,
+            'total_request_qty': self.total_request_qty,
+            'total_request_time': self.total_request_time,
+            'url_request_time': [
+                [url_line, request_time_list.to_dict()
+                 if self.stat_mode == STAT_MODE_SKETCH else request_time_list.tolist()]
+                for url_line, request_time_list in self.url_request_time.items()
+            ] if request_times or self.stat_mode == STAT_MODE_SKETCH else [],
+        }
+
+    @classmethod
+    def from_dict(cls, aggregate_dict):
+        report_aggregate = cls(aggregate_dict['stat_mode'], aggregate_dict['sketch_k'],
+                               aggregate_dict.get('url_normalization'),
+                               aggregate_dict.get('top_urls_capacity'),
+                               aggregate_dict.get('errors_lines_limit'))
+        for url_line, weight, error in aggregate_dict.get('url_time_weight', []):
+            report_aggregate.url_time_weight[url_line] = weight
+            report_aggregate.url_time_error[url_line] = error
+        report_aggregate.rebuild_weight_heap()
+        report_aggregate.lines_count = aggregate_dict['lines_count']
+        report_aggregate.parse_errors_count = aggregate_dict['parse_errors_count']
+        report_aggregate.parse_errors_lines_list = list(aggregate_dict['parse_errors_lines_list'])
+        report_aggregate.total_request_qty = aggregate_dict['total_request_qty']
+        report_aggregate.total_request_time = aggregate_dict['total_request_time']
+        for url_line, request_time_list in aggregate_dict['url_request_time']:
+            report_aggregate.url_request_time[url_line] = \
+                QuantileSketch.from_dict(request_time_list) \
+                if report_aggregate.stat_mode == STAT_MODE_SKETCH else array('d', request_time_list)
+        return report_aggregate
+
+    def get_urls_count(self):
+        return len(self.url_request_time)
+
+    def report_list(self, top_records_no):
+        url_statistic_list = list()
+
+        for url_line, request_time_list in self.url_request_time.items():
+            if self.stat_mode == STAT_MODE_SKETCH:
+                count, time_sum, time_max = \
+                    request_time_list.count, request_time_list.sum, request_time_list.max
+                time_med = request_time_list.quantile(0.5)
+            else:
+                count, time_sum, time_max = \
+                    len(request_time_list), sum(request_time_list), max(request_time_list)
+                time_med = exact_median(request_time_list)
+            time_avg = time_sum / count
+            if self.top_urls_capacity is not None:
+                time_sum = self.url_time_weight[url_line]
+            url_statistic = format_url_statistic(url_line, count, time_sum, time_avg, time_max,
+                                                 time_med, self.total_request_qty,
+                                                 self.total_request_time)
+            if self.stat_mode == STAT_MODE_SKETCH:
+                url_statistic['time_p90'] = '{:.3f}'.format(request_time_list.quantile(0.9))
+                url_statistic['time_p99'] = '{:.3f}'.format(request_time_list.quantile(0.99))
+            if self.top_urls_capacity is not None:
+                url_statistic['time_sum_error'] = round(self.url_time_error[url_line], 3)
+            url_statistic_list.append(url_statistic)
+        return sorted(url_statistic_list,
+                      key=lambda record_dict: record_dict['time_sum'],
+                      reverse=True)[:top_records_no]
+
+
+class TimeLocalBucketer:
+    """Convert nginx $time_local to time bucket label through cache of minute prefixes
+
+    Lines of one minute share "dd/Mon/yyyy:HH:MM" prefix, so prefix is parsed once
+    and other lines cost one slice and dict lookup. Buckets are counted from midnight
+    in log local time (timezone offset is ignored), bad time gets TIME_BUCKET_UNKNOWN.
 
-    for log_dict in log_record_gen:
-        url_list = log_dict['request'].split(' ')
+    bucket_minutes -- bucket length in minutes (1 - 1440)
+    cache_size -- max quantity of cached prefixes, cache is cleared when it is full
+    """
+    PREFIX_LENGTH = 17
+    MONTHS = {month: month_no for month_no, month in enumerate(
+        ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun',
+         'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'), start=1)}
+
+    def __init__(self, bucket_minutes, cache_size=1 << 16):
+        if not 1 <= bucket_minutes <= 24 * 60:
+            raise ValueError('Time bucket minutes must be in range 1 - 1440: {}'
+                             .format(bucket_minutes))
+        self.bucket_minutes = bucket_minutes
+        self.cache_size = cache_size
+        self.cache = dict()
+
+    def __call__(self, time_local):
+        prefix = time_local[:self.PREFIX_LENGTH]
+        bucket = self.cache.get(prefix)
+        if bucket is None:
+            bucket = self.parse_prefix(prefix)
+            if len(self.cache) >= self.cache_size:
+                self.cache.clear()
+            self.cache[prefix] = bucket
+        return bucket
+
+    def parse_prefix(self, prefix):
+        try:
+            bucket_time = datetime.datetime(int(prefix[7:11]), self.MONTHS[prefix[3:6]],
+                                            int(prefix[0:2]), int(prefix[12:14]),
+                                            int(prefix[15:17]))
+        except (KeyError, ValueError):
+            return TIME_BUCKET_UNKNOWN
+        minutes = bucket_time.hour * 60 + bucket_time.minute
+        bucket_time -= datetime.timedelta(minutes=minutes % self.bucket_minutes)
+        return bucket_time.strftime('%Y-%m-%d %H:%M')
+
+
+class TimeBucketAggregate(ParseStatistic):
+    """Per time bucket ReportAggregate of log records with time_local field
+
+    Log lines are ordered by time, so records are grouped by runs of equal time_local
+    (one second) and only first record of run is converted to bucket, then every run
+    is passed to its bucket aggregate at once. Percents of report rows are counted
+    from bucket totals.
+
+    bucket_minutes -- bucket length in minutes
+    aggregate_options -- ReportAggregate keyword arguments of bucket aggregates
+    """
+    def __init__(self, bucket_minutes, **aggregate_options):
+        super().__init__(aggregate_options.get('errors_lines_limit'))
+        self.bucket_minutes = bucket_minutes
+        self.aggregate_options = aggregate_options
+        self.time_bucket = TimeLocalBucketer(bucket_minutes)
+        self.buckets = dict()
+
+    def get_bucket_aggregate(self, bucket):
+        bucket_aggregate = self.buckets.get(bucket)
+        if bucket_aggregate is None:
+            bucket_aggregate = self.buckets[bucket] = ReportAggregate(**self.aggregate_options)
+        return bucket_aggregate
+
+    def update(self, log_record_gen):
+        records = iter_report_records(log_record_gen, TIME_BUCKET_FIELDS)
+        time_bucket = self.time_bucket
+        report_record = itemgetter(0, 1)
+        for time_local, second_records in groupby(records, key=itemgetter(2)):
+            self.get_bucket_aggregate(time_bucket(time_local)).add_records(
+                map(report_record, second_records))
+        self.merge_parse_statistic(log_record_gen)
+
+    def merge(self, other):
+        self.merge_parse_statistic(other)
+        for bucket, bucket_aggregate in other.buckets.items():
+            if bucket in self.buckets:
+                self.buckets[bucket].merge(bucket_aggregate)
+            else:
+                self.buckets[bucket] = bucket_aggregate
+        return self
+
+    @property
+    def total_request_qty(self):
+        return sum(bucket_aggregate.total_request_qty for bucket_aggregate in self.buckets.values())
+
+    def get_urls_count(self):
+        return len(set().union(*(bucket_aggregate.url_request_time
+                                 for bucket_aggregate in self.buckets.values())))
+
+    def to_dict(self):
+        """Return JSON serializable representation of aggregate"""
+        return {
+            'bucket_minutes': self.bucket_minutes,
+            'aggregate_options': self.aggregate_options,
+            'lines_count': self.lines_count,
+            'parse_errors_count': self.parse_errors_count,
+            'parse_errors_lines_list': self.parse_errors_lines_list,
+            'buckets': [[bucket, bucket_aggregate.to_dict()]
+                        for bucket, bucket_aggregate in self.buckets.items()],
+        }
+
+    @classmethod
+    def from_dict(cls, aggregate_dict):
+        time_bucket_aggregate = cls(aggregate_dict['bucket_minutes'],
+                                    **aggregate_dict['aggregate_options'])
+        time_bucket_aggregate.add_parse_statistic(aggregate_dict['lines_count'],
+                                                  aggregate_dict['parse_errors_count'],
+                                                  aggregate_dict['parse_errors_lines_list'])
+        for bucket, bucket_dict in aggregate_dict['buckets']:
+            time_bucket_aggregate.buckets[bucket] = ReportAggregate.from_dict(bucket_dict)
+        return time_bucket_aggregate
+
+    def to_sketch_aggregate(self, sketch_k):
+        """Return whole log aggregate with QuantileSketch per url"""
+        report_aggregate = ReportAggregate(**self.aggregate_options)
+        for bucket_aggregate in self.buckets.values():
+            report_aggregate.merge(bucket_aggregate)
+        report_aggregate.merge_parse_statistic(self)
+        return report_aggregate.to_sketch_aggregate(sketch_k)
+
+    def report_list(self, top_records_no):
+        """Return top_records_no rows of every bucket with time_bucket column, buckets in order"""
+        url_statistic_list = list()
+        for bucket in sorted(self.buckets):
+            for url_statistic in self.buckets[bucket].report_list(top_records_no):
+                url_statistic['time_bucket'] = bucket
+                url_statistic_list.append(url_statistic)
+        return url_statistic_list
+
+
+class NumpyReportAggregate(ParseStatistic):
+    """Per-url exact request time aggregate computed with numpy
+
+    Records are collected to url ids and request times arrays by batches, statistic
+    is computed by vectorized group-by: bincount for counts and sums, one sort by
+    (url id, request time) for max and median. Report rows are the same as rows
+    of ReportAggregate in exact mode. ParsedLogColumns are aggregated without
+    records iteration: urls are computed once per distinct request.
+
+    url_normalization -- UrlNormalizer keyword arguments, None disables urls normalization
+    errors_lines_limit -- ParseStatistic errors lines numbers limit
+    """
+    batch_size = 1 << 16
+
+    def __init__(self, stat_mode=STAT_MODE_EXACT, sketch_k=200, url_normalization=None,
+                 top_urls_capacity=None, errors_lines_limit=None):
+        super().__init__(errors_lines_limit)
+        if numpy is None:
+            raise ValueError('numpy aggregate backend requires numpy')
+        if stat_mode != STAT_MODE_EXACT or top_urls_capacity is not None:
+            raise ValueError('numpy aggregate backend supports exact statistic of every url only')
+        self.sketch_k = sketch_k
+        self.url_normalization = url_normalization
+        self.url_normalizer = UrlNormalizer(**url_normalization) \
+            if url_normalization is not None else None
+        self.url_ids = dict()
+        self.id_chunks = list()
+        self.time_chunks = list()
+        self.total_request_qty = 0
+        self.total_request_time = 0
+
+    def get_url_id(self, request):
+        url_list = request.split(' ')
         url_line = url_list[1] if len(url_list) > 1 else None
-        total_request_qty += 1
-        total_request_time += log_dict['request_time']
-        url_request_time[url_line].append(log_dict['request_time'])
-
-    url_statistic_list = list()
-
-    for url_line in url_request_time:
-        time_sum = sum(url_request_time[url_line])
-        url_statistic_list.append({
-            'url': url_line,
-            'count': len(url_request_time[url_line]),
-            'count_perc': '{:.3%}'.format(len(url_request_time[url_line]) / total_request_qty),
-            'time_sum': round(time_sum, 3),
-            'time_perc': '{:.3%}'.format(time_sum / total_request_time),
-            'time_avg': '{:.3f}'.format(time_sum / len(url_request_time[url_line])),
-            'time_max': '{:.3f}'.format(max(url_request_time[url_line])),
-            'time_med': '{:.3f}'.format(median(url_request_time[url_line]))
+        if self.url_normalizer is not None:
+            url_line = self.url_normalizer(url_line)
+        return self.url_ids.setdefault(url_line, len(self.url_ids))
+
+    def update(self, log_record_gen):
+        if isinstance(log_record_gen, ParsedLogColumns):
+            self.update_columns(log_record_gen)
+            return
+        records = iter_report_records(log_record_gen)
+        request_ids = dict()
+        get_url_id = self.get_url_id
+        while True:
+            id_batch = list()
+            time_batch = list()
+            for request, request_time in islice(records, self.batch_size):
+                url_id = request_ids.get(request)
+                if url_id is None:
+                    url_id = request_ids[request] = get_url_id(request)
+                id_batch.append(url_id)
+                time_batch.append(request_time)
+            if not id_batch:
+                break
+            self.add_chunk(numpy.array(id_batch, dtype=numpy.int64),
+                           numpy.array(time_batch, dtype=numpy.float64))
+        self.merge_parse_statistic(log_record_gen)
+
+    def update_columns(self, parsed_columns):
+        request_url_ids = numpy.array([self.get_url_id(request)
+                                       for request in parsed_columns.requests], dtype=numpy.int64)
+        if len(parsed_columns.request_ids):
+            self.add_chunk(request_url_ids[numpy.frombuffer(parsed_columns.request_ids,
+                                                            dtype=numpy.uint32)],
+                           numpy.frombuffer(parsed_columns.request_times, dtype=numpy.float64))
+        self.merge_parse_statistic(parsed_columns)
+
+    def add_chunk(self, url_ids, request_times):
+        self.id_chunks.append(url_ids)
+        self.time_chunks.append(request_times)
+        self.total_request_qty += len(url_ids)
+        self.total_request_time += float(request_times.sum())
+
+    def get_arrays(self):
+        """Return url ids and request times arrays of all collected records"""
+        if len(self.id_chunks) > 1:
+            self.id_chunks = [numpy.concatenate(self.id_chunks)]
+            self.time_chunks = [numpy.concatenate(self.time_chunks)]
+        if not self.id_chunks:
+            return numpy.zeros(0, dtype=numpy.int64), numpy.zeros(0, dtype=numpy.float64)
+        return self.id_chunks[0], self.time_chunks[0]
+
+    def get_urls_count(self):
+        return len(self.url_ids)
+
+    def group_statistic(self):
+        """Return count, sum, max and median arrays indexed by url id"""
+        url_ids, request_times = self.get_arrays()
+        urls_count = len(self.url_ids)
+        counts = numpy.bincount(url_ids, minlength=urls_count)
+        sums = numpy.bincount(url_ids, weights=request_times, minlength=urls_count)
+        sorted_times = request_times[numpy.lexsort((request_times, url_ids))]
+        ends = numpy.cumsum(counts)
+        starts = ends - counts
+        maxes = sorted_times[ends - 1]
+        medians = (sorted_times[starts + (counts - 1) // 2]
+                   + sorted_times[starts + counts // 2]) / 2
+        return counts, sums, maxes, medians
+
+    def report_list(self, top_records_no):
+        if not self.url_ids:
+            return list()
+        counts, sums, maxes, medians = (column.tolist() for column in self.group_statistic())
+        urls = list(self.url_ids)
+        top_url_ids = sorted(range(len(urls)), key=lambda url_id: round(sums[url_id], 3),
+                             reverse=True)[:top_records_no]
+        return [format_url_statistic(urls[url_id], counts[url_id], sums[url_id],
+                                     sums[url_id] / counts[url_id], maxes[url_id],
+                                     medians[url_id], self.total_request_qty,
+                                     self.total_request_time)
+                for url_id in top_url_ids]
+
+    def to_report_aggregate(self):
+        """Return ReportAggregate with the same records (for merging and storing)"""
+        report_aggregate = ReportAggregate(STAT_MODE_EXACT, self.sketch_k, self.url_normalization,
+                                           errors_lines_limit=self.errors_lines_limit)
+        url_ids, request_times = self.get_arrays()
+        order = numpy.argsort(url_ids, kind='stable')
+        counts = numpy.bincount(url_ids, minlength=len(self.url_ids)).tolist()
+        position = 0
+        grouped_times = request_times[order].tolist()
+        for url_line, count in zip(self.url_ids, counts):
+            report_aggregate.url_request_time[url_line] = \
+                array('d', grouped_times[position:position + count])
+            position += count
+        report_aggregate.total_request_qty = self.total_request_qty
+        report_aggregate.total_request_time = self.total_request_time
+        report_aggregate.merge_parse_statistic(self)
+        return report_aggregate
+
+    def to_sketch_aggregate(self, sketch_k):
+        return self.to_report_aggregate().to_sketch_aggregate(sketch_k)
+
+
+class UrlNormalizer:
+    """Collapses high-cardinality urls to templates before aggregation
+
+    Normalized urls are cached, cache is cleared when it grows over cache_size.
+
+    replace_ids -- replace numeric, long hexadecimal and uuid path segments with {id}
+    query_mode -- URL_QUERY_KEEP, URL_QUERY_STRIP or URL_QUERY_WHITELIST (keep only
+                  parameters listed in query_whitelist)
+    rules -- list of [regexp, replacement] pairs applied to url with re.sub in order
+    """
+    id_regexp = re.compile(r'(?<=/)(?:\d+|(?=[0-9a-fA-F]*\d)[0-9a-fA-F]{8,}|'
+                           r'[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-'
+                           r'[0-9a-fA-F]{4}-[0-9a-fA-F]{12})(?=/|$)')
+
+    def __init__(self, replace_ids=True, query_mode=URL_QUERY_KEEP, query_whitelist=(),
+                 rules=(), cache_size=100000):
+        if query_mode not in (URL_QUERY_KEEP, URL_QUERY_STRIP, URL_QUERY_WHITELIST):
+            raise ValueError('Unknown url query mode: {}'.format(query_mode))
+        self.replace_ids = replace_ids
+        self.query_mode = query_mode
+        self.query_whitelist = frozenset(query_whitelist)
+        self.rules = [(re.compile(pattern), replacement) for pattern, replacement in rules]
+        self.cache_size = cache_size
+        self.cache = dict()
+
+    def __call__(self, url_line):
+        normalized_url = self.cache.get(url_line)
+        if normalized_url is None:
+            if url_line is None:
+                return None
+            if len(self.cache) >= self.cache_size:
+                self.cache.clear()
+            normalized_url = self.cache[url_line] = self.normalize(url_line)
+        return normalized_url
+
+    def normalize(self, url_line):
+        path, question, query = url_line.partition('?')
+        if self.replace_ids:
+            path = self.id_regexp.sub('{id}', path)
+        if self.query_mode == URL_QUERY_STRIP:
+            query = ''
+        elif self.query_mode == URL_QUERY_WHITELIST:
+            query = '&'.join(parameter for parameter in query.split('&')
+                             if parameter.partition('=')[0] in self.query_whitelist)
+        url_line = path + '?' + query if query else path
+        for rule_regexp, replacement in self.rules:
+            url_line = rule_regexp.sub(replacement, url_line)
+        return url_line
+
+
+class QuantileSketch:
+    """Mergeable bounded-memory quantile sketch of request times (KLL compactors)
+
+    Values are kept in levels, item of level h stands for 2**h source values. When
+    sketch size reaches the sum of levels capacities, the lowest full level is sorted
+    and every second item from random offset is promoted to the next level, capacity
+    of lower levels decreases by factor 2/3, so sketch stores less than 3 * k values.
+    Until the first compaction sketch holds all values and quantiles are exact.
+    After that the rank of returned value differs from the requested one by about
+    1.7 / k of values count (under 1% for default k=200), count, sum and max are
+    always exact.
+    """
+    __slots__ = ('k', 'levels', 'capacities', 'max_size', 'size', 'count', 'sum', 'max')
+
+    def __init__(self, k=200):
+        self.k = k
+        self.levels = [[]]
+        self.capacities = [k]
+        self.max_size = k
+        self.size = 0
+        self.count = 0
+        self.sum = 0
+        self.max = None
+
+    def append(self, value):
+        self.levels[0].append(value)
+        self.size += 1
+        self.count += 1
+        self.sum += value
+        if self.max is None or value > self.max:
+            self.max = value
+        if self.size >= self.max_size:
+            self.compress()
+
+    def extend(self, values):
+        """Add values in bulk: level 0 is extended by all of them and compacted once"""
+        if not len(values):
+            return self
+        self.levels[0].extend(values)
+        self.size += len(values)
+        self.count += len(values)
+        self.sum = sum(values, self.sum)
+        values_max = max(values)
+        if self.max is None or values_max > self.max:
+            self.max = values_max
+        self.compress()
+        return self
+
+    def merge(self, other):
+        for height, other_level in enumerate(other.levels):
+            if height == len(self.levels):
+                self.add_level()
+            self.levels[height].extend(other_level)
+        self.size += other.size
+        self.count += other.count
+        self.sum += other.sum
+        if other.max is not None and (self.max is None or other.max > self.max):
+            self.max = other.max
+        self.compress()
+        return self
+
+    def add_level(self):
+        self.levels.append([])
+        self.update_capacities()
+
+    def update_capacities(self):
+        top_level_no = len(self.levels) - 1
+        self.capacities = [max(2, int(self.k * (2 / 3) ** (top_level_no - height)))
+                           for height in range(len(self.levels))]
+        self.max_size = sum(self.capacities)
+
+    def to_dict(self):
+        return {'k': self.k, 'levels': self.levels, 'count': self.count,
+                'sum': self.sum, 'max': self.max}
+
+    @classmethod
+    def from_dict(cls, sketch_dict):
+        sketch = cls(sketch_dict['k'])
+        sketch.levels = [list(level) for level in sketch_dict['levels']]
+        sketch.size = sum(map(len, sketch.levels))
+        sketch.count = sketch_dict['count']
+        sketch.sum = sketch_dict['sum']
+        sketch.max = sketch_dict['max']
+        sketch.update_capacities()
+        return sketch
+
+    def compress(self):
+        """Compact the lowest full level until sketch is smaller than the sum of capacities"""
+        while self.size >= self.max_size:
+            height = next(height for height, (level, capacity)
+                          in enumerate(zip(self.levels, self.capacities)) if len(level) >= capacity)
+            if height + 1 == len(self.levels):
+                self.add_level()
+            level = self.levels[height]
+            level.sort()
+            even_size = len(level) - len(level) % 2
+            self.levels[height + 1].extend(level[random.getrandbits(1):even_size:2])
+            self.levels[height] = level[even_size:]
+            self.size -= even_size // 2
+
+    def quantile(self, rank):
+        if self.count == 0:
+            return None
+        if len(self.levels) == 1:
+            values = sorted(self.levels[0])
+            position = rank * (len(values) - 1)
+            lower = int(position)
+            upper = min(lower + 1, len(values) - 1)
+            return values[lower] + (values[upper] - values[lower]) * (position - lower)
+        weighted_values = sorted((value, 1 << height)
+                                 for height, level in enumerate(self.levels)
+                                 for value in level)
+        target_weight = rank * self.count
+        cumulative_weight = 0
+        for value, weight in weighted_values:
+            cumulative_weight += weight
+            if cumulative_weight >= target_weight:
+                return value
+        return weighted_values[-1][0]
+
+
+def get_complete_lines_end(log_filename, file_size):
+    """Return offset after the last newline of file, growing log may end with partial line"""
+    with open(log_filename, mode='rb') as log_file:
+        block_end = file_size
+        while block_end > 0:
+            block_start = max(0, block_end - 65536)
+            log_file.seek(block_start)
+            newline_pos = log_file.read(block_end - block_start).rfind(b'\n')
+            if newline_pos >= 0:
+                return block_start + newline_pos + 1
+            block_end = block_start
+    return 0
+
+
+def get_peak_memory_bytes():
+    """Return peak RSS of current process or its worker processes, None if unsupported"""
+    if resource is None:
+        return None
+    peak_rss = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                   resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # ru_maxrss is in bytes on macOS and in kilobytes on other unix systems
+    return peak_rss if sys.platform == 'darwin' else peak_rss * 1024
+
+
+class RunMetrics:
+    """Analyzer run stages timings and counters
+
+    Stages timings are summed when stage is repeated. Stages are measured
+    sequentially, except decompress which runs in PipelinedGzipReader thread
+    in parallel with parse_aggregate (read, parse and aggregate are one
+    streaming pass over log lines, so they are timed together).
+    """
+    def __init__(self, mode=RUN_MODE_DAILY):
+        self.mode = mode
+        self.status = RUN_STATUS_OK
+        self.started = time.time()
+        self.started_counter = time.perf_counter()
+        self.stages = dict()
+        self.counters = dict()
+        self.profiler = None
+
+    @contextmanager
+    def stage(self, stage_name):
+        started = time.perf_counter()
+        try:
+            if self.profiler is None:
+                yield
+            else:
+                with self.profiler.stage(stage_name):
+                    yield
+        finally:
+            self.add_stage_seconds(stage_name, time.perf_counter() - started)
+
+    def add_stage_seconds(self, stage_name, seconds):
+        self.stages[stage_name] = self.stages.get(stage_name, 0.0) + seconds
+
+    def add(self, counter_name, value):
+        self.counters[counter_name] = self.counters.get(counter_name, 0) + value
+
+    def set(self, counter_name, value):
+        self.counters[counter_name] = value
+
+    def add_aggregate(self, report_aggregate):
+        self.add('lines', report_aggregate.lines_count)
+        self.add('parse_errors', report_aggregate.parse_errors_count)
+        self.set('distinct_urls', report_aggregate.get_urls_count())
+
+    def to_dict(self):
+        counters = dict(self.counters)
+        parse_seconds = self.stages.get('parse_aggregate') or self.stages.get('parse')
+        if parse_seconds and 'lines' in counters:
+            counters['lines_per_second'] = round(counters['lines'] / parse_seconds, 1)
+        counters['peak_memory_bytes'] = get_peak_memory_bytes()
+        return {
+            'mode': self.mode,
+            'status': self.status,
+            'started': datetime.datetime.fromtimestamp(self.started).isoformat(),
+            'duration_seconds': round(time.perf_counter() - self.started_counter, 6),
+            'stages_seconds': {stage_name: round(seconds, 6)
+                               for stage_name, seconds in self.stages.items()},
+            'counters': counters
+        }
+
+    @staticmethod
+    def to_prometheus(metrics_dict):
+        """Return metrics in Prometheus text exposition format (textfile collector)"""
+        mode_label = 'mode="{}"'.format(metrics_dict['mode'])
+        metrics_lines = [
+            '# HELP {}run_success Last run finished without errors'.format(METRICS_PREFIX),
+            '# TYPE {}run_success gauge'.format(METRICS_PREFIX),
+            '{}run_success{{{}}} {:d}'.format(METRICS_PREFIX, mode_label,
+                                              metrics_dict['status'] != RUN_STATUS_FAILED),
+            '# HELP {}last_run_timestamp_seconds Last run start time'.format(METRICS_PREFIX),
+            '# TYPE {}last_run_timestamp_seconds gauge'.format(METRICS_PREFIX),
+            '{}last_run_timestamp_seconds{{{}}} {}'.format(
+                METRICS_PREFIX, mode_label,
+                datetime.datetime.fromisoformat(metrics_dict['started']).timestamp()),
+            '# HELP {}run_duration_seconds Last run duration'.format(METRICS_PREFIX),
+            '# TYPE {}run_duration_seconds gauge'.format(METRICS_PREFIX),
+            '{}run_duration_seconds{{{}}} {}'.format(METRICS_PREFIX, mode_label,
+                                                     metrics_dict['duration_seconds']),
+            '# HELP {}stage_seconds Last run stage duration'.format(METRICS_PREFIX),
+            '# TYPE {}stage_seconds gauge'.format(METRICS_PREFIX),
+        ]
+        for stage_name, seconds in metrics_dict['stages_seconds'].items():
+            metrics_lines.append('{}stage_seconds{{{},stage="{}"}} {}'.format(
+                METRICS_PREFIX, mode_label, stage_name, seconds))
+        for counter_name, value in metrics_dict['counters'].items():
+            if value is None:
+                continue
+            metrics_lines.append('# TYPE {}{} gauge'.format(METRICS_PREFIX, counter_name))
+            metrics_lines.append('{}{}{{{}}} {}'.format(METRICS_PREFIX, counter_name,
+                                                        mode_label, value))
+        return '\n'.join(metrics_lines) + '\n'
+
+
+def write_text_atomic(filename, text):
+    with atomic_write(filename, encoding='utf-8') as text_file:
+        text_file.write(text)
+
+
+def store_run_metrics(config_dict, run_metrics):
+    """Write run metrics to json file and Prometheus textfile, empty path disables file"""
+    metrics_dict = run_metrics.to_dict()
+    logging.info('run metrics:{}'.format(json.dumps(metrics_dict)))
+    try:
+        if config_dict['metrics_path']:
+            write_text_atomic(config_dict['metrics_path'], json.dumps(metrics_dict, indent=2))
+        if config_dict['metrics_prometheus_path']:
+            write_text_atomic(config_dict['metrics_prometheus_path'],
+                              RunMetrics.to_prometheus(metrics_dict))
+    except OSError:
+        logging.exception('Store metrics error')
+    return metrics_dict
+
+
+class RunProfiler:
+    """cProfile and tracemalloc profiler of analyzer run
+
+    Whole run is profiled by cProfile, allocations of every RunMetrics stage are
+    compared by tracemalloc snapshots taken before and after stage. Only main
+    process is profiled, worker processes of parallel modes are not.
+    """
+    def __init__(self, top_allocations=PROFILE_TOP_ALLOCATIONS):
+        self.top_allocations = top_allocations
+        self.profile = cProfile.Profile()
+        self.stage_allocations = []
+        self.peak_traced_bytes = None
+
+    def start(self):
+        if hasattr(os, 'register_at_fork'):
+            # forked worker processes inherit profiler and tracing, it only slows them down
+            os.register_at_fork(after_in_child=self.stop)
+        tracemalloc.start()
+        self.profile.enable()
+
+    def stop(self):
+        self.profile.disable()
+        if tracemalloc.is_tracing():
+            self.peak_traced_bytes = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+    @staticmethod
+    def take_snapshot():
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            tracemalloc.Filter(False, '<unknown>'),
+        ))
+
+    @contextmanager
+    def stage(self, stage_name):
+        if not tracemalloc.is_tracing():
+            yield
+            return
+        # snapshots are not profiled, they are not part of analyzer run
+        self.profile.disable()
+        snapshot_before = self.take_snapshot()
+        self.profile.enable()
+        try:
+            yield
+        finally:
+            self.profile.disable()
+            statistic_diffs = self.take_snapshot().compare_to(snapshot_before, 'lineno')
+            self.stage_allocations.append(
+                (stage_name, sum(diff.size_diff for diff in statistic_diffs),
+                 statistic_diffs[:self.top_allocations]))
+            self.profile.enable()
+
+    def allocations_text(self):
+        lines = ['peak traced memory: {} bytes'.format(self.peak_traced_bytes)]
+        for stage_name, size_diff, statistic_diffs in self.stage_allocations:
+            lines.append('')
+            lines.append('stage {}: {:+d} bytes, top {} allocation sites'.format(
+                stage_name, size_diff, len(statistic_diffs)))
+            lines.extend('  {}'.format(statistic_diff) for statistic_diff in statistic_diffs)
+        return '\n'.join(lines) + '\n'
+
+    def dump(self, profile_filename_root):
+        """Write profile statistic to .pstats file and stages allocations to .alloc.txt file"""
+        os.makedirs(os.path.dirname(os.path.abspath(profile_filename_root)), exist_ok=True)
+        self.profile.dump_stats(profile_filename_root + '.pstats')
+        write_text_atomic(profile_filename_root + '.alloc.txt', self.allocations_text())
+        return profile_filename_root + '.pstats', profile_filename_root + '.alloc.txt'
+
+
+def get_profile_filename_root(config_dict, run_metrics):
+    """Return profile files path without extension, in internal log directory"""
+    return os.path.join(os.path.dirname(os.path.abspath(config_dict['internal_log_path'])),
+                        'profile-{}-{}'.format(
+                            datetime.datetime.fromtimestamp(run_metrics.started)
+                            .strftime(PROFILE_FILEDATE_FORMAT), run_metrics.mode))
+
+
+def is_profiled_run(config_dict):
+    """Return True if run is sampled for profiling (every profile_every_nth_run run)
+
+    Runs are counted in file in internal log directory, so only every Nth analyzer
+    launch is profiled when profile_every_nth_run is greater than 1.
+    """
+    every_nth_run = config_dict['profile_every_nth_run']
+    if not every_nth_run or not config_dict['is_launch']:
+        return False
+    if every_nth_run == 1:
+        return True
+    counter_filename = os.path.join(
+        os.path.dirname(os.path.abspath(config_dict['internal_log_path'])),
+        PROFILE_RUN_COUNTER_FILENAME)
+    try:
+        with open(counter_filename, mode='r', encoding='utf-8') as counter_file:
+            run_no = int(json.load(counter_file)['runs'])
+    except (OSError, ValueError, KeyError, TypeError):
+        run_no = 0
+    try:
+        write_text_atomic(counter_filename, json.dumps({'runs': run_no + 1}))
+    except OSError:
+        logging.exception('Store profile run counter error')
+    return run_no % every_nth_run == 0
+
+
+def store_run_profile(config_dict, run_metrics, run_profiler):
+    try:
+        profile_filenames = run_profiler.dump(get_profile_filename_root(config_dict, run_metrics))
+    except OSError:
+        logging.exception('Store profile error')
+    else:
+        logging.info('run profile:{}, allocations:{}'.format(*profile_filenames))
+
+
+def dump_json_gzip(filename, data):
+    # json.dumps uses C encoder, json.dump to file object encodes with Python code
+    json_text = json.dumps(data, separators=(',', ':'))
+    with atomic_write(filename, mode='wt', opener=gzip.open, encoding='utf-8',
+                      compresslevel=JSON_GZIP_COMPRESS_LEVEL) as json_file:
+        json_file.write(json_text)
+
+
+def load_json_gzip(filename):
+    with gzip.open(filename, mode='rt', encoding='utf-8') as json_file:
+        return json.load(json_file)
+
+
+def get_day_aggregate_filename(aggregate_store_dir, log_filedate):
+    return os.path.join(aggregate_store_dir,
+                        'aggregate-{}.json.gz'.format(log_filedate.strftime('%Y%m%d')))
+
+
+def store_day_aggregate(aggregate_store_dir, log_filedate, report_aggregate):
+    dump_json_gzip(get_day_aggregate_filename(aggregate_store_dir, log_filedate),
+                   {'version': AGGREGATE_STORE_VERSION,
+                    'date': log_filedate.isoformat(),
+                    'aggregate': report_aggregate.to_dict()})
+
+
+def load_day_aggregate(aggregate_store_dir, log_filedate):
+    """Return stored ReportAggregate of log date or None"""
+    try:
+        stored_dict = load_json_gzip(get_day_aggregate_filename(aggregate_store_dir,
+                                                                log_filedate))
+    except FileNotFoundError:
+        return None
+    if stored_dict.get('version') != AGGREGATE_STORE_VERSION:
+        logging.warning('Unsupported aggregate store version, date:{}'.format(log_filedate))
+        return None
+    return ReportAggregate.from_dict(stored_dict['aggregate'])
+
+
+class ParsedLogColumns:
+    """Parsed log records in columns: interned requests table, requests indexes,
+    request times and status codes arrays
+
+    Iteration returns (request, request_time) records and parse statistic is kept,
+    so columns are accepted by ReportAggregate.update instead of LogRecordGen.
+    Columns are stored to binary sidecar file: magic, json header length (4 bytes),
+    json header, requests table (newline separated utf-8) and raw arrays.
+    Status codes which are not numbers or do not fit unsigned short are stored as 0.
+    """
+    fields = REPORT_FIELDS
+    columns = (('request_ids', 'I'), ('request_times', 'd'), ('statuses', 'H'))
+
+    def __init__(self):
+        self.requests = list()
+        self.request_ids = array('I')
+        self.request_times = array('d')
+        self.statuses = array('H')
+        self.lines_count = 0
+        self.parse_errors_count = 0
+        self.parse_errors_lines_list = list()
+
+    def __iter__(self):
+        return zip(map(self.requests.__getitem__, self.request_ids), self.request_times)
+
+    @classmethod
+    def from_records(cls, log_record_gen):
+        """Collect columns from LogRecordGen of (request, request_time[, status]) records"""
+        parsed_columns = cls()
+        requests = parsed_columns.requests
+        request_index = dict()
+        request_ids_append = parsed_columns.request_ids.append
+        request_times_append = parsed_columns.request_times.append
+        statuses_append = parsed_columns.statuses.append
+        for record in log_record_gen:
+            request_id = request_index.get(record[0])
+            if request_id is None:
+                request_id = request_index[record[0]] = len(requests)
+                requests.append(record[0])
+            request_ids_append(request_id)
+            request_times_append(record[1])
+            if len(record) > 2:
+                status = int(record[2]) if record[2].isdigit() else 0
+                statuses_append(status if status <= PARSED_CACHE_STATUS_MAX else 0)
+        parsed_columns.lines_count = log_record_gen.lines_count
+        parsed_columns.parse_errors_count = log_record_gen.parse_errors_count
+        parsed_columns.parse_errors_lines_list = list(log_record_gen.parse_errors_lines_list)
+        return parsed_columns
+
+    def store(self, cache_filename, source_key):
+        """Write columns to cache file
+
+        source_key -- json-able data identifying parsed log and parser, columns are
+                      loaded only for the same key
+        """
+        requests_data = '\n'.join(self.requests).encode('utf-8')
+        header = json.dumps({
+            'version': PARSED_CACHE_VERSION,
+            'source': source_key,
+            'byteorder': sys.byteorder,
+            'lines_count': self.lines_count,
+            'parse_errors_count': self.parse_errors_count,
+            'parse_errors_lines_list': self.parse_errors_lines_list,
+            'requests_count': len(self.requests),
+            'requests_size': len(requests_data),
+            'columns': [[name, typecode, len(getattr(self, name))]
+                        for name, typecode in self.columns],
+        }).encode('utf-8')
+        with atomic_write(cache_filename, mode='wb') as cache_file:
+            cache_file.write(PARSED_CACHE_MAGIC)
+            cache_file.write(len(header).to_bytes(4, 'little'))
+            cache_file.write(header)
+            cache_file.write(requests_data)
+            for name, _ in self.columns:
+                getattr(self, name).tofile(cache_file)
+
+    @classmethod
+    def load(cls, cache_filename, source_key):
+        """Return columns stored for the same source key or None"""
+        try:
+            with open(cache_filename, mode='rb') as cache_file:
+                if cache_file.read(len(PARSED_CACHE_MAGIC)) != PARSED_CACHE_MAGIC:
+                    return None
+                header = json.loads(cache_file.read(
+                    int.from_bytes(cache_file.read(4), 'little')).decode('utf-8'))
+                if header.get('version') != PARSED_CACHE_VERSION \
+                        or header.get('source') != source_key:
+                    return None
+                parsed_columns = cls()
+                if header['requests_count']:
+                    parsed_columns.requests = \
+                        cache_file.read(header['requests_size']).decode('utf-8').split('\n')
+                for name, typecode, length in header['columns']:
+                    column = array(typecode)
+                    column.fromfile(cache_file, length)
+                    if header['byteorder'] != sys.byteorder:
+                        column.byteswap()
+                    setattr(parsed_columns, name, column)
+        except FileNotFoundError:
+            return None
+        except (OSError, EOFError, ValueError, KeyError):
+            logging.exception('Parsed log cache read error:' + cache_filename)
+            return None
+        if len(parsed_columns.requests) != header['requests_count']:
+            return None
+        parsed_columns.lines_count = header['lines_count']
+        parsed_columns.parse_errors_count = header['parse_errors_count']
+        parsed_columns.parse_errors_lines_list = header['parse_errors_lines_list']
+        return parsed_columns
+
+
+def get_parsed_cache_filename(config_dict, log_filename):
+    """Return columnar cache sidecar path, next to the log if parsed_cache_dir is empty"""
+    cache_dir = config_dict['parsed_cache_dir'] or os.path.dirname(os.path.abspath(log_filename))
+    return os.path.join(cache_dir, os.path.basename(log_filename) + PARSED_CACHE_SUFFIX)
+
+
+def get_parser_fields(log_parser_regexp):
+    """Return fields names of compiled regexp or LogFormatParser"""
+    if isinstance(log_parser_regexp, LogFormatParser):
+        return [name for _, name in LogFormatParser.parse_format(log_parser_regexp.log_format)]
+    return list(log_parser_regexp.groupindex)
+
+
+def get_parser_key(log_parser_regexp):
+    if isinstance(log_parser_regexp, LogFormatParser):
+        return [LOG_PARSER_LOG_FORMAT, log_parser_regexp.log_format,
+                log_parser_regexp.fallback_regexp.pattern
+                if log_parser_regexp.fallback_regexp is not None else None]
+    return [LOG_PARSER_REGEXP, log_parser_regexp.pattern]
+
+
+def load_parsed_columns(config_dict, log_filename, run_metrics):
+    """Return ParsedLogColumns of log from columnar cache or parse log and store cache
+
+    Cache is valid for the same log size, mtime and parser settings
+    """
+    log_stat = os.stat(log_filename)
+    source_key = {
+        'log_filename': os.path.basename(log_filename),
+        'size': log_stat.st_size,
+        'mtime_ns': log_stat.st_mtime_ns,
+        'parser': get_parser_key(config_dict['log_line_parser']),
+    }
+    cache_filename = get_parsed_cache_filename(config_dict, log_filename)
+    with run_metrics.stage('load_parsed_cache'):
+        parsed_columns = ParsedLogColumns.load(cache_filename, source_key)
+    run_metrics.set('parsed_cache_hit', int(parsed_columns is not None))
+    if parsed_columns is not None:
+        return parsed_columns
+
+    fields = REPORT_FIELDS
+    if 'status' in get_parser_fields(config_dict['log_line_parser']):
+        fields = REPORT_FIELDS + ('status',)
+    with run_metrics.stage('parse'):
+        with LogRecordGen(log_filename, config_dict['log_line_parser'], None,
+                          fields=fields,
+                          gzip_pipeline=config_dict['gzip_pipeline'],
+                          use_mmap=config_dict['log_mmap'],
+                          **get_parse_error_options(config_dict)) as log_record_gen:
+            parsed_columns = ParsedLogColumns.from_records(log_record_gen)
+    try:
+        with run_metrics.stage('store_parsed_cache'):
+            parsed_columns.store(cache_filename, source_key)
+    except OSError:
+        logging.exception('Parsed log cache store error:' + cache_filename)
+    return parsed_columns
+
+
+def period_report(config_dict, date_from, date_to, run_metrics=None):
+    """Create report for dates range by merging stored daily aggregates
+
+    date_from, date_to -- range bounds (inclusive), date or ISO format string
+    run_metrics -- RunMetrics for stages timings and counters (optional)
+    """
+    if run_metrics is None:
+        run_metrics = RunMetrics(RUN_MODE_PERIOD)
+    if isinstance(date_from, str):
+        date_from = datetime.date.fromisoformat(date_from)
+    if isinstance(date_to, str):
+        date_to = datetime.date.fromisoformat(date_to)
+    report_aggregate = ReportAggregate(STAT_MODE_SKETCH, config_dict['sketch_k'])
+    missing_dates = list()
+    log_filedate = date_from
+    with run_metrics.stage('load_aggregate'):
+        while log_filedate <= date_to:
+            day_aggregate = load_day_aggregate(config_dict['aggregate_store_dir'], log_filedate)
+            if day_aggregate is None:
+                missing_dates.append(log_filedate.isoformat())
+            else:
+                report_aggregate.merge(day_aggregate)
+            log_filedate += datetime.timedelta(days=1)
+    run_metrics.add_aggregate(report_aggregate)
+    run_metrics.add('missing_days', len(missing_dates))
+    if missing_dates:
+        logging.warning('No stored aggregates for dates: {}'.format(', '.join(missing_dates)))
+    if not report_aggregate.total_request_qty:
+        logging.error('Period report is empty: {} - {}'.format(date_from, date_to))
+        run_metrics.status = RUN_STATUS_FAILED
+        return None
+
+    report_filename = os.path.join(
+        config_dict['report_dir'],
+        config_dict['period_report_filename_root'].format(
+            date_from.strftime(config_dict['report_filedate_format']),
+            date_to.strftime(config_dict['report_filedate_format'])))
+    with run_metrics.stage('sort'):
+        url_statistic_list = report_aggregate.report_list(config_dict['report_size'])
+    with run_metrics.stage('render'):
+        write_report(config_dict, report_filename, url_statistic_list)
+    run_metrics.add('reports_created', 1)
+    return report_filename
+
+
+def align_line_offset(log_file, offset, file_size):
+    """Return offset of the first line beginning at offset or after it"""
+    if offset <= 0:
+        return 0
+    if offset >= file_size:
+        return file_size
+    log_file.seek(offset - 1)
+    log_file.readline()
+    return log_file.tell()
+
+
+def map_partial(config_dict, log_filename, partial_filename, start_offset=0, end_offset=None,
+                run_metrics=None):
+    """Aggregate log file or its byte range and store partial aggregate for reduce_partials
+
+    Range bounds are moved to the beginning of lines, so adjacent ranges cover every
+    line once. Gzipped log can be aggregated only whole.
+
+    run_metrics -- RunMetrics for stages timings and counters (optional)
+    """
+    if not partial_filename:
+        raise ValueError('Partial aggregate path is required for map: ' + log_filename)
+    if run_metrics is None:
+        run_metrics = RunMetrics(RUN_MODE_MAP)
+    log_stat = os.stat(log_filename)
+    if log_filename.endswith('.gz'):
+        if start_offset or end_offset is not None:
+            raise ValueError('Byte range of gzipped log is not supported: ' + log_filename)
+        bytes_read = log_stat.st_size
+    else:
+        with open(log_filename, mode='rb') as log_file:
+            start_offset = align_line_offset(log_file, start_offset, log_stat.st_size)
+            end_offset = align_line_offset(log_file, log_stat.st_size if end_offset is None
+                                           else end_offset, log_stat.st_size)
+        bytes_read = max(0, end_offset - start_offset)
+    time_bucket_minutes = config_dict['report_time_bucket_minutes']
+    aggregate_options = get_aggregate_options(config_dict)
+    with run_metrics.stage('parse_aggregate'):
+        with LogRecordGen(log_filename, config_dict['log_line_parser'], None,
+                          start_offset, end_offset, get_report_fields(time_bucket_minutes),
+                          gzip_pipeline=config_dict['gzip_pipeline'],
+                          use_mmap=config_dict['log_mmap'],
+                          **get_parse_error_options(config_dict)) as log_record_gen:
+            report_aggregate = create_report_aggregate(aggregate_options, time_bucket_minutes)
+            report_aggregate.update(log_record_gen)
+    run_metrics.add('bytes_read', bytes_read)
+    run_metrics.add_aggregate(report_aggregate)
+    log_filedate = get_file_date(log_filename, config_dict['log_filename_regexp'],
+                                 config_dict['log_filedate_format'])
+    with run_metrics.stage('store_partial'):
+        dump_json_gzip(partial_filename, {
+            'version': PARTIAL_AGGREGATE_VERSION,
+            'source': {
+                'log_filename': os.path.basename(log_filename),
+                'size': log_stat.st_size,
+                'mtime_ns': log_stat.st_mtime_ns,
+                'start_offset': start_offset,
+                'end_offset': end_offset,
+            },
+            'date': log_filedate.isoformat() if log_filedate is not None else None,
+            'time_bucket_minutes': time_bucket_minutes,
+            'aggregate_options': aggregate_options,
+            'aggregate': report_aggregate.to_dict(),
         })
-    return sorted(url_statistic_list,
-                  key=lambda record_dict: record_dict['time_sum'],
-                  reverse=True)[:top_records_no]
+    logging.info('partial aggregate stored:{}'.format(partial_filename))
+    return partial_filename
+
+
+def load_partial(partial_filename):
+    partial_dict = load_json_gzip(partial_filename)
+    if partial_dict.get('version') != PARTIAL_AGGREGATE_VERSION:
+        raise ValueError('Unsupported partial aggregate version: ' + partial_filename)
+    return partial_dict
+
+
+def get_partial_source_key(partial_dict):
+    """Return (log filename, size, mtime, start offset, end offset) of partial source"""
+    source = partial_dict['source']
+    return source['log_filename'], source['size'], source['mtime_ns'], source['start_offset'], \
+        source['size'] if source['end_offset'] is None else source['end_offset']
+
+
+def merge_partials(partials):
+    """Return aggregate merged from partial aggregates dictionaries
+
+    Partials are merged in order of log file and byte offset, so result does not depend
+    on partials order and is the same as aggregate of whole log. Partials must have
+    the same aggregate settings and byte ranges of one log must not overlap.
+    """
+    partials = sorted(partials, key=get_partial_source_key)
+    if len({json.dumps([partial_dict['time_bucket_minutes'], partial_dict['aggregate_options']],
+                       sort_keys=True) for partial_dict in partials}) > 1:
+        raise ValueError('Partial aggregates have different aggregate settings')
+    report_aggregate = None
+    previous_dict = None
+    for partial_dict in partials:
+        if previous_dict is not None \
+                and get_partial_source_key(partial_dict)[:3] == \
+                get_partial_source_key(previous_dict)[:3] \
+                and (previous_dict['source']['end_offset'] is None
+                     or partial_dict['source']['start_offset']
+                     < previous_dict['source']['end_offset']):
+            raise ValueError('Partial aggregates overlap: {}, offset {}'.format(
+                partial_dict['source']['log_filename'], partial_dict['source']['start_offset']))
+        previous_dict = partial_dict
+        aggregate_class = TimeBucketAggregate if partial_dict['time_bucket_minutes'] \
+            else ReportAggregate
+        partial_aggregate = aggregate_class.from_dict(partial_dict['aggregate'])
+        report_aggregate = partial_aggregate if report_aggregate is None \
+            else report_aggregate.merge(partial_aggregate)
+    return report_aggregate
+
+
+def reduce_partials(config_dict, partial_filenames, report_filename=None, run_metrics=None):
+    """Merge partial aggregates stored by map_partial and render report
+
+    report_filename -- report path, default is report of partials log date
+    run_metrics -- RunMetrics for stages timings and counters (optional)
+    """
+    if run_metrics is None:
+        run_metrics = RunMetrics(RUN_MODE_REDUCE)
+    with run_metrics.stage('load_partials'):
+        partials = [load_partial(partial_filename) for partial_filename in partial_filenames]
+    with run_metrics.stage('merge'):
+        report_aggregate = merge_partials(partials)
+    run_metrics.add('partials', len(partials))
+    run_metrics.add_aggregate(report_aggregate)
+    log_parse_statistic(report_aggregate.lines_count,
+                        report_aggregate.parse_errors_count,
+                        config_dict['log_parse_error_threshold'])
+    if report_filename is None:
+        log_filedates = {partial_dict['date'] for partial_dict in partials}
+        if len(log_filedates) != 1 or None in log_filedates:
+            raise ValueError('Report filename is required for partials of several or '
+                             'unknown dates')
+        report_filename = os.path.join(
+            config_dict['report_dir'],
+            config_dict['report_filename_root'].format(
+                datetime.date.fromisoformat(log_filedates.pop()).strftime(
+                    config_dict['report_filedate_format'])))
+    with run_metrics.stage('sort'):
+        url_statistic_list = report_aggregate.report_list(config_dict['report_size'])
+    with run_metrics.stage('render'):
+        write_report(config_dict, report_filename, url_statistic_list)
+    run_metrics.add('reports_created', 1)
+    logging.info('report created from {} partial aggregates:{}'.format(
+        len(partials), report_filename))
+    return report_filename
+
+
+def load_checkpoint(checkpoint_path):
+    try:
+        checkpoint = load_json_gzip(checkpoint_path)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError):
+        logging.exception('Checkpoint read error, log will be parsed from the beginning')
+        return None
+    if checkpoint.get('version') != CHECKPOINT_VERSION:
+        logging.warning('Unsupported checkpoint version, log will be parsed from the beginning')
+        return None
+    return checkpoint
+
+
+def get_checkpoint_times_filename(checkpoint_path, generation):
+    return '{}.{}.times'.format(checkpoint_path, generation)
+
+
+def load_checkpoint_aggregate(checkpoint_path, checkpoint):
+    """Return checkpoint aggregate or None when its request times can not be read
+
+    Exact request times are kept in append-only binary sidecar: sequence of blocks
+    written by incremental runs, block is json header length (4 bytes), json header
+    of [url, values count] pairs and raw request times arrays of those urls.
+    """
+    report_aggregate = ReportAggregate.from_dict(checkpoint['aggregate'])
+    if report_aggregate.stat_mode != STAT_MODE_EXACT or checkpoint['times_size'] is None:
+        return report_aggregate
+    times_filename = get_checkpoint_times_filename(checkpoint_path,
+                                                   checkpoint['times_generation'])
+    url_request_time = report_aggregate.url_request_time
+    try:
+        with open(times_filename, mode='rb') as times_file:
+            while times_file.tell() < checkpoint['times_size']:
+                header = json.loads(times_file.read(
+                    int.from_bytes(times_file.read(4), 'little')).decode('utf-8'))
+                for url_line, length in header:
+                    url_request_time[url_line].fromfile(times_file, length)
+    except (OSError, EOFError, ValueError):
+        logging.exception('Checkpoint request times read error, '
+                          'log will be parsed from the beginning')
+        return None
+    if checkpoint['byteorder'] != sys.byteorder:
+        for request_time_list in url_request_time.values():
+            request_time_list.byteswap()
+    return report_aggregate
+
+
+def get_stored_times(report_aggregate):
+    """Return url: (request times array, stored values count) of exact aggregate"""
+    if report_aggregate.stat_mode != STAT_MODE_EXACT:
+        return dict()
+    return {url_line: (request_time_list, len(request_time_list))
+            for url_line, request_time_list in report_aggregate.url_request_time.items()}
+
+
+def write_times_block(times_file, url_times):
+    header = json.dumps([[url_line, len(request_time_list)]
+                         for url_line, request_time_list in url_times]).encode('utf-8')
+    times_file.write(len(header).to_bytes(4, 'little'))
+    times_file.write(header)
+    for _, request_time_list in url_times:
+        request_time_list.tofile(times_file)
+
+
+def store_checkpoint(checkpoint_path, checkpoint, report_aggregate, stored_times):
+    """Write checkpoint json, exact request times of new lines are appended to sidecar
+
+    stored_times -- get_stored_times of aggregate loaded from checkpoint. Sidecar of
+                    the next generation with all values is written instead when it was
+                    not written yet or stored array was replaced (url was evicted from
+                    heavy hitters table).
+    """
+    checkpoint['aggregate'] = report_aggregate.to_dict(request_times=False)
+    if report_aggregate.stat_mode != STAT_MODE_EXACT:
+        dump_json_gzip(checkpoint_path, checkpoint)
+        return
+    url_request_time = report_aggregate.url_request_time
+    previous_times_filename = None
+    if checkpoint['times_size'] is None \
+            or any(url_request_time.get(url_line) is not request_time_list
+                   for url_line, (request_time_list, _) in stored_times.items()):
+        previous_times_filename = get_checkpoint_times_filename(
+            checkpoint_path, checkpoint['times_generation'])
+        checkpoint['times_generation'] += 1
+        with atomic_write(get_checkpoint_times_filename(checkpoint_path,
+                                                        checkpoint['times_generation']),
+                          mode='wb') as times_file:
+            write_times_block(times_file, list(url_request_time.items()))
+            checkpoint['times_size'] = times_file.tell()
+    else:
+        url_times = [(url_line, request_time_list[stored_times.get(url_line, (None, 0))[1]:])
+                     for url_line, request_time_list in url_request_time.items()
+                     if len(request_time_list) > stored_times.get(url_line, (None, 0))[1]]
+        if url_times:
+            with open(get_checkpoint_times_filename(checkpoint_path,
+                                                    checkpoint['times_generation']),
+                      mode='r+b') as times_file:
+                # bytes appended by interrupted run are not referenced by checkpoint
+                times_file.truncate(checkpoint['times_size'])
+                times_file.seek(checkpoint['times_size'])
+                write_times_block(times_file, url_times)
+                checkpoint['times_size'] = times_file.tell()
+    checkpoint['byteorder'] = sys.byteorder
+    dump_json_gzip(checkpoint_path, checkpoint)
+    if previous_times_filename is not None:
+        try:
+            os.remove(previous_times_filename)
+        except FileNotFoundError:
+            pass
+
+
+def get_log_head_hash(log_filename, head_size):
+    """Return sha1 hex digest of first head_size bytes of log"""
+    with open(log_filename, mode='rb') as log_file:
+        return hashlib.sha1(log_file.read(head_size)).hexdigest()
+
+
+def incremental_report(config_dict, run_metrics=None):
+    """Parse lines appended to growing log since last run and refresh intraday report
+
+    Checkpoint keeps log inode, hash of log head, parsed bytes offset and partial
+    aggregate, exact request times of new lines are appended to checkpoint times
+    sidecar. Log is parsed from the beginning when it was rotated (inode changed) or
+    truncated, including truncated in place (copytruncate) log which grew past offset
+    again: its head differs from the parsed one. Time buckets are not supported.
+    """
+    if run_metrics is None:
+        run_metrics = RunMetrics(RUN_MODE_INCREMENTAL)
+    if config_dict['report_time_bucket_minutes']:
+        logging.warning('time buckets are not supported in incremental mode, '
+                        'report is built for whole log')
+    log_filename = config_dict['incremental_log_path']
+    log_stat = os.stat(log_filename)
+    aggregate_options = get_aggregate_options(config_dict)
+    report_aggregate = None
+    with run_metrics.stage('load_checkpoint'):
+        checkpoint = load_checkpoint(config_dict['checkpoint_path'])
+        if checkpoint is not None \
+                and checkpoint['log_filename'] == log_filename \
+                and checkpoint['inode'] == log_stat.st_ino \
+                and checkpoint['offset'] <= log_stat.st_size \
+                and checkpoint['aggregate_options'] == aggregate_options \
+                and get_log_head_hash(log_filename, checkpoint['head_size']) \
+                == checkpoint['head_hash']:
+            report_aggregate = load_checkpoint_aggregate(config_dict['checkpoint_path'],
+                                                         checkpoint)
+    if report_aggregate is None:
+        checkpoint = {
+            'version': CHECKPOINT_VERSION,
+            'log_filename': log_filename,
+            'inode': log_stat.st_ino,
+            'offset': 0,
+            'log_date': datetime.date.today().strftime(config_dict['report_filedate_format']),
+            'aggregate_options': aggregate_options,
+            # times sidecar of replaced checkpoint is removed when the new one is stored
+            'times_generation': checkpoint['times_generation'] if checkpoint is not None else 0,
+            'times_size': None,
+        }
+        report_aggregate = ReportAggregate(**aggregate_options)
+    stored_times = get_stored_times(report_aggregate)
+
+    end_offset = get_complete_lines_end(log_filename, log_stat.st_size)
+    if end_offset > checkpoint['offset']:
+        run_metrics.add('bytes_read', end_offset - checkpoint['offset'])
+        lines_count = report_aggregate.lines_count
+        with run_metrics.stage('parse_aggregate'):
+            with LogRecordGen(log_filename, config_dict['log_line_parser'], None,
+                              checkpoint['offset'], end_offset, REPORT_FIELDS) as log_record_gen:
+                report_aggregate.update(log_record_gen)
+        run_metrics.add('lines', report_aggregate.lines_count - lines_count)
+    logging.info('incremental parsing bytes:{}-{}'.format(checkpoint['offset'], end_offset))
+    log_parse_statistic(report_aggregate.lines_count,
+                        report_aggregate.parse_errors_count,
+                        config_dict['log_parse_error_threshold'])
+
+    run_metrics.set('parse_errors', report_aggregate.parse_errors_count)
+    run_metrics.set('distinct_urls', len(report_aggregate.url_request_time))
+
+    checkpoint['offset'] = end_offset
+    checkpoint['head_size'] = min(end_offset, CHECKPOINT_HEAD_SIZE)
+    checkpoint['head_hash'] = get_log_head_hash(log_filename, checkpoint['head_size'])
+    with run_metrics.stage('store_checkpoint'):
+        store_checkpoint(config_dict['checkpoint_path'], checkpoint, report_aggregate,
+                         stored_times)
+
+    if report_aggregate.total_request_qty:
+        with run_metrics.stage('sort'):
+            url_statistic_list = report_aggregate.report_list(config_dict['report_size'])
+        with run_metrics.stage('render'):
+            write_report(config_dict,
+                         os.path.join(config_dict['report_dir'],
+                                      config_dict['incremental_report_filename_root']
+                                      .format(checkpoint['log_date'])),
+                         url_statistic_list)
+        run_metrics.add('reports_created', 1)
+    else:
+        run_metrics.status = RUN_STATUS_IDLE
+
+
+def split_file_ranges(log_filename, chunks_no):
+    """Return list of (start, end) byte ranges, aligned to the beginning of lines
+
+    log_filename -- plain (not compressed) log file path
+    chunks_no -- desired chunks quantity, empty ranges are dropped
+    """
+    file_size = os.path.getsize(log_filename)
+    bounds = [0]
+    with open(log_filename, mode='rb') as log_file:
+        for chunk_no in range(1, chunks_no):
+            offset = align_line_offset(log_file, max(file_size * chunk_no // chunks_no,
+                                                     bounds[-1]), file_size)
+            if offset >= file_size:
+                break
+            bounds.append(offset)
+    bounds.append(file_size)
+    return [(start, end) for start, end in zip(bounds, bounds[1:]) if start < end]
+
+
+def aggregate_log_chunk(log_filename, log_parser_regexp, start_offset, end_offset,
+                        aggregate_options, use_mmap=False, time_bucket_minutes=0,
+                        parse_error_options=None):
+    with LogRecordGen(log_filename, log_parser_regexp, None,
+                      start_offset, end_offset, get_report_fields(time_bucket_minutes),
+                      use_mmap=use_mmap, **(parse_error_options or dict())) as log_record_gen:
+        report_aggregate = create_report_aggregate(aggregate_options, time_bucket_minutes)
+        report_aggregate.update(log_record_gen)
+    return report_aggregate
+
+
+def parallel_aggregate(log_filename, log_parser_regexp, workers_no, aggregate_options=None,
+                       use_mmap=False, time_bucket_minutes=0, parse_error_options=None):
+    """Parse plain log file by byte ranges in process pool and merge partial aggregates
+
+    parse_error_options -- LogRecordGen parse errors keyword arguments of every chunk
+    """
+    if aggregate_options is None:
+        aggregate_options = dict()
+    ranges = split_file_ranges(log_filename, workers_no)
+    report_aggregate = create_report_aggregate(aggregate_options, time_bucket_minutes)
+    with ProcessPoolExecutor(max_workers=workers_no) as executor:
+        futures = [executor.submit(aggregate_log_chunk, log_filename, log_parser_regexp,
+                                   start_offset, end_offset, aggregate_options, use_mmap,
+                                   time_bucket_minutes, parse_error_options)
+                   for start_offset, end_offset in ranges]
+        for future in futures:
+            report_aggregate.merge(future.result())
+    return report_aggregate
+
+
+def aggregate_log_file(config_dict, log_filename):
+    """Return aggregate of one log file, parsed log columns are used with parsed_cache"""
+    time_bucket_minutes = config_dict['report_time_bucket_minutes']
+    report_aggregate = create_report_aggregate(get_aggregate_options(config_dict),
+                                               time_bucket_minutes)
+    if config_dict['parsed_cache'] and not time_bucket_minutes:
+        report_aggregate.update(load_parsed_columns(config_dict, log_filename, RunMetrics()))
+        return report_aggregate
+    with LogRecordGen(log_filename, config_dict['log_line_parser'], None,
+                      fields=get_report_fields(time_bucket_minutes),
+                      gzip_pipeline=config_dict['gzip_pipeline'],
+                      use_mmap=config_dict['log_mmap'],
+                      **get_parse_error_options(config_dict)) as log_record_gen:
+        report_aggregate.update(log_record_gen)
+    return report_aggregate
+
+
+def hosts_aggregate(config_dict, log_filenames):
+    """Parse logs of one date from several hosts in process pool and merge aggregates
+
+    No more than log_hosts_workers logs are parsed at once, lines and parse errors
+    counts of every host are written to internal log.
+    """
+    workers_no = max(1, min(config_dict['log_hosts_workers'], len(log_filenames)))
+    report_aggregate = create_report_aggregate(get_aggregate_options(config_dict),
+                                               config_dict['report_time_bucket_minutes'])
+    aggregate_host_log = partial(aggregate_log_file, config_dict)
+    executor = ProcessPoolExecutor(max_workers=workers_no) if workers_no > 1 else None
+    try:
+        host_aggregates = executor.map(aggregate_host_log, log_filenames) \
+            if executor is not None else map(aggregate_host_log, log_filenames)
+        for log_filename, host_aggregate in zip(log_filenames, host_aggregates):
+            logging.info('host:{} log:{} lines:{}, parsing errors:{}'.format(
+                get_log_host(log_filename, log_filenames), log_filename,
+                host_aggregate.lines_count, host_aggregate.parse_errors_count))
+            report_aggregate.merge(host_aggregate)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return report_aggregate
+
+
+def log_parse_statistic(lines_count, parse_errors_count, log_parse_error_threshold):
+    ratio = parse_errors_count / lines_count if lines_count else 0
+    logging.info('parsing lines:{}, parsings error count:{} ({:.3%})'
+                 .format(lines_count,
+                         parse_errors_count,
+                         ratio)
+                 )
+    if ratio >= log_parse_error_threshold:
+        logging.warning('parsing error ratio over threshold percent. '
+                        'Actual:{:.3%}, Expect: less {:.1%}'
+                        .format(ratio, log_parse_error_threshold))
+
+
+def project_regexp(log_parser_regexp, fields, bytes_mode=False):
+    """Return copy of regexp where named groups not listed in fields are non-capturing
+
+    bytes_mode -- compile bytes regexp (character classes match ASCII only)
+    """
+    missing_fields = set(fields).difference(log_parser_regexp.groupindex)
+    if missing_fields:
+        raise ValueError('Log line regexp has no groups: {}'.format(', '.join(missing_fields)))
+    pattern = re.sub(r'\(\?P<(\w+)>',
+                     lambda group_match: group_match.group(0)
+                     if group_match.group(1) in fields else '(?:',
+                     log_parser_regexp.pattern)
+    if bytes_mode:
+        return re.compile(pattern.encode('utf-8'), log_parser_regexp.flags & ~re.UNICODE)
+    return re.compile(pattern, log_parser_regexp.flags)
+
+
+def record_return_source(fields, bytes_mode=False):
+    """Return source line of generated parser returning tuple of converted fields"""
+    text_field_source = '{}.decode(\'utf-8\')' if bytes_mode else '{}'
+    return '    return ({},)'.format(', '.join('float({})'.format(field)
+                                               if field in FLOAT_FIELDS
+                                               else text_field_source.format(field)
+                                               for field in fields))
+
+
+def project_record_parser(log_parser_regexp, fields, bytes_mode=False):
+    """Return parser of required fields only for compiled regexp or LogFormatParser"""
+    if isinstance(log_parser_regexp, LogFormatParser):
+        return LogFormatParser(log_parser_regexp.log_format,
+                               log_parser_regexp.fallback_regexp,
+                               fields, bytes_mode)
+    return RegexpRecordParser(log_parser_regexp, fields, bytes_mode)
+
+
+class RegexpRecordParser:
+    """Log line parser returning tuple of required fields only
+
+    Raises ValueError for lines not matched by regexp.
+
+    log_parser_regexp -- compiled regexp with named groups
+    fields -- required fields names
+    bytes_mode -- parse bytes line, only required text fields are decoded
+    """
+    def __init__(self, log_parser_regexp, fields, bytes_mode=False):
+        self.log_parser_regexp = log_parser_regexp
+        self.fields = tuple(fields)
+        self.bytes_mode = bytes_mode
+        self.projected_regexp = project_regexp(log_parser_regexp, self.fields, bytes_mode)
+        self.parse_record = self.make_parse_record()
+
+    def make_parse_record(self):
+        """Return closure over projected regexp search returning tuple of converted fields"""
+        search = self.projected_regexp.search
+        fields = self.fields
+        is_single_field = len(fields) == 1
+        converters = [(field_no, float if field in FLOAT_FIELDS else bytes.decode)
+                      for field_no, field in enumerate(fields)
+                      if field in FLOAT_FIELDS or self.bytes_mode]
+
+        def parse_record(line):
+            line_match = search(line)
+            if line_match is None:
+                raise ValueError
+            # group of single name returns value instead of tuple
+            values = [line_match.group(*fields)] if is_single_field \
+                else list(line_match.group(*fields))
+            for field_no, convert in converters:
+                values[field_no] = convert(values[field_no])
+            return tuple(values)
+        return parse_record
+
+    def __getstate__(self):
+        return self.log_parser_regexp, self.fields, self.bytes_mode
+
+    def __setstate__(self, state):
+        self.__init__(*state)
+
+    def __call__(self, line):
+        return self.parse_record(line)
+
+
+class LogFormatParser:
+    """Log line parser generated from nginx log_format directive
+
+    Generated function splits line by quotes once, then splits unquoted parts by
+    whitespaces and partitions bracketed ([$var]) fields instead of regexp matching.
+    Only fields layout is checked, values are not validated. Fields are named as
+    log_format variables in lower case. Lines rejected by generated function are
+    parsed with fallback regexp (if set).
+
+    log_format -- nginx log_format string, variables must be separated by whitespaces
+    fallback_regexp -- compiled regexp with named groups
+    fields -- required fields names, if set parser extracts only these fields and
+              returns tuple (request_time converted to float) instead of dictionary
+    bytes_mode -- parse bytes line, only required text fields are decoded
+                  (fields are required)
+    """
+    format_token_regexp = re.compile(r'(?P<space>\s+)|'
+                                     r'"\$(?P<quoted>\w+)"|'
+                                     r'\[\$(?P<bracketed>\w+)\]|'
+                                     r'\$(?P<bare>\w+)')
+
+    def __init__(self, log_format, fallback_regexp=None, fields=None, bytes_mode=False):
+        self.log_format = log_format
+        self.fallback_regexp = fallback_regexp
+        self.fields = tuple(fields) if fields is not None else None
+        self.bytes_mode = bytes_mode
+        if bytes_mode and self.fields is None:
+            raise ValueError('log_format bytes parser requires fields')
+        tokens = self.parse_format(log_format)
+        if self.fields is not None:
+            missing_fields = set(self.fields).difference(name for _, name in tokens)
+            if missing_fields:
+                raise ValueError('log_format has no variables: {}'
+                                 .format(', '.join(missing_fields)))
+        self.source = self.generate_source(tokens, self.fields, bytes_mode)
+        namespace = dict()
+        exec(compile(self.source, '<log_format>', 'exec'), namespace)
+        self.parse_line = namespace['parse_line']
+        self.fallback_parser = None
+        if fallback_regexp is not None and self.fields is not None:
+            self.fallback_parser = RegexpRecordParser(fallback_regexp, self.fields, bytes_mode)
+        self.parse_record = self.parse_line if fallback_regexp is None else self.__call__
+
+    def __getstate__(self):
+        return self.log_format, self.fallback_regexp, self.fields, self.bytes_mode
+
+    def __setstate__(self, state):
+        self.__init__(*state)
+
+    def __call__(self, line):
+        try:
+            return self.parse_line(line)
+        except ValueError:
+            if self.fallback_parser is not None:
+                return self.fallback_parser.parse_record(line)
+            if self.fallback_regexp is None:
+                raise
+            line_match = self.fallback_regexp.search(line)
+            if line_match is None:
+                raise
+            return line_match.groupdict()
+
+    @classmethod
+    def parse_format(cls, log_format):
+        """Return list of (kind, field name) tuples, kind is 'bare', 'quoted' or 'bracketed'"""
+        tokens = list()
+        position = 0
+        while position < len(log_format):
+            token_match = cls.format_token_regexp.match(log_format, position)
+            if token_match is None:
+                raise ValueError('Unsupported log_format at position {}: {}'
+                                 .format(position, log_format[position:]))
+            if token_match.lastgroup != 'space':
+                if tokens and position == tokens[-1][2]:
+                    raise ValueError('log_format variables must be separated by whitespaces')
+                tokens.append((token_match.lastgroup, token_match.group(token_match.lastgroup)
+                               .lower(), token_match.end()))
+            position = token_match.end()
+        if not tokens:
+            raise ValueError('log_format has no variables')
+        return [(kind, name) for kind, name, _ in tokens]
+
+    @staticmethod
+    def generate_source(tokens, fields=None, bytes_mode=False):
+        literal = (lambda text: repr(text.encode('utf-8'))) if bytes_mode else repr
+        quotes_count = 2 * sum(1 for kind, _ in tokens if kind == 'quoted')
+        segments = [[]]
+        for kind, name in tokens:
+            if kind == 'quoted':
+                segments.append(name)
+                segments.append([])
+            else:
+                segments[-1].append((kind, name))
+
+        source_lines = ['def parse_line(line):']
+        if quotes_count:
+            source_lines.extend([
+                '    parts = line.split({}, {})'.format(literal('"'), quotes_count),
+                '    if len(parts) != {}:'.format(quotes_count + 1),
+                '        raise ValueError',
+            ])
+        for segment_no, segment in enumerate(segments):
+            part = 'parts[{}]'.format(segment_no) if quotes_count else 'line'
+            if fields is not None:
+                if isinstance(segment, str):
+                    if segment not in fields:
+                        continue
+                elif not any(name in fields for _, name in segment):
+                    continue
+                else:
+                    segment = [(kind, name if name in fields else '_') for kind, name in segment]
+            if isinstance(segment, str):
+                source_lines.extend([
+                    '    {} = {}'.format(segment, part),
+                    '    if not {}:'.format(segment),
+                    '        raise ValueError',
+                ])
+                continue
+            if not segment:
+                continue
+            is_last_segment = segment_no == len(segments) - 1
+            names = list()
+            source_lines.append('    rest = {}'.format(part))
+            for kind, name in segment:
+                if kind == 'bare':
+                    names.append(name)
+                    continue
+                source_lines.extend([
+                    '    head, found, rest = rest.partition({})'.format(literal('[')),
+                    '    if not found:',
+                    '        raise ValueError',
+                ])
+                if names:
+                    source_lines.append('    {}, = head.split()'.format(', '.join(names)))
+                    names = list()
+                source_lines.extend([
+                    '    {}, found, rest = rest.partition({})'.format(name, literal(']')),
+                    '    if not found or not {}:'.format(name),
+                    '        raise ValueError',
+                ])
+            if names and is_last_segment:
+                source_lines.append('    {}, = rest.split(None, {})[:{}]'
+                                    .format(', '.join(names), len(names), len(names)))
+            elif names:
+                source_lines.append('    {}, = rest.split()'.format(', '.join(names)))
+        if fields is not None:
+            source_lines.append(record_return_source(fields, bytes_mode))
+        else:
+            fields_source = ', '.join('{0!r}: {0}'.format(name) for _, name in tokens)
+            source_lines.append('    return {{{}}}'.format(fields_source))
+        return '\n'.join(source_lines) + '\n'
+
+
+class PipelinedGzipReader:
+    """Gzip file lines iterator with decompression in separate thread
+
+    Thread reads compressed file by blocks, decompresses them (zlib releases
+    GIL while decompressing) into at most batch_size bytes, splits data to
+    lines and puts batches of lines to bounded queue, so decompression runs
+    parallel with parsing and at most queue_size * batch_size decompressed
+    bytes wait in queue. Lines are returned without trailing newline. Zero
+    bytes padding after gzip member is skipped as gzip.open does.
+
+    read_size -- compressed data block size
+    batch_size -- max decompressed bytes of lines batch
+    queue_size -- max quantity of ready lines batches
+    """
+    def __init__(self, filename, read_size=1 << 16, batch_size=1 << 18, queue_size=8):
+        self.read_size = read_size
+        self.batch_size = batch_size
+        self.decompress_seconds = 0.0
+        self.file_descr = open(filename, mode='rb')
+        self.batches = queue.Queue(maxsize=queue_size)
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.decompress, daemon=True)
+        self.thread.start()
+
+    def put(self, item):
+        while not self.stop_event.is_set():
+            try:
+                self.batches.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def decompress(self):
+        try:
+            decompressor = zlib.decompressobj(wbits=zlib.MAX_WBITS | 16)
+            tail = b''
+            is_member_started = False
+            while not self.stop_event.is_set():
+                data = self.file_descr.read(self.read_size)
+                if not data:
+                    break
+                while data:
+                    if not is_member_started:
+                        # gzip files can be padded with zeroes after member
+                        data = data.lstrip(b'\0')
+                        if not data:
+                            break
+                    is_member_started = True
+                    started = time.perf_counter()
+                    chunk = tail + decompressor.decompress(data, self.batch_size)
+                    self.decompress_seconds += time.perf_counter() - started
+                    data = decompressor.unconsumed_tail
+                    if decompressor.eof:
+                        data = decompressor.unused_data
+                        decompressor = zlib.decompressobj(wbits=zlib.MAX_WBITS | 16)
+                        is_member_started = False
+                    lines = chunk.split(b'\n')
+                    tail = lines.pop()
+                    if lines:
+                        self.put(lines)
+            if is_member_started and not self.stop_event.is_set():
+                raise EOFError('Compressed file ended before the end-of-stream marker was reached')
+            if tail:
+                self.put([tail])
+        except (OSError, EOFError, zlib.error) as error:
+            self.put(error)
+        finally:
+            self.put(None)
+
+    def __iter__(self):
+        return chain.from_iterable(self.iter_batches())
+
+    def iter_batches(self):
+        while True:
+            batch = self.batches.get()
+            if batch is None:
+                return
+            if isinstance(batch, Exception):
+                raise batch
+            yield batch
+
+    def close(self):
+        self.stop_event.set()
+        self.thread.join()
+        self.file_descr.close()
 
 
 class LogRecordGen:
-    def __init__(self, log_filename, log_parser_regexp, log_parse_error_threshold):
+    def __init__(self, log_filename, log_parser_regexp, log_parse_error_threshold,
+                 start_offset=0, end_offset=None, fields=None, gzip_pipeline=False,
+                 use_mmap=False, error_budget=None, error_warmup_lines=0,
+                 errors_lines_limit=None, errors_sample_size=0):
+        """Log file records generator, returns dictionary of parsed fields for each line
+
+        log_parser_regexp -- compiled regexp with named groups or LogFormatParser
+        log_parse_error_threshold -- None disables errors ratio check (partial file parsing)
+        start_offset, end_offset -- byte range of plain log file, must be aligned to lines
+        fields -- required fields names, if set generator returns tuples of these fields
+                  only and parser captures nothing else
+        gzip_pipeline -- decompress gzipped log in separate thread (PipelinedGzipReader)
+        use_mmap -- map plain log file to memory and parse lines with bytes parser,
+                    only required text fields are decoded (fields are required)
+        error_budget -- max share of not parsed lines, ParseErrorBudgetExceeded is raised
+                        on parse error when it is exceeded after error_warmup_lines lines
+                        (0 warm-up lines disables check), well parsed lines cost nothing
+        errors_lines_limit -- max quantity of stored errors lines numbers, None - unlimited
+        errors_sample_size -- size of uniform reservoir sample of not parsed lines
+                              [line number, line] in parse_errors_sample
+        """
         self.log_filename = log_filename
         self.log_parser_regexp = log_parser_regexp
+        self.log_format_parser = log_parser_regexp \
+            if isinstance(log_parser_regexp, LogFormatParser) else None
+        self.fields = tuple(fields) if fields is not None else None
+        self.use_mmap = use_mmap and self.fields is not None and not log_filename.endswith('.gz')
+        self.parse_record = project_record_parser(log_parser_regexp, self.fields,
+                                                  self.use_mmap).parse_record \
+            if self.fields is not None else None
+        self.buffer = None
         self.log_parse_error_threshold = log_parse_error_threshold
+        self.start_offset = start_offset
+        self.end_offset = end_offset
+        self.position = start_offset
         self.lines_count = 0
         self.parse_errors_count = 0
         self.parse_errors_lines_list = list()
+        self.error_budget = error_budget
+        self.error_warmup_lines = error_warmup_lines if error_budget is not None else 0
+        self.errors_lines_limit = errors_lines_limit
+        self.errors_sample_size = errors_sample_size
+        self.parse_errors_sample = list()
         self.open_operator = gzip.open if log_filename.endswith('.gz') else open
+        if gzip_pipeline and log_filename.endswith('.gz'):
+            self.open_operator = PipelinedGzipReader
 
     def __enter__(self):
-        self.file_descr = self.open_operator(self.log_filename, mode='rt', encoding='utf-8')
+        if self.open_operator is PipelinedGzipReader:
+            self.file_descr = PipelinedGzipReader(self.log_filename)
+        else:
+            self.file_descr = self.open_operator(self.log_filename, mode='rb')
+        if self.use_mmap and os.fstat(self.file_descr.fileno()).st_size:
+            # empty file can't be mapped, it is read as usual
+            self.buffer = mmap.mmap(self.file_descr.fileno(), 0, access=mmap.ACCESS_READ)
+            self.buffer.seek(self.start_offset)
+            self.lines = iter(self.buffer.readline, b'')
+            return self
+        if self.start_offset:
+            self.file_descr.seek(self.start_offset)
+        self.lines = iter(self.file_descr)
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        if exc_val is None:
-            ratio = self.parse_errors_count / self.lines_count
-            logging.info('parsing lines:{}, parsings error count:{} ({:.3%})'
-                         .format(self.lines_count,
-                                 self.parse_errors_count,
-                                 ratio)
-                         )
-            if ratio >= self.log_parse_error_threshold:
-                logging.warning('parsing error ratio over threshold percent. '
-                                'Actual:{:.3%}, Expect: less {:.1%}'
-                                .format(ratio, self.log_parse_error_threshold))
+        if exc_val is None and self.log_parse_error_threshold is not None:
+            log_parse_statistic(self.lines_count,
+                                self.parse_errors_count,
+                                self.log_parse_error_threshold)
+            if self.parse_errors_sample:
+                logging.info('parsing errors sample:{}'.format(
+                    json.dumps(self.parse_errors_sample, ensure_ascii=False)))
+        if self.buffer is not None:
+            self.buffer.close()
         self.file_descr.close()
 
     def __iter__(self):
@@ -254,17 +3348,53 @@ class LogRecordGen:
 
     def __next__(self):
         while True:
-            line = self.file_descr.readline()
-            if len(line) == 0:
+            if self.end_offset is not None and self.position >= self.end_offset:
+                raise StopIteration
+            line = next(self.lines, None)
+            if line is None:
                 raise StopIteration
+            self.position += len(line)
             self.lines_count += 1
             try:
-                fields = re.search(self.log_parser_regexp, line).groupdict()
+                if self.use_mmap:
+                    return self.parse_record(line)
+                if self.parse_record is not None:
+                    return self.parse_record(line.decode('utf-8'))
+                if self.log_format_parser is not None:
+                    fields = self.log_format_parser(line.decode('utf-8'))
+                else:
+                    fields = self.log_parser_regexp.search(line.decode('utf-8')).groupdict()
                 fields['request_time'] = float(fields['request_time'])
                 return fields
             except (ValueError, AttributeError):
-                self.parse_errors_count += 1
-                self.parse_errors_lines_list.append(self.lines_count)
+                self.add_parse_error(line)
+
+    def add_parse_error(self, line):
+        """Count not parsed line, sample it and check errors budget"""
+        self.parse_errors_count += 1
+        if self.errors_lines_limit is None \
+                or len(self.parse_errors_lines_list) < self.errors_lines_limit:
+            self.parse_errors_lines_list.append(self.lines_count)
+        if self.errors_sample_size:
+            sample_no = self.parse_errors_count - 1
+            if sample_no >= self.errors_sample_size:
+                sample_no = random.randrange(self.parse_errors_count)
+            if sample_no < self.errors_sample_size:
+                sample = [self.lines_count, line.decode('utf-8', errors='replace')
+                          .rstrip('\r\n')[:PARSE_ERROR_SAMPLE_LENGTH]]
+                if sample_no < len(self.parse_errors_sample):
+                    self.parse_errors_sample[sample_no] = sample
+                else:
+                    self.parse_errors_sample.append(sample)
+        if self.error_warmup_lines and self.lines_count >= self.error_warmup_lines \
+                and self.parse_errors_count > self.error_budget * self.lines_count:
+            raise ParseErrorBudgetExceeded(
+                '{} lines of first {} lines are not parsed ({:.1%}), error budget {:.1%} '
+                'is exceeded: {}, errors sample:{}'.format(
+                    self.parse_errors_count, self.lines_count,
+                    self.parse_errors_count / self.lines_count, self.error_budget,
+                    self.log_filename,
+                    json.dumps(self.parse_errors_sample, ensure_ascii=False)))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,256 @@
+#!/usr/bin/env python
+# Benchmark suite for LogAnalyzer: generates deterministic synthetic ui_short logs
+# and measures lines/sec and peak RSS of every report building stage
+# in separate process, results are stored as json for comparison between versions
+import sys
+import os
+import gzip
+import json
+import time
+import random
+import argparse
+import datetime
+import platform
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import LogAnalyzer  # noqa: E402
+
+BENCHMARK_RESULTS_VERSION = 1
+STAGE_LOG_RECORD_GEN = 'log_record_gen'
+STAGE_CREATE_REPORT_DICT = 'create_report_dict'
+STAGE_RENDER_REPORT = 'render_report'
+BENCHMARK_STAGES = (STAGE_LOG_RECORD_GEN, STAGE_CREATE_REPORT_DICT, STAGE_RENDER_REPORT)
+LOG_LINE_FORMAT = '{remote_addr} {remote_user}  - [{time_local}] "{method} {url} HTTP/1.1" ' \
+                  '{status} {body_bytes_sent} "-" "{user_agent}" "-" "{request_id}" "{rb_user}" ' \
+                  '{request_time:.3f}\n'
+BROKEN_LINE_FORMAT = '{remote_addr} {remote_user}  - [{time_local}] "{method} {url}\n'
+URL_PATTERNS = ('/api/v2/banner/{}', '/api/v2/group/{}/statistic/sites/?date_type=day',
+                '/api/1/photogenic_banners/list/?server_name=WIN7RB{}',
+                '/export/appinstall_raw/{}/', '/api/v2/slot/{}/groups',
+                '/accounts/login/?next=/campaigns/{}/')
+USER_AGENTS = ('Lynx/2.8.8dev.9 libwww-FM/2.14 SSL-MM/1.4.1 GNUTLS/2.10.5', 'Python-urllib/2.7',
+               'Slotovod', 'python-requests/2.13.0', 'Mozilla/5.0 (Windows NT 6.1; WOW64)')
+METHODS = ('GET', 'GET', 'GET', 'POST')
+STATUSES = (200, 200, 200, 200, 404, 499)
+BATCH_SIZE = 10000
+
+
+def get_log_filename(data_dir, lines_no, urls_no, error_rate, seed, is_gzip):
+    """Synthetic log name holds generation parameters, so generated log is reused"""
+    log_dir = 'synthetic-{}-{}-{}-{}'.format(lines_no, urls_no, error_rate, seed)
+    return os.path.join(data_dir, log_dir,
+                        'nginx-access-ui.log-20170630.{}'.format('gz' if is_gzip else 'log'))
+
+
+def gen_log_lines(lines_no, urls_no, error_rate, seed=1):
+    """Generate deterministic ui_short log lines batches
+
+    Urls popularity follows zipf-like distribution, request time is lognormal
+    and depends on url, so report top has stable order for fixed seed
+    """
+    rng = random.Random(seed)
+    urls = [URL_PATTERNS[url_no % len(URL_PATTERNS)].format(1000000 + url_no)
+            for url_no in range(urls_no)]
+    url_weights = []
+    cum_weight = 0.0
+    for url_no in range(urls_no):
+        cum_weight += 1.0 / (url_no + 1)
+        url_weights.append(cum_weight)
+    url_time_scales = [rng.uniform(0.05, 1.5) for _ in range(urls_no)]
+    start_time = datetime.datetime(2017, 6, 29, 3, 50, 22)
+    lines_done = 0
+    while lines_done < lines_no:
+        batch_size = min(BATCH_SIZE, lines_no - lines_done)
+        url_indexes = rng.choices(range(urls_no), cum_weights=url_weights, k=batch_size)
+        time_local = (start_time + datetime.timedelta(seconds=lines_done * 86400 // lines_no)) \
+            .strftime('%d/%b/%Y:%H:%M:%S +0300')
+        batch = []
+        for line_no, url_index in enumerate(url_indexes, lines_done):
+            line_format = BROKEN_LINE_FORMAT if rng.random() < error_rate else LOG_LINE_FORMAT
+            batch.append(line_format.format(
+                remote_addr='1.{}.{}.{}'.format(rng.randrange(256), rng.randrange(256),
+                                                rng.randrange(256)),
+                remote_user='-' if line_no % 3 else '{:013x}'.format(rng.getrandbits(52)),
+                time_local=time_local,
+                method=rng.choice(METHODS),
+                url=urls[url_index],
+                status=rng.choice(STATUSES),
+                body_bytes_sent=rng.randrange(20000),
+                user_agent=rng.choice(USER_AGENTS),
+                request_id='1498697422-{}-4708-{}'.format(rng.getrandbits(31), line_no),
+                rb_user='-' if line_no % 2 else '{:09x}'.format(rng.getrandbits(36)),
+                request_time=rng.lognormvariate(0, 0.5) * url_time_scales[url_index]))
+        lines_done += batch_size
+        yield ''.join(batch)
+
+
+def generate_log(log_filename, lines_no, urls_no, error_rate, seed=1):
+    """Write synthetic log (gzipped for .gz extension) if it was not generated before"""
+    if os.path.exists(log_filename):
+        return log_filename
+    os.makedirs(os.path.dirname(log_filename), exist_ok=True)
+    temp_filename = log_filename + '.tmp'
+    open_log = gzip.open if log_filename.endswith('.gz') else open
+    with open_log(temp_filename, mode='wt', encoding='utf-8') as log_file:
+        for batch in gen_log_lines(lines_no, urls_no, error_rate, seed):
+            log_file.write(batch)
+    os.replace(temp_filename, log_filename)
+    return log_filename
+
+
+def load_analyzer_config(config_filename=None):
+    """Build analyzer config as LogAnalyzer does it, optionally with json config import"""
+    argv = sys.argv
+    sys.argv = [argv[0], '--no-launch']
+    if config_filename:
+        sys.argv.extend(['--config', config_filename])
+    try:
+        return LogAnalyzer.init_analyzer()
+    finally:
+        sys.argv = argv
+
+
+def run_stage(stage, log_filename, work_dir, config_filename=None):
+    """Run one stage in current process and return its measurements
+
+    Stage is called in fresh process by run_stage_isolated, so peak RSS belongs to stage only
+    """
+    config_dict = load_analyzer_config(config_filename)
+    report_rows_filename = os.path.join(work_dir, 'report_rows.json')
+    started = time.perf_counter()
+    if stage == STAGE_LOG_RECORD_GEN:
+        with LogAnalyzer.LogRecordGen(log_filename, config_dict['log_line_parser'], None,
+                                      fields=LogAnalyzer.REPORT_FIELDS,
+                                      gzip_pipeline=config_dict['gzip_pipeline'],
+                                      use_mmap=config_dict['log_mmap']) \
+                as log_record_gen:
+            for _ in log_record_gen:
+                pass
+        lines_count = log_record_gen.lines_count
+        seconds = time.perf_counter() - started
+    elif stage == STAGE_CREATE_REPORT_DICT:
+        with LogAnalyzer.LogRecordGen(log_filename, config_dict['log_line_parser'], None,
+                                      fields=LogAnalyzer.REPORT_FIELDS,
+                                      gzip_pipeline=config_dict['gzip_pipeline'],
+                                      use_mmap=config_dict['log_mmap']) \
+                as log_record_gen:
+            url_statistic_list = LogAnalyzer.create_report_dict(
+                log_record_gen, config_dict['report_size'],
+                **LogAnalyzer.get_aggregate_options(config_dict))
+        lines_count = log_record_gen.lines_count
+        seconds = time.perf_counter() - started
+        with open(report_rows_filename, mode='w', encoding='utf-8') as rows_file:
+            json.dump(url_statistic_list, rows_file)
+    elif stage == STAGE_RENDER_REPORT:
+        with open(report_rows_filename, mode='r', encoding='utf-8') as rows_file:
+            url_statistic_list = json.load(rows_file)
+        started = time.perf_counter()
+        LogAnalyzer.render_report(config_dict['report_template_path'],
+                                  os.path.join(work_dir, 'report.html'), url_statistic_list)
+        lines_count = len(url_statistic_list)
+        seconds = time.perf_counter() - started
+    else:
+        raise ValueError('Unknown benchmark stage: {}'.format(stage))
+    peak_memory_bytes = LogAnalyzer.get_peak_memory_bytes()
+    return {
+        'stage': stage,
+        'lines': lines_count,
+        'seconds': round(seconds, 6),
+        'lines_per_sec': round(lines_count / seconds, 1) if seconds else None,
+        'peak_rss_kb': peak_memory_bytes // 1024 if peak_memory_bytes is not None else None
+    }
+
+
+def run_stage_isolated(stage, log_filename, work_dir, config_filename=None):
+    with ProcessPoolExecutor(max_workers=1,
+                             mp_context=multiprocessing.get_context('spawn')) as executor:
+        return executor.submit(run_stage, stage, log_filename, work_dir, config_filename).result()
+
+
+def run_benchmarks(lines_list, urls_no, error_rate, gzip_modes, data_dir, seed=1,
+                   stages=BENCHMARK_STAGES, config_filename=None, repeat=1):
+    """Generate logs for every size and gzip mode and measure every stage on them"""
+    results = []
+    for lines_no in lines_list:
+        for is_gzip in gzip_modes:
+            log_filename = generate_log(
+                get_log_filename(data_dir, lines_no, urls_no, error_rate, seed, is_gzip),
+                lines_no, urls_no, error_rate, seed)
+            work_dir = os.path.dirname(log_filename)
+            for stage in stages:
+                for run_no in range(repeat):
+                    stage_result = run_stage_isolated(stage, log_filename, work_dir,
+                                                      config_filename)
+                    stage_result.update({'log_lines': lines_no, 'gzip': is_gzip,
+                                         'run': run_no})
+                    results.append(stage_result)
+                    print('{log_lines:>10} lines gzip={gzip!s:<5} {stage:<20} '
+                          '{seconds:>10.3f}s {lines_per_sec:>12} lines/s '
+                          '{peak_rss_kb} KB'.format(**stage_result))
+    return {
+        'version': BENCHMARK_RESULTS_VERSION,
+        'created': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'parameters': {'urls': urls_no, 'error_rate': error_rate, 'seed': seed,
+                       'config': config_filename},
+        'results': results
+    }
+
+
+def parse_lines_number(value):
+    """Accept plain number or number with k/M suffix: 1M, 100M, 500k"""
+    multipliers = {'k': 1000, 'm': 1000000}
+    suffix = value[-1:].lower()
+    if suffix in multipliers:
+        return int(float(value[:-1]) * multipliers[suffix])
+    return int(value)
+
+
+def main():
+    parser_cli = argparse.ArgumentParser(description='Benchmark LogAnalyzer stages '
+                                                     'on synthetic ui_short logs')
+    parser_cli.add_argument('--lines', dest='lines_list', nargs='+', type=parse_lines_number,
+                            default=[1000000],
+                            help='Synthetic log sizes in lines (1M, 10M, 100M)')
+    parser_cli.add_argument('--urls', dest='urls_no', type=int, default=10000,
+                            help='Distinct urls in synthetic log')
+    parser_cli.add_argument('--error-rate', dest='error_rate', type=float, default=0.001,
+                            help='Share of broken lines in synthetic log')
+    parser_cli.add_argument('--gzip', dest='gzip_mode', choices=('plain', 'gzip', 'both'),
+                            default='both', help='Benchmark plain, gzipped or both logs')
+    parser_cli.add_argument('--seed', dest='seed', type=int, default=1)
+    parser_cli.add_argument('--stages', dest='stages', nargs='+', choices=BENCHMARK_STAGES,
+                            default=list(BENCHMARK_STAGES))
+    parser_cli.add_argument('--repeat', dest='repeat', type=int, default=1,
+                            help='Runs of every stage')
+    parser_cli.add_argument('--config', dest='config_filename', default=None,
+                            help='LogAnalyzer json config used by stages')
+    parser_cli.add_argument('--data-dir', dest='data_dir',
+                            default=os.path.abspath('./data/benchmarks'),
+                            help='Directory for generated logs')
+    parser_cli.add_argument('--output', dest='output_filename', default=None,
+                            help='Json results file path (default: benchmark-<datetime>.json '
+                                 'in data directory)')
+    args = parser_cli.parse_args()
+    if STAGE_RENDER_REPORT in args.stages and STAGE_CREATE_REPORT_DICT not in args.stages:
+        parser_cli.error('{} stage renders rows made by {} stage'.format(
+            STAGE_RENDER_REPORT, STAGE_CREATE_REPORT_DICT))
+
+    gzip_modes = {'plain': (False,), 'gzip': (True,), 'both': (False, True)}[args.gzip_mode]
+    benchmark_results = run_benchmarks(args.lines_list, args.urls_no, args.error_rate,
+                                       gzip_modes, args.data_dir, args.seed, args.stages,
+                                       args.config_filename, args.repeat)
+    output_filename = args.output_filename or os.path.join(
+        args.data_dir, 'benchmark-{}.json'.format(
+            datetime.datetime.now().strftime('%Y%m%d-%H%M%S')))
+    with open(output_filename, mode='w', encoding='utf-8') as output_file:
+        json.dump(benchmark_results, output_file, indent=2)
+    print('Results stored: {}'.format(output_filename))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,26 @@
+from unittest.mock import patch
+from LogAnalyzer import init_analyzer
+import sys
+
+
+def load_test_config(**config_overrides):
+    """Build analyzer config as LogAnalyzer does it (with --no-launch) and override some keys
+
+    Paths of files written by analyzer (aggregates store, discovery manifest, metrics, daemon
+    status) are disabled, tests which need them override them with temporary paths.
+    """
+    with patch.object(sys, 'argv', [sys.argv[0], '--no-launch']):
+        config_dict = init_analyzer()
+    config_dict.update({
+        'aggregate_store_dir': None,
+        'discovery_manifest_path': None,
+        'daemon_status_path': None,
+        'metrics_path': None,
+        'metrics_prometheus_path': None,
+    })
+    config_dict.update(config_overrides)
+    return config_dict
+
+
+# log line regexp of default config for tests which build LogRecordGen without config
+LOG_LINE_TEMPLATE = load_test_config()['log_line_template']
@@ -0,0 +1,68 @@
+from unittest import TestCase
+from unittest.mock import patch
+from LogAnalyzer import get_unreported_filenames, backfill_reports, RunMetrics
+from analyzer_config import load_test_config
+import gzip
+import os
+import shutil
+import tempfile
+
+
+class TestBackfillReports(TestCase):
+    test_log_filename = os.path.abspath('./data/tests/nginx-access-ui.log-20170630.log')
+
+    def setUp(self) -> None:
+        self.log_dir = tempfile.mkdtemp()
+        self.report_dir = tempfile.mkdtemp()
+        for log_date in ('20170628', '20170629', '20170630'):
+            shutil.copy(self.__class__.test_log_filename,
+                        os.path.join(self.log_dir, 'nginx-access-ui.log-{}.log'.format(log_date)))
+        open(os.path.join(self.report_dir, 'report-2017.06.29.html'), mode='w').close()
+        self.config_dict = load_test_config(
+            log_dir=self.log_dir,
+            report_dir=self.report_dir,
+            report_size=100,
+            log_parse_error_threshold=0.1,
+            aggregate_store_dir=os.path.join(self.report_dir, 'aggregates'),
+            backfill_workers=2,
+            discovery_manifest_path=os.path.join(self.log_dir, 'manifest.json.gz'),
+        )
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.log_dir)
+        shutil.rmtree(self.report_dir)
+
+    def test_get_unreported_filenames(self):
+        self.assertListEqual(
+            get_unreported_filenames(self.config_dict),
+            [(os.path.join(self.log_dir, 'nginx-access-ui.log-20170628.log'),
+              os.path.join(self.report_dir, 'report-2017.06.28.html')),
+             (os.path.join(self.log_dir, 'nginx-access-ui.log-20170630.log'),
+              os.path.join(self.report_dir, 'report-2017.06.30.html'))])
+
+    def test_backfill_reports(self):
+        with patch('LogAnalyzer.logging.exception') as mock_logging:
+            backfill_reports(self.config_dict)
+            mock_logging.assert_not_called()
+        self.assertSetEqual(set(os.listdir(self.report_dir)),
+                            {'report-2017.06.28.html', 'report-2017.06.29.html',
+                             'report-2017.06.30.html', 'aggregates'})
+        self.assertListEqual(get_unreported_filenames(self.config_dict), [])
+
+    def test_backfill_reports_corrupt_log(self):
+        with open(self.__class__.test_log_filename, mode='rb') as log_file:
+            gzip_data = bytearray(gzip.compress(log_file.read()))
+        gzip_data[100:200] = b'\xff' * 100
+        with open(os.path.join(self.log_dir, 'nginx-access-ui.log-20170627.gz'),
+                  mode='wb') as gzip_file:
+            gzip_file.write(gzip_data)
+        run_metrics = RunMetrics()
+        with patch('LogAnalyzer.logging.exception') as mock_logging:
+            backfill_reports(self.config_dict, run_metrics)
+        mock_logging.assert_called_once()
+        self.assertEqual(run_metrics.counters['reports_failed'], 1)
+        self.assertEqual(run_metrics.counters['reports_created'], 2)
+        self.assertEqual(run_metrics.status, 'failed')
+        self.assertListEqual(get_unreported_filenames(self.config_dict),
+                             [(os.path.join(self.log_dir, 'nginx-access-ui.log-20170627.gz'),
+                               os.path.join(self.report_dir, 'report-2017.06.27.html'))])
@@ -0,0 +1,49 @@
+from unittest import TestCase
+from benchmarks.benchmark import gen_log_lines, generate_log, get_log_filename, run_stage, \
+    parse_lines_number, STAGE_LOG_RECORD_GEN, STAGE_CREATE_REPORT_DICT, STAGE_RENDER_REPORT
+from LogAnalyzer import LogRecordGen
+from analyzer_config import LOG_LINE_TEMPLATE
+import gzip
+import os
+import re
+import tempfile
+
+
+class TestBenchmark(TestCase):
+    log_line_template = LOG_LINE_TEMPLATE
+
+    def test_gen_log_lines_deterministic(self):
+        log_lines = ''.join(gen_log_lines(25000, 100, 0.01, seed=7))
+        self.assertEqual(log_lines, ''.join(gen_log_lines(25000, 100, 0.01, seed=7)))
+        self.assertNotEqual(log_lines, ''.join(gen_log_lines(25000, 100, 0.01, seed=8)))
+        self.assertEqual(log_lines.count('\n'), 25000)
+
+    def test_generate_log_parsed_with_error_rate(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            log_filename = generate_log(get_log_filename(temp_dir, 20000, 50, 0.02, 1, True),
+                                        20000, 50, 0.02)
+            with gzip.open(log_filename, mode='rt', encoding='utf-8') as log_file:
+                self.assertEqual(sum(1 for _ in log_file), 20000)
+            with LogRecordGen(log_filename, re.compile(self.__class__.log_line_template),
+                              None) as log_record_gen:
+                urls = {log_record['request'].split()[1] for log_record in log_record_gen}
+            self.assertEqual(len(urls), 50)
+            self.assertLess(abs(log_record_gen.parse_errors_count / 20000 - 0.02), 0.005)
+
+    def test_run_stages(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            log_filename = generate_log(get_log_filename(temp_dir, 5000, 200, 0.001, 1, False),
+                                        5000, 200, 0.001)
+            work_dir = os.path.dirname(log_filename)
+            for stage in (STAGE_LOG_RECORD_GEN, STAGE_CREATE_REPORT_DICT):
+                stage_result = run_stage(stage, log_filename, work_dir)
+                self.assertEqual(stage_result['lines'], 5000)
+                self.assertGreater(stage_result['lines_per_sec'], 0)
+            stage_result = run_stage(STAGE_RENDER_REPORT, log_filename, work_dir)
+            self.assertEqual(stage_result['lines'], 200)
+            self.assertTrue(os.path.exists(os.path.join(work_dir, 'report.html')))
+
+    def test_parse_lines_number(self):
+        self.assertEqual(parse_lines_number('100M'), 100000000)
+        self.assertEqual(parse_lines_number('1.5k'), 1500)
+        self.assertEqual(parse_lines_number('1234'), 1234)
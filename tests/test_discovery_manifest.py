@@ -0,0 +1,74 @@
+from unittest import TestCase
+from unittest.mock import patch
+from LogAnalyzer import DiscoveryManifest, get_file_date
+from datetime import date
+import os
+import re
+import shutil
+import tempfile
+import time
+
+
+class TestDiscoveryManifest(TestCase):
+    log_filename_regexp = re.compile(r"^nginx-access-ui\.log-(?P<file_date>[0-9]{8})\.(?:log|gz)$")
+
+    def setUp(self) -> None:
+        self.log_dir = tempfile.mkdtemp()
+        self.manifest_path = os.path.join(tempfile.mkdtemp(), 'manifest.json.gz')
+        for filename in ('nginx-access-ui.log-20170628.log', 'nginx-access-ui.log-20170629.gz',
+                         'nginx-access-ui.log-20170632.log', 'nu pogodi.avi'):
+            open(os.path.join(self.log_dir, filename), mode='w').close()
+        os.mkdir(os.path.join(self.log_dir, 'nginx-access-ui.log-20170701.log'))
+        self.set_dir_mtime(time.time() - 60)
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.log_dir)
+        shutil.rmtree(os.path.dirname(self.manifest_path))
+
+    def set_dir_mtime(self, mtime):
+        os.utime(self.log_dir, (mtime, mtime))
+
+    def match_files(self):
+        manifest = DiscoveryManifest(self.manifest_path)
+        with patch('LogAnalyzer.get_file_date', side_effect=get_file_date) as mock_match:
+            matched_files = manifest.match_files(self.log_dir, self.__class__.log_filename_regexp,
+                                                 '%Y%m%d')
+        manifest.store()
+        return sorted(matched_files), mock_match.call_count
+
+    def test_manifest_match_files(self):
+        with patch('LogAnalyzer.logging.error'):
+            matched_files, match_count = self.match_files()
+        self.assertListEqual(matched_files,
+                             [(os.path.join(self.log_dir, 'nginx-access-ui.log-20170628.log'),
+                               date(2017, 6, 28)),
+                              (os.path.join(self.log_dir, 'nginx-access-ui.log-20170629.gz'),
+                               date(2017, 6, 29))])
+        self.assertEqual(match_count, 4)
+
+        self.assertListEqual(self.match_files()[0], matched_files)
+        self.assertEqual(self.match_files()[1], 0)
+
+        open(os.path.join(self.log_dir, 'nginx-access-ui.log-20170630.log'), mode='w').close()
+        os.remove(os.path.join(self.log_dir, 'nginx-access-ui.log-20170628.log'))
+        self.set_dir_mtime(time.time() - 30)
+        with patch('LogAnalyzer.logging.error'):
+            matched_files, match_count = self.match_files()
+        self.assertListEqual(matched_files,
+                             [(os.path.join(self.log_dir, 'nginx-access-ui.log-20170629.gz'),
+                               date(2017, 6, 29)),
+                              (os.path.join(self.log_dir, 'nginx-access-ui.log-20170630.log'),
+                               date(2017, 6, 30))])
+        self.assertEqual(match_count, 3)
+
+    def test_manifest_recent_directory_mtime_is_not_trusted(self):
+        with patch('LogAnalyzer.logging.error'):
+            self.match_files()
+        self.set_dir_mtime(time.time())
+        with patch('LogAnalyzer.logging.error'):
+            self.match_files()
+        open(os.path.join(self.log_dir, 'nginx-access-ui.log-20170630.log'), mode='w').close()
+        self.set_dir_mtime(time.time())
+        with patch('LogAnalyzer.logging.error'):
+            matched_files, _ = self.match_files()
+        self.assertEqual(matched_files[-1][1], date(2017, 6, 30))
@@ -0,0 +1,50 @@
+from unittest import TestCase
+from unittest.mock import patch
+from LogAnalyzer import ReportAggregate, exact_median, select_median_window
+from array import array
+from statistics import median
+import json
+import random
+
+
+class TestExactMedian(TestCase):
+    def test_exact_median(self):
+        random_generator = random.Random(1)
+        for count in (1, 2, 3, 255, 256, 257, 1000, 1001):
+            request_times = array('d', (round(random_generator.expovariate(2), 3)
+                                        for _ in range(count)))
+            expected_median = median(request_times)
+            self.assertEqual(exact_median(request_times), expected_median)
+            with patch('LogAnalyzer.numpy', None):
+                self.assertEqual(exact_median(request_times), expected_median)
+            self.assertEqual(exact_median(request_times.tolist()), expected_median)
+
+    def test_exact_median_window_without_numpy(self):
+        random_generator = random.Random(2)
+        for request_times in (array('d', (random_generator.lognormvariate(0, 1)
+                                          for _ in range(40000))),
+                              array('d', (round(random_generator.expovariate(2), 3)
+                                          for _ in range(40001))),
+                              array('d', range(40000)),
+                              array('d', [0.5] * 40001)):
+            expected_median = median(request_times)
+            with patch('LogAnalyzer.numpy', None):
+                self.assertEqual(exact_median(request_times), expected_median)
+        request_times = array('d', (random_generator.lognormvariate(0, 1) for _ in range(40000)))
+        below_count, window = select_median_window(request_times)
+        self.assertLess(len(window), len(request_times) // 5)
+        self.assertEqual(sorted(request_times)[below_count:below_count + len(window)], window)
+
+    def test_array_timings(self):
+        report_aggregate = ReportAggregate()
+        report_aggregate.add_records([('GET /api/1 HTTP/1.1', 0.5), ('GET /api/1 HTTP/1.1', 0.25),
+                                      ('GET /api/2 HTTP/1.1', 0.125)])
+        self.assertIsInstance(report_aggregate.url_request_time['/api/1'], array)
+        stored_aggregate = ReportAggregate.from_dict(json.loads(json.dumps(
+            report_aggregate.to_dict())))
+        self.assertEqual(stored_aggregate.url_request_time['/api/1'], array('d', [0.5, 0.25]))
+        stored_aggregate.merge(report_aggregate)
+        self.assertListEqual([(url_statistic['url'], url_statistic['count'],
+                               url_statistic['time_med'], url_statistic['time_max'])
+                              for url_statistic in stored_aggregate.report_list(10)],
+                             [('/api/1', 4, '0.375', '0.500'), ('/api/2', 2, '0.125', '0.125')])
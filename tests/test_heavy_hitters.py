@@ -0,0 +1,46 @@
+from unittest import TestCase
+from LogAnalyzer import ReportAggregate, LogRecordGen, create_report_dict
+from analyzer_config import LOG_LINE_TEMPLATE
+import os
+import re
+
+
+class TestHeavyHitters(TestCase):
+    test_log_filename = os.path.abspath('./data/tests/nginx-access-ui.log-20170630.log')
+    log_line_template = LOG_LINE_TEMPLATE
+    log_line_regexp = None
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.log_line_regexp = re.compile(cls.log_line_template)
+
+    def test_bounded_table_and_error_bounds(self):
+        with LogRecordGen(self.__class__.test_log_filename,
+                          self.__class__.log_line_regexp, 0.1) as log_record_gen:
+            exact_dict = {record_dict['url']: record_dict
+                          for record_dict in create_report_dict(log_record_gen, 100)}
+        with LogRecordGen(self.__class__.test_log_filename,
+                          self.__class__.log_line_regexp, 0.1) as log_record_gen:
+            report_aggregate = ReportAggregate(top_urls_capacity=5)
+            report_aggregate.update(log_record_gen)
+        self.assertEqual(len(report_aggregate.url_request_time), 5)
+        self.assertEqual(len(report_aggregate.weight_heap), 5)
+        url_statistic_list = report_aggregate.report_list(3)
+        self.assertEqual(url_statistic_list[0]['url'], '/api/v2/banner/25019908')
+        for record_dict in url_statistic_list:
+            exact_time_sum = exact_dict[record_dict['url']]['time_sum']
+            self.assertLessEqual(exact_time_sum, record_dict['time_sum'] + 0.001)
+            self.assertGreaterEqual(exact_time_sum,
+                                    record_dict['time_sum'] - record_dict['time_sum_error'] - 0.001)
+
+    def test_merge_and_serialize(self):
+        with LogRecordGen(self.__class__.test_log_filename,
+                          self.__class__.log_line_regexp, 0.1) as log_record_gen:
+            report_aggregate = ReportAggregate(top_urls_capacity=5)
+            report_aggregate.update(log_record_gen)
+        restored_aggregate = ReportAggregate.from_dict(report_aggregate.to_dict())
+        self.assertListEqual(restored_aggregate.report_list(5), report_aggregate.report_list(5))
+        restored_aggregate.merge(report_aggregate)
+        self.assertEqual(len(restored_aggregate.url_request_time), 5)
+        self.assertEqual(restored_aggregate.report_list(1)[0]['url'], '/api/v2/banner/25019908')
+        self.assertEqual(restored_aggregate.report_list(1)[0]['count'], 8)
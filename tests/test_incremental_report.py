@@ -0,0 +1,142 @@
+from unittest import TestCase
+from unittest.mock import patch
+from LogAnalyzer import incremental_report, load_checkpoint, load_checkpoint_aggregate, \
+    LogRecordGen, create_report_dict
+from analyzer_config import load_test_config
+import datetime
+import json
+import os
+import shutil
+import tempfile
+
+
+class TestIncrementalReport(TestCase):
+    test_log_filename = os.path.abspath('./data/tests/nginx-access-ui.log-20170630.log')
+
+    def setUp(self) -> None:
+        self.work_dir = tempfile.mkdtemp()
+        self.config_dict = load_test_config(
+            incremental_log_path=os.path.join(self.work_dir, 'nginx-access-ui.log'),
+            checkpoint_path=os.path.join(self.work_dir, 'checkpoint.json.gz'),
+            report_dir=self.work_dir,
+            report_size=100,
+            log_parse_error_threshold=0.1,
+        )
+        with open(self.__class__.test_log_filename, mode='rb') as log_file:
+            self.log_lines = log_file.readlines()
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.work_dir)
+
+    def test_incremental_report(self):
+        log_path = self.config_dict['incremental_log_path']
+        with open(log_path, mode='wb') as log_file:
+            log_file.writelines(self.log_lines[:10])
+            log_file.write(self.log_lines[10][:20])
+        with patch('LogAnalyzer.logging.warning'):
+            incremental_report(self.config_dict)
+        checkpoint = load_checkpoint(self.config_dict['checkpoint_path'])
+        self.assertEqual(checkpoint['offset'], sum(len(line) for line in self.log_lines[:10]))
+        self.assertEqual(checkpoint['aggregate']['lines_count'], 10)
+
+        with open(log_path, mode='ab') as log_file:
+            log_file.write(self.log_lines[10][20:])
+            log_file.writelines(self.log_lines[11:])
+        with patch('LogAnalyzer.logging.warning'):
+            incremental_report(self.config_dict)
+        checkpoint = load_checkpoint(self.config_dict['checkpoint_path'])
+        self.assertEqual(checkpoint['offset'], os.path.getsize(log_path))
+        self.assertEqual(checkpoint['aggregate']['parse_errors_lines_list'], [7, 11])
+
+        with LogRecordGen(self.__class__.test_log_filename,
+                          self.config_dict['log_line_parser'], 0.1) as log_record_gen:
+            url_statistic_list = create_report_dict(log_record_gen, 100)
+        report_filename = os.path.join(
+            self.work_dir,
+            'report-{}.intraday.html'.format(datetime.date.today().strftime('%Y.%m.%d')))
+        with open(report_filename, mode='r', encoding='utf-8') as report_file:
+            self.assertIn(json.dumps(url_statistic_list), report_file.read())
+
+    def test_incremental_report_rotated_log(self):
+        log_path = self.config_dict['incremental_log_path']
+        with open(log_path, mode='wb') as log_file:
+            log_file.writelines(self.log_lines)
+        with patch('LogAnalyzer.logging.warning'):
+            incremental_report(self.config_dict)
+        os.remove(log_path)
+        with open(log_path + '.new', mode='wb') as log_file:
+            log_file.writelines(self.log_lines[:5])
+        os.rename(log_path + '.new', log_path)
+        incremental_report(self.config_dict)
+        checkpoint = load_checkpoint(self.config_dict['checkpoint_path'])
+        self.assertEqual(checkpoint['aggregate']['lines_count'], 5)
+
+    def test_incremental_report_appends_request_times(self):
+        log_path = self.config_dict['incremental_log_path']
+        checkpoint_path = self.config_dict['checkpoint_path']
+        for lines_end in (10, 20, len(self.log_lines)):
+            with open(log_path, mode='wb') as log_file:
+                log_file.writelines(self.log_lines[:lines_end])
+            with patch('LogAnalyzer.logging.warning'):
+                incremental_report(self.config_dict)
+            checkpoint = load_checkpoint(checkpoint_path)
+            self.assertEqual(checkpoint['aggregate']['url_request_time'], [])
+            self.assertEqual(checkpoint['times_generation'], 1)
+            self.assertEqual(os.path.getsize(checkpoint_path + '.1.times'),
+                             checkpoint['times_size'])
+        self.assertFalse(os.path.exists(checkpoint_path + '.0.times'))
+
+        with LogRecordGen(self.__class__.test_log_filename,
+                          self.config_dict['log_line_parser'], 0.1) as log_record_gen:
+            url_statistic_list = create_report_dict(log_record_gen, 100)
+        report_filename = os.path.join(
+            self.work_dir,
+            'report-{}.intraday.html'.format(datetime.date.today().strftime('%Y.%m.%d')))
+        with open(report_filename, mode='r', encoding='utf-8') as report_file:
+            self.assertIn(json.dumps(url_statistic_list), report_file.read())
+
+    def test_incremental_report_heavy_hitters_rewrites_request_times(self):
+        self.config_dict['report_top_urls_capacity'] = 2
+        log_path = self.config_dict['incremental_log_path']
+        with open(log_path, mode='wb') as log_file:
+            log_file.writelines(self.log_lines[:10])
+        with patch('LogAnalyzer.logging.warning'):
+            incremental_report(self.config_dict)
+        with open(log_path, mode='ab') as log_file:
+            log_file.writelines(self.log_lines[10:])
+        with patch('LogAnalyzer.logging.warning'):
+            incremental_report(self.config_dict)
+        checkpoint = load_checkpoint(self.config_dict['checkpoint_path'])
+        self.assertEqual(checkpoint['times_generation'], 2)
+        self.assertFalse(os.path.exists(self.config_dict['checkpoint_path'] + '.1.times'))
+        report_aggregate = load_checkpoint_aggregate(self.config_dict['checkpoint_path'],
+                                                     checkpoint)
+        self.assertEqual(set(report_aggregate.url_request_time),
+                         {url_line for url_line, _, _ in
+                          checkpoint['aggregate']['url_time_weight']})
+
+    def test_incremental_report_copytruncated_log(self):
+        log_path = self.config_dict['incremental_log_path']
+        with open(log_path, mode='wb') as log_file:
+            log_file.writelines(self.log_lines[:10])
+        with patch('LogAnalyzer.logging.warning'):
+            incremental_report(self.config_dict)
+        with open(log_path, mode='r+b') as log_file:
+            log_file.truncate(0)
+            log_file.writelines(self.log_lines[10:])
+        self.assertGreater(os.path.getsize(log_path),
+                           load_checkpoint(self.config_dict['checkpoint_path'])['offset'])
+        with patch('LogAnalyzer.logging.warning'):
+            incremental_report(self.config_dict)
+        checkpoint = load_checkpoint(self.config_dict['checkpoint_path'])
+        self.assertEqual(checkpoint['aggregate']['lines_count'], 20)
+        self.assertEqual(checkpoint['aggregate']['parse_errors_lines_list'], [1])
+        self.assertEqual(checkpoint['offset'], os.path.getsize(log_path))
+
+    def test_incremental_report_time_buckets_warning(self):
+        self.config_dict['report_time_bucket_minutes'] = 60
+        with open(self.config_dict['incremental_log_path'], mode='wb') as log_file:
+            log_file.writelines(self.log_lines)
+        with patch('LogAnalyzer.logging.warning') as mock_warning:
+            incremental_report(self.config_dict)
+        self.assertIn('time buckets', mock_warning.call_args_list[0][0][0])
@@ -81,7 +81,7 @@ class TestInitAnalyzer(unittest.TestCase):
                          r'(?P<http_user_agent>[^\"]+)\"\s+\"'
                          r'(?P<http_x_forwarded_for>[^\"]+)\"\s+'
                          r'\"(?P<http_x_request_id>[^\"]+)\"\s+'
-                         r'\"(?P<http_rb_user>[^\"]+)\"\s+'
+                         r'\"(?P<http_x_rb_user>[^\"]+)\"\s+'
                          r'(?P<request_time>\S+)'
                          )
 
@@ -142,7 +142,7 @@ class TestInitAnalyzer(unittest.TestCase):
                          r'(?P<http_user_agent>[^\"]+)\"\s+\"'
                          r'(?P<http_x_forwarded_for>[^\"]+)\"\s+'
                          r'\"(?P<http_x_request_id>[^\"]+)\"\s+'
-                         r'\"(?P<http_rb_user>[^\"]+)\"\s+'
+                         r'\"(?P<http_x_rb_user>[^\"]+)\"\s+'
                          r'(?P<request_time>\S+)'
                          )
         with (open(TestInitAnalyzer.log_line_valid_filename, 'rt', encoding='utf-8')) \
@@ -206,7 +206,7 @@ class TestInitAnalyzer(unittest.TestCase):
                          r'(?P<http_user_agent>[^\"]+)\"\s+\"'
                          r'(?P<http_x_forwarded_for>[^\"]+)\"\s+'
                          r'\"(?P<http_x_request_id>[^\"]+)\"\s+'
-                         r'\"(?P<http_rb_user>[^\"]+)\"\s+'
+                         r'\"(?P<http_x_rb_user>[^\"]+)\"\s+'
                          r'(?P<request_time>\S+)'
                          )
 
@@ -272,7 +272,7 @@ class TestInitAnalyzer(unittest.TestCase):
                          r'(?P<http_user_agent>[^\"]+)\"\s+\"'
                          r'(?P<http_x_forwarded_for>[^\"]+)\"\s+'
                          r'\"(?P<http_x_request_id>[^\"]+)\"\s+'
-                         r'\"(?P<http_rb_user>[^\"]+)\"\s+'
+                         r'\"(?P<http_x_rb_user>[^\"]+)\"\s+'
                          r'(?P<request_time>\S+)'
                          )
 
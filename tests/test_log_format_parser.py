@@ -0,0 +1,105 @@
+from unittest import TestCase
+from LogAnalyzer import LogFormatParser, LogRecordGen, RegexpRecordParser, create_report_dict, \
+    parallel_aggregate
+from analyzer_config import LOG_LINE_TEMPLATE
+import os
+import re
+
+
+class TestLogFormatParser(TestCase):
+    test_log_filename = os.path.abspath('./data/tests/nginx-access-ui.log-20170630.log')
+    log_format = '$remote_addr  $remote_user $http_x_real_ip [$time_local] "$request" ' \
+                 '$status $body_bytes_sent "$http_referer" ' \
+                 '"$http_user_agent" "$http_x_forwarded_for" ' \
+                 '"$http_X_REQUEST_ID" "$http_X_RB_USER" ' \
+                 '$request_time'
+    log_line_template = LOG_LINE_TEMPLATE
+    log_line_regexp = None
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.log_line_regexp = re.compile(cls.log_line_template)
+
+    def test_parse_line(self):
+        log_format_parser = LogFormatParser(self.__class__.log_format)
+        fields = log_format_parser(
+            '1.196.116.32 -  - [29/Jun/2017:03:50:22 +0300] '
+            '"GET /api/v2/banner/25019354 HTTP/1.1" 200 927 "-" "Lynx/2.8.8dev.9" "-" '
+            '"1498697422-2190034393-4708-9752759" "dc7161be3" 0.390\n')
+        self.assertEqual(fields['remote_addr'], '1.196.116.32')
+        self.assertEqual(fields['time_local'], '29/Jun/2017:03:50:22 +0300')
+        self.assertEqual(fields['request'], 'GET /api/v2/banner/25019354 HTTP/1.1')
+        self.assertEqual(fields['status'], '200')
+        self.assertEqual(fields['http_x_rb_user'], 'dc7161be3')
+        self.assertEqual(fields['request_time'], '0.390')
+
+    def test_parse_invalid_line(self):
+        log_format_parser = LogFormatParser(self.__class__.log_format)
+        with self.assertRaises(ValueError):
+            log_format_parser('1.196.116.32 -  - [29/Jun/2017:03:50:22 +0300] 200 927 "-"\n')
+
+    def test_unsupported_log_format(self):
+        with self.assertRaises(ValueError):
+            LogFormatParser('$remote_addr:$remote_port')
+
+    def test_fallback_regexp(self):
+        log_format_parser = LogFormatParser('$remote_addr $request_time $status',
+                                            re.compile(r'^(?P<request_time>\S+)$'))
+        self.assertDictEqual(log_format_parser('0.5'), {'request_time': '0.5'})
+
+    def test_create_report_dict(self):
+        log_format_parser = LogFormatParser(self.__class__.log_format,
+                                            self.__class__.log_line_regexp)
+        with LogRecordGen(self.__class__.test_log_filename,
+                          self.__class__.log_line_regexp, 0.1) as log_record_gen:
+            regexp_list = create_report_dict(log_record_gen, 100)
+        with LogRecordGen(self.__class__.test_log_filename,
+                          log_format_parser, 0.1) as log_record_gen:
+            log_format_list = create_report_dict(log_record_gen, 100)
+            self.assertListEqual(log_record_gen.parse_errors_lines_list, [7, 11])
+        self.assertListEqual(log_format_list, regexp_list)
+        self.assertListEqual(parallel_aggregate(self.__class__.test_log_filename,
+                                                log_format_parser, 2).report_list(100),
+                             regexp_list)
+
+    def test_parse_line_fields_projection(self):
+        log_format_parser = LogFormatParser(self.__class__.log_format,
+                                            self.__class__.log_line_regexp,
+                                            ('request', 'request_time', 'time_local'))
+        self.assertTupleEqual(log_format_parser(
+            '1.196.116.32 -  - [29/Jun/2017:03:50:22 +0300] '
+            '"GET /api/v2/banner/25019354 HTTP/1.1" 200 927 "-" "Lynx/2.8.8dev.9" "-" '
+            '"1498697422-2190034393-4708-9752759" "dc7161be3" 0.390\n'),
+            ('GET /api/v2/banner/25019354 HTTP/1.1', 0.39, '29/Jun/2017:03:50:22 +0300'))
+        with self.assertRaises(ValueError):
+            LogFormatParser(self.__class__.log_format, fields=('upstream_response_time',))
+
+    def test_regexp_record_parser(self):
+        log_line = '1.196.116.32 -  - [29/Jun/2017:03:50:22 +0300] ' \
+                   '"GET /api/v2/banner/25019354 HTTP/1.1" 200 927 "-" "Lynx/2.8.8dev.9" "-" ' \
+                   '"1498697422-2190034393-4708-9752759" "dc7161be3" 0.390'
+        record_parser = RegexpRecordParser(self.__class__.log_line_regexp,
+                                           ('request_time', 'request', 'status'))
+        self.assertTupleEqual(record_parser(log_line),
+                              (0.39, 'GET /api/v2/banner/25019354 HTTP/1.1', '200'))
+        bytes_parser = RegexpRecordParser(self.__class__.log_line_regexp,
+                                          ('request', 'request_time'), bytes_mode=True)
+        self.assertTupleEqual(bytes_parser(log_line.encode('utf-8')),
+                              ('GET /api/v2/banner/25019354 HTTP/1.1', 0.39))
+        self.assertTupleEqual(RegexpRecordParser(self.__class__.log_line_regexp,
+                                                 ('status',))(log_line), ('200',))
+        with self.assertRaises(ValueError):
+            record_parser('1.196.116.32 -  - [29/Jun/2017:03:50:22 +0300] 200 927 "-"')
+
+    def test_same_fields_as_regexp(self):
+        log_line = '1.196.116.32 -  - [29/Jun/2017:03:50:22 +0300] ' \
+                   '"GET /api/v2/banner/25019354 HTTP/1.1" 200 927 "-" "Lynx/2.8.8dev.9" "-" ' \
+                   '"1498697422-2190034393-4708-9752759" "dc7161be3" 0.390'
+        self.assertDictEqual(LogFormatParser(self.__class__.log_format)(log_line),
+                             self.__class__.log_line_regexp.search(log_line).groupdict())
+        with LogRecordGen(self.__class__.test_log_filename,
+                          self.__class__.log_line_regexp, None) as log_record_gen:
+            regexp_records = list(log_record_gen)
+        with LogRecordGen(self.__class__.test_log_filename,
+                          LogFormatParser(self.__class__.log_format), None) as log_record_gen:
+            self.assertListEqual(list(log_record_gen), regexp_records)
@@ -1,7 +1,11 @@
 from unittest import TestCase
-from LogAnalyzer import LogRecordGen, create_report_dict
+from LogAnalyzer import LogRecordGen, LogFormatParser, create_report_dict, split_file_ranges, \
+    parallel_aggregate, ParseErrorBudgetExceeded, PipelinedGzipReader, ReportAggregate, \
+    REPORT_FIELDS
+import gzip
 import os
 import re
+import tempfile
 from unittest.mock import patch
 
 
@@ -18,7 +22,7 @@ class TestGetLastLogFileName(TestCase):
                         r'\"(?P<http_user_agent>[^\"]+)\"\s+'\
                         r'\"(?P<http_x_forwarded_for>[^\"]+)\"\s+'\
                         r'\"(?P<http_x_request_id>[^\"]+)\"\s+'\
-                        r'\"(?P<http_rb_user>[^\"]+)\"\s+'\
+                        r'\"(?P<http_x_rb_user>[^\"]+)\"\s+'\
                         r'(?P<request_time>\S+)'
     log_line_regexp = None
 
@@ -79,3 +83,177 @@ class TestGetLastLogFileName(TestCase):
         self.assertLess(abs(url_statistic_list[1]['time_sum'] - 1.49), 0.0001)
         self.assertEqual(url_statistic_list[2]['url'], '/api/v2/banner/25013431')
         self.assertLess(abs(url_statistic_list[2]['time_sum'] - 0.917), 0.0001)
+
+    def test_split_file_ranges(self):
+        log_filename = os.path.join(self.__class__.test_log_dir, 'nginx-access-ui.log-20170630.log')
+        ranges = split_file_ranges(log_filename, 4)
+        self.assertEqual(ranges[0][0], 0)
+        self.assertEqual(ranges[-1][1], os.path.getsize(log_filename))
+        with open(log_filename, mode='rb') as log_file:
+            for (_, end), (start, _) in zip(ranges, ranges[1:]):
+                self.assertEqual(end, start)
+                log_file.seek(start - 1)
+                self.assertEqual(log_file.read(1), b'\n')
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            tiny_filename = os.path.join(temp_dir, 'nginx-access-ui.log-20170630.log')
+            with open(tiny_filename, mode='wb') as tiny_file:
+                tiny_file.write(b'a\nb\n')
+            self.assertListEqual(split_file_ranges(tiny_filename, 8), [(0, 2), (2, 4)])
+            open(tiny_filename, mode='wb').close()
+            self.assertListEqual(split_file_ranges(tiny_filename, 8), [])
+
+    def test_parallel_aggregate(self):
+        log_filename = os.path.join(self.__class__.test_log_dir, 'nginx-access-ui.log-20170630.log')
+        with LogRecordGen(log_filename, self.__class__.log_line_regexp, 0.1) as log_record_gen:
+            url_statistic_list = create_report_dict(log_record_gen, 100)
+        report_aggregate = parallel_aggregate(log_filename, self.__class__.log_line_regexp, 3)
+        self.assertListEqual(report_aggregate.report_list(100), url_statistic_list)
+        self.assertEqual(report_aggregate.lines_count, 30)
+        self.assertEqual(report_aggregate.parse_errors_count, 2)
+        self.assertListEqual(report_aggregate.parse_errors_lines_list, [7, 11])
+
+    def test_gen_fields_projection(self):
+        log_filename = os.path.join(self.__class__.test_log_dir, 'nginx-access-ui.log-20170630.log')
+        with LogRecordGen(log_filename, self.__class__.log_line_regexp, 0.1) as log_record_gen:
+            url_statistic_list = create_report_dict(log_record_gen, 100)
+        with LogRecordGen(log_filename, self.__class__.log_line_regexp, 0.1,
+                          fields=('request_time', 'request')) as log_record_gen:
+            self.assertTupleEqual(next(log_record_gen),
+                                  (0.39, 'GET /api/v2/banner/25019354 HTTP/1.1'))
+        with LogRecordGen(log_filename, self.__class__.log_line_regexp, 0.1,
+                          fields=('request', 'request_time')) as log_record_gen:
+            self.assertListEqual(create_report_dict(log_record_gen, 100), url_statistic_list)
+            self.assertListEqual(log_record_gen.parse_errors_lines_list, [7, 11])
+
+    def test_gen_gzip_pipeline(self):
+        log_filename = os.path.join(self.__class__.test_log_dir, 'nginx-access-ui.log-20170630.log')
+        with open(log_filename, mode='rb') as log_file:
+            log_data = log_file.read()
+        with tempfile.TemporaryDirectory() as temp_dir:
+            gzip_filename = os.path.join(temp_dir, 'nginx-access-ui.log-20170630.gz')
+            with open(gzip_filename, mode='wb') as gzip_file:
+                gzip_file.write(gzip.compress(log_data[:3000]))
+                gzip_file.write(b'\0' * 10)
+                gzip_file.write(gzip.compress(log_data[3000:]))
+                gzip_file.write(b'\0' * 1000)
+            with LogRecordGen(gzip_filename, self.__class__.log_line_regexp, 0.1) \
+                    as log_record_gen:
+                url_statistic_list = create_report_dict(log_record_gen, 100)
+            with LogRecordGen(gzip_filename, self.__class__.log_line_regexp, 0.1,
+                              gzip_pipeline=True) as log_record_gen:
+                self.assertListEqual(create_report_dict(log_record_gen, 100), url_statistic_list)
+                self.assertEqual(log_record_gen.lines_count, 30)
+                self.assertListEqual(log_record_gen.parse_errors_lines_list, [7, 11])
+
+            pipelined_reader = PipelinedGzipReader(gzip_filename, read_size=100, batch_size=256,
+                                                   queue_size=2)
+            try:
+                batches = list(pipelined_reader.iter_batches())
+            finally:
+                pipelined_reader.close()
+            log_lines = log_data.rstrip(b'\n').split(b'\n')
+            self.assertListEqual([line for batch in batches for line in batch], log_lines)
+            # batch is decompressed data of batch_size and the tail line of previous batch
+            self.assertLessEqual(max(sum(len(line) + 1 for line in batch) for batch in batches),
+                                 256 + max(map(len, log_lines)))
+
+            with open(gzip_filename, mode='wb') as gzip_file:
+                gzip_file.write(gzip.compress(log_data)[:-100])
+            with self.assertRaises(EOFError):
+                with LogRecordGen(gzip_filename, self.__class__.log_line_regexp, 0.1,
+                                  gzip_pipeline=True) as log_record_gen:
+                    for _ in log_record_gen:
+                        pass
+
+    def test_gen_mmap(self):
+        log_filename = os.path.join(self.__class__.test_log_dir, 'nginx-access-ui.log-20170630.log')
+        log_format_parser = LogFormatParser(
+            '$remote_addr  $remote_user $http_x_real_ip [$time_local] "$request" '
+            '$status $body_bytes_sent "$http_referer" "$http_user_agent" '
+            '"$http_x_forwarded_for" "$http_X_REQUEST_ID" "$http_X_RB_USER" $request_time',
+            self.__class__.log_line_regexp)
+        for log_parser in (self.__class__.log_line_regexp, log_format_parser):
+            with LogRecordGen(log_filename, log_parser, 0.1,
+                              fields=REPORT_FIELDS) as log_record_gen:
+                records_list = list(log_record_gen)
+            with LogRecordGen(log_filename, log_parser, 0.1, fields=REPORT_FIELDS,
+                              use_mmap=True) as log_record_gen:
+                self.assertIsNotNone(log_record_gen.buffer)
+                self.assertListEqual(list(log_record_gen), records_list)
+                self.assertEqual(log_record_gen.lines_count, 30)
+                self.assertListEqual(log_record_gen.parse_errors_lines_list, [7, 11])
+            self.assertTupleEqual(records_list[0], ('GET /api/v2/banner/25019354 HTTP/1.1', 0.39))
+
+            start_offset, end_offset = split_file_ranges(log_filename, 3)[1]
+            with LogRecordGen(log_filename, log_parser, None, start_offset, end_offset,
+                              REPORT_FIELDS) as log_record_gen:
+                records_list = list(log_record_gen)
+            with LogRecordGen(log_filename, log_parser, None, start_offset, end_offset,
+                              REPORT_FIELDS, use_mmap=True) as log_record_gen:
+                self.assertListEqual(list(log_record_gen), records_list)
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            empty_filename = os.path.join(temp_dir, 'nginx-access-ui.log-20170630.log')
+            open(empty_filename, mode='wb').close()
+            with LogRecordGen(empty_filename, self.__class__.log_line_regexp, None,
+                              fields=REPORT_FIELDS, use_mmap=True) as log_record_gen:
+                self.assertListEqual(list(log_record_gen), [])
+
+    def test_gen_parse_errors_budget(self):
+        log_filename = os.path.join(self.__class__.test_log_dir, 'nginx-access-ui.log-20170630.log')
+        with LogRecordGen(log_filename, self.__class__.log_line_regexp, 0.1,
+                          fields=REPORT_FIELDS, error_budget=0.5, error_warmup_lines=10,
+                          errors_sample_size=1) as log_record_gen:
+            self.assertEqual(len(list(log_record_gen)), 28)
+        self.assertEqual(len(log_record_gen.parse_errors_sample), 1)
+        self.assertIn(log_record_gen.parse_errors_sample[0][0], [7, 11])
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            garbage_filename = os.path.join(temp_dir, 'nginx-access-ui.log-20170630.log')
+            with open(garbage_filename, mode='wt', encoding='utf-8') as garbage_file:
+                garbage_file.writelines('garbage line {}\n'.format(line_no)
+                                        for line_no in range(1, 10001))
+            for use_mmap in (False, True):
+                with self.assertRaises(ParseErrorBudgetExceeded):
+                    with LogRecordGen(garbage_filename, self.__class__.log_line_regexp, 0.1,
+                                      fields=REPORT_FIELDS, use_mmap=use_mmap,
+                                      error_budget=0.5, error_warmup_lines=100,
+                                      errors_lines_limit=10,
+                                      errors_sample_size=5) as log_record_gen:
+                        for _ in log_record_gen:
+                            pass
+                self.assertEqual(log_record_gen.lines_count, 100)
+                self.assertListEqual(log_record_gen.parse_errors_lines_list, list(range(1, 11)))
+                self.assertEqual(len(log_record_gen.parse_errors_sample), 5)
+                for line_no, line in log_record_gen.parse_errors_sample:
+                    self.assertEqual(line, 'garbage line {}'.format(line_no))
+
+            with LogRecordGen(garbage_filename, self.__class__.log_line_regexp, None,
+                              fields=REPORT_FIELDS, errors_lines_limit=10) as log_record_gen:
+                self.assertListEqual(list(log_record_gen), [])
+            self.assertEqual(log_record_gen.parse_errors_count, 10000)
+            self.assertEqual(len(log_record_gen.parse_errors_lines_list), 10)
+
+    def test_merge_parse_errors_lines_limit(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            garbage_filename = os.path.join(temp_dir, 'nginx-access-ui.log-20170630.log')
+            with open(garbage_filename, mode='wt', encoding='utf-8') as garbage_file:
+                garbage_file.writelines('garbage line {}\n'.format(line_no)
+                                        for line_no in range(1, 1001))
+            report_aggregate = ReportAggregate(errors_lines_limit=10)
+            for start_offset, end_offset in split_file_ranges(garbage_filename, 2):
+                with LogRecordGen(garbage_filename, self.__class__.log_line_regexp, None,
+                                  start_offset, end_offset, REPORT_FIELDS,
+                                  errors_lines_limit=10) as log_record_gen:
+                    list(log_record_gen)
+                self.assertEqual(len(log_record_gen.parse_errors_lines_list), 10)
+                report_aggregate.merge_parse_statistic(log_record_gen)
+            self.assertEqual(report_aggregate.parse_errors_count, 1000)
+            self.assertListEqual(report_aggregate.parse_errors_lines_list, list(range(1, 11)))
+
+            report_aggregate = parallel_aggregate(garbage_filename, self.__class__.log_line_regexp,
+                                                  2, {'errors_lines_limit': 10},
+                                                  parse_error_options={'errors_lines_limit': 10})
+            self.assertEqual(report_aggregate.parse_errors_count, 1000)
+            self.assertListEqual(report_aggregate.parse_errors_lines_list, list(range(1, 11)))
@@ -0,0 +1,121 @@
+from unittest import TestCase
+from unittest.mock import patch
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from LogAnalyzer import LogWatcher
+from analyzer_config import load_test_config
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import time
+
+
+class TestLogWatcher(TestCase):
+    test_log_filename = os.path.abspath('./data/tests/nginx-access-ui.log-20170630.log')
+
+    def setUp(self) -> None:
+        self.log_dir = tempfile.mkdtemp()
+        self.report_dir = tempfile.mkdtemp()
+        self.config_dict = load_test_config(
+            log_dir=self.log_dir,
+            report_dir=self.report_dir,
+            report_size=100,
+            log_parse_error_threshold=0.1,
+            backfill_workers=1,
+            daemon_poll_interval=0.05,
+            daemon_settle_seconds=0,
+            daemon_status_path=os.path.join(self.log_dir, 'status', 'daemon_status.json'),
+        )
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.log_dir)
+        shutil.rmtree(self.report_dir)
+
+    def test_poll_settled_logs(self):
+        log_filename = os.path.join(self.log_dir, 'nginx-access-ui.log-20170630.log')
+        shutil.copy(self.__class__.test_log_filename, log_filename)
+        report_filename = os.path.join(self.report_dir, 'report-2017.06.30.html')
+        self.config_dict['daemon_settle_seconds'] = 60
+        log_watcher = LogWatcher(self.config_dict)
+        self.assertListEqual(log_watcher.poll(), [])
+        self.assertListEqual(log_watcher.poll(), [])
+        self.assertListEqual(log_watcher.poll(time.time() + 60),
+                             [(log_filename, report_filename)])
+
+        with open(log_filename, mode='ab') as log_file:
+            log_file.write(b'\n')
+        self.assertListEqual(log_watcher.poll(time.time() + 60), [])
+        self.assertListEqual(log_watcher.poll(time.time() + 60),
+                             [(log_filename, report_filename)])
+
+        log_watcher.failed_states[log_filename] = log_watcher.get_file_state(log_filename)
+        self.assertListEqual(log_watcher.poll(time.time() + 60), [])
+
+    def test_run_reports_new_log(self):
+        report_filename = os.path.join(self.report_dir, 'report-2017.06.30.html')
+        log_watcher = LogWatcher(self.config_dict)
+
+        async def rotate_and_stop():
+            await asyncio.sleep(0.2)
+            shutil.copy(self.__class__.test_log_filename,
+                        os.path.join(self.log_dir, 'nginx-access-ui.log-20170630.log'))
+            deadline = time.time() + 60
+            while not os.path.exists(report_filename) and time.time() < deadline:
+                await asyncio.sleep(0.05)
+            log_watcher.stop()
+
+        async def run_watcher():
+            await asyncio.gather(log_watcher.run(), rotate_and_stop())
+
+        asyncio.run(run_watcher())
+        self.assertTrue(os.path.exists(report_filename))
+        with open(self.config_dict['daemon_status_path'], mode='rt', encoding='utf-8') \
+                as status_file:
+            status = json.load(status_file)
+        self.assertEqual(status['status'], 'stopped')
+        self.assertEqual(status['reports_created'], 1)
+        self.assertEqual(status['reports_failed'], 0)
+        self.assertEqual(status['last_report']['report'], report_filename)
+        self.assertListEqual(status['in_progress'], [])
+        self.assertEqual(log_watcher.run_metrics.counters['reports_created'], 1)
+
+    def test_run_worker_errors(self):
+        shutil.copy(self.__class__.test_log_filename,
+                    os.path.join(self.log_dir, 'nginx-access-ui.log-20170630.log'))
+        log_watcher = LogWatcher(self.config_dict)
+
+        async def stop_after_errors():
+            deadline = time.time() + 60
+            while log_watcher.reports_failed < 1 and time.time() < deadline:
+                await asyncio.sleep(0.05)
+            shutil.copy(self.__class__.test_log_filename,
+                        os.path.join(self.log_dir, 'nginx-access-ui.log-20170629.log'))
+            while log_watcher.reports_failed < 2 and time.time() < deadline:
+                await asyncio.sleep(0.05)
+            # failed logs are not dispatched again while they are not changed
+            await asyncio.sleep(0.3)
+            log_watcher.stop()
+
+        async def run_watcher():
+            await asyncio.gather(log_watcher.run(), stop_after_errors())
+
+        # thread pool lets the patched build_report fail in workers
+        with patch('LogAnalyzer.ProcessPoolExecutor', side_effect=ThreadPoolExecutor) \
+                as mock_executor, \
+                patch('LogAnalyzer.build_report',
+                      side_effect=[BrokenProcessPool('worker died'), KeyError('log_dir')]) \
+                as mock_build_report, \
+                patch('LogAnalyzer.logging.exception'):
+            asyncio.run(run_watcher())
+        self.assertEqual(mock_build_report.call_count, 2)
+        self.assertEqual(mock_executor.call_count, 2)
+        self.assertFalse(log_watcher.is_executor_broken)
+        with open(self.config_dict['daemon_status_path'], mode='rt', encoding='utf-8') \
+                as status_file:
+            status = json.load(status_file)
+        self.assertEqual(status['status'], 'stopped')
+        self.assertEqual(status['reports_failed'], 2)
+        self.assertEqual(len(status['failed']), 2)
+        self.assertIn('KeyError', status['last_error']['error'])
@@ -0,0 +1,120 @@
+from unittest import TestCase
+from LogAnalyzer import LogRecordGen, map_partial, load_partial, merge_partials, reduce_partials, \
+    create_report_dict, render_report, REPORT_FIELDS, TIME_BUCKET_FIELDS
+from analyzer_config import load_test_config
+from unittest.mock import patch
+from LogAnalyzer import init_analyzer
+import gzip
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+
+class TestMapReduce(TestCase):
+    test_log_filename = os.path.abspath('./data/tests/nginx-access-ui.log-20170630.log')
+
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.mkdtemp()
+        self.log_filename = self.__class__.test_log_filename
+        self.config_dict = load_test_config(
+            report_dir=self.temp_dir,
+            report_size=100,
+            log_parse_error_threshold=0.1,
+        )
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.temp_dir)
+
+    def map_ranges(self, bounds):
+        partial_filenames = list()
+        for partial_no, (start_offset, end_offset) in enumerate(zip(bounds, bounds[1:])):
+            partial_filenames.append(map_partial(
+                self.config_dict, self.log_filename,
+                os.path.join(self.temp_dir, 'partial-{}.json.gz'.format(partial_no)),
+                start_offset, end_offset))
+        return partial_filenames
+
+    def test_map_reduce_report(self):
+        with LogRecordGen(self.log_filename, self.config_dict['log_line_parser'], 0.1,
+                          fields=REPORT_FIELDS) as log_record_gen:
+            url_statistic_list = create_report_dict(log_record_gen, 100)
+        expected_filename = os.path.join(self.temp_dir, 'expected.html')
+        render_report(self.config_dict['report_template_path'], expected_filename,
+                      url_statistic_list)
+
+        file_size = os.path.getsize(self.log_filename)
+        partial_filenames = self.map_ranges([0, 1000, 1001, file_size // 2, file_size])
+        partials = [load_partial(partial_filename) for partial_filename in partial_filenames]
+        self.assertEqual(partials[0]['source']['end_offset'],
+                         partials[1]['source']['start_offset'])
+        self.assertEqual(partials[1]['source']['start_offset'],
+                         partials[1]['source']['end_offset'])
+        report_aggregate = merge_partials(partials[::-1])
+        self.assertListEqual(report_aggregate.report_list(100), url_statistic_list)
+        self.assertEqual(report_aggregate.lines_count, 30)
+        self.assertListEqual(report_aggregate.parse_errors_lines_list, [7, 11])
+
+        report_filename = reduce_partials(self.config_dict, partial_filenames[::-1])
+        self.assertEqual(report_filename, os.path.join(self.temp_dir, 'report-2017.06.30.html'))
+        with open(report_filename, mode='rb') as report_file, \
+                open(expected_filename, mode='rb') as expected_file:
+            self.assertEqual(report_file.read(), expected_file.read())
+
+    def test_map_reduce_time_buckets(self):
+        self.config_dict['report_time_bucket_minutes'] = 60
+        with LogRecordGen(self.log_filename, self.config_dict['log_line_parser'], 0.1,
+                          fields=TIME_BUCKET_FIELDS) as log_record_gen:
+            url_statistic_list = create_report_dict(log_record_gen, 100, time_bucket_minutes=60)
+        partial_filenames = self.map_ranges([0, 2000, os.path.getsize(self.log_filename)])
+        report_aggregate = merge_partials(map(load_partial, partial_filenames))
+        self.assertListEqual(report_aggregate.report_list(100), url_statistic_list)
+
+    def test_map_requires_output(self):
+        config_path = os.path.join(self.temp_dir, 'config.json')
+        with open(config_path, mode='w', encoding='utf-8') as config_file:
+            json.dump({'map_log_path': self.log_filename}, config_file)
+        with patch.object(sys, 'argv', [sys.argv[0], '--no-launch', '--config', config_path]):
+            with self.assertRaises(SystemExit):
+                init_analyzer()
+        with patch.object(sys, 'argv', [sys.argv[0], '--no-launch', '--map', self.log_filename]):
+            with self.assertRaises(SystemExit):
+                init_analyzer()
+        with self.assertRaises(ValueError):
+            map_partial(self.config_dict, self.log_filename, None)
+
+    def test_merge_partials_errors(self):
+        file_size = os.path.getsize(self.log_filename)
+        partial_filenames = self.map_ranges([0, file_size // 2, file_size])
+        overlap_filename = map_partial(self.config_dict, self.log_filename,
+                                       os.path.join(self.temp_dir, 'overlap.json.gz'),
+                                       file_size // 3, file_size)
+        with self.assertRaises(ValueError):
+            merge_partials(map(load_partial, partial_filenames + [overlap_filename]))
+
+        partials = [load_partial(partial_filename) for partial_filename in partial_filenames]
+        partials[1]['aggregate_options']['stat_mode'] = 'sketch'
+        with self.assertRaises(ValueError):
+            merge_partials(partials)
+
+        partials[1]['aggregate_options']['stat_mode'] = 'exact'
+        partials[1]['date'] = '2017-07-01'
+        with self.assertRaises(ValueError):
+            reduce_partials(self.config_dict, partial_filenames + [overlap_filename])
+
+        gzip_filename = os.path.join(self.temp_dir, 'nginx-access-ui.log-20170630.gz')
+        with open(self.log_filename, mode='rb') as log_file, \
+                gzip.open(gzip_filename, mode='wb') as gzip_file:
+            gzip_file.write(log_file.read())
+        with self.assertRaises(ValueError):
+            map_partial(self.config_dict, gzip_filename,
+                        os.path.join(self.temp_dir, 'gzip.json.gz'), 0, 100)
+        partial = load_partial(map_partial(self.config_dict, gzip_filename,
+                                           os.path.join(self.temp_dir, 'gzip.json.gz')))
+        self.assertEqual(merge_partials([partial]).lines_count, 30)
+
+        with gzip.open(os.path.join(self.temp_dir, 'gzip.json.gz'), mode='wt') as partial_file:
+            partial_file.write('{"version": 0}')
+        with self.assertRaises(ValueError):
+            load_partial(os.path.join(self.temp_dir, 'gzip.json.gz'))
@@ -0,0 +1,121 @@
+from unittest import TestCase
+from unittest.mock import patch
+from LogAnalyzer import LogRecordGen, get_log_dirs, get_source_destination_filenames, \
+    get_unreported_filenames, hosts_aggregate, build_report, create_report_dict, REPORT_FIELDS
+from analyzer_config import load_test_config
+import os
+import shutil
+import tempfile
+import time
+
+
+class TestMultiHost(TestCase):
+    test_log_filename = os.path.abspath('./data/tests/nginx-access-ui.log-20170630.log')
+
+    def setUp(self) -> None:
+        self.hosts_dir = tempfile.mkdtemp()
+        self.report_dir = tempfile.mkdtemp()
+        for host, log_dates in (('web1', ('20170629', '20170630')), ('web2', ('20170630',))):
+            os.makedirs(os.path.join(self.hosts_dir, host, 'nginx'))
+            for log_date in log_dates:
+                shutil.copy(self.__class__.test_log_filename,
+                            os.path.join(self.hosts_dir, host, 'nginx',
+                                         'nginx-access-ui.log-{}.log'.format(log_date)))
+        self.config_dict = load_test_config(
+            log_dir=os.path.join(self.hosts_dir, '*', 'nginx'),
+            report_dir=self.report_dir,
+            report_size=100,
+            log_parse_error_threshold=0.1,
+            log_hosts_workers=2,
+        )
+        self.host_logs = tuple(os.path.join(self.hosts_dir, host, 'nginx',
+                                            'nginx-access-ui.log-20170630.log')
+                               for host in ('web1', 'web2'))
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.hosts_dir)
+        shutil.rmtree(self.report_dir)
+
+    def test_get_log_dirs(self):
+        host_dirs = [os.path.join(self.hosts_dir, host, 'nginx') for host in ('web1', 'web2')]
+        self.assertListEqual(get_log_dirs(self.config_dict), host_dirs)
+        self.assertListEqual(get_log_dirs({'log_dir': host_dirs[::-1] + [host_dirs[1]]}),
+                             host_dirs[::-1])
+        self.assertListEqual(get_log_dirs({'log_dir': host_dirs[0]}), host_dirs[:1])
+
+    def test_get_host_logs(self):
+        single_log = os.path.join(self.hosts_dir, 'web1', 'nginx',
+                                  'nginx-access-ui.log-20170629.log')
+        os.utime(single_log, (time.time() - 7200, time.time() - 7200))
+        self.assertTupleEqual(get_source_destination_filenames(self.config_dict),
+                              (True, self.host_logs,
+                               os.path.join(self.report_dir, 'report-2017.06.30.html')))
+        with patch('LogAnalyzer.logging.warning') as mock_logging:
+            self.assertListEqual(
+                get_unreported_filenames(self.config_dict),
+                [((single_log,), os.path.join(self.report_dir, 'report-2017.06.29.html')),
+                 (self.host_logs, os.path.join(self.report_dir, 'report-2017.06.30.html'))])
+        mock_logging.assert_called_once_with('logs of hosts:{} are missing for date:2017-06-29, '
+                                             'report is built without them'
+                                             .format(os.path.join('web2', 'nginx')))
+
+    def test_hosts_rotate_at_different_times(self):
+        web1_log, web2_log = (os.path.join(self.hosts_dir, host, 'nginx',
+                                           'nginx-access-ui.log-20170701.log')
+                              for host in ('web1', 'web2'))
+        report_filename = os.path.join(self.report_dir, 'report-2017.07.01.html')
+        open(os.path.join(self.report_dir, 'report-2017.06.30.html'), mode='w').close()
+        open(os.path.join(self.report_dir, 'report-2017.06.29.html'), mode='w').close()
+        shutil.copy(self.__class__.test_log_filename, web1_log)
+        # web2 has not rotated its log yet, date is held back
+        with patch('LogAnalyzer.logging.warning') as mock_logging:
+            self.assertTupleEqual(get_source_destination_filenames(self.config_dict),
+                                  (False, None, None))
+            self.assertListEqual(get_unreported_filenames(self.config_dict), [])
+            mock_logging.assert_not_called()
+
+        shutil.copy(self.__class__.test_log_filename, web2_log)
+        self.assertTupleEqual(get_source_destination_filenames(self.config_dict),
+                              (True, (web1_log, web2_log), report_filename))
+        self.assertListEqual(get_unreported_filenames(self.config_dict),
+                             [((web1_log, web2_log), report_filename)])
+
+        # web2 never rotates: date is taken after grace period with warning
+        os.remove(web2_log)
+        os.utime(web1_log, (time.time() - 3000, time.time() - 3000))
+        self.assertListEqual(get_unreported_filenames(self.config_dict), [])
+        self.config_dict['log_hosts_grace_seconds'] = 600
+        with patch('LogAnalyzer.logging.warning') as mock_logging:
+            self.assertTupleEqual(get_source_destination_filenames(self.config_dict),
+                                  (True, (web1_log,), report_filename))
+        mock_logging.assert_called_once()
+        self.assertIn(os.path.join('web2', 'nginx'), mock_logging.call_args[0][0])
+
+    def test_hosts_aggregate(self):
+        with LogRecordGen(self.__class__.test_log_filename, self.config_dict['log_line_parser'],
+                          0.1, fields=REPORT_FIELDS) as log_record_gen:
+            url_statistic_list = create_report_dict(log_record_gen, 100)
+        for hosts_workers in (1, 2):
+            self.config_dict['log_hosts_workers'] = hosts_workers
+            with patch('LogAnalyzer.logging.info') as mock_logging:
+                report_aggregate = hosts_aggregate(self.config_dict, self.host_logs)
+            self.assertEqual(report_aggregate.lines_count, 60)
+            self.assertEqual(report_aggregate.parse_errors_count, 4)
+            self.assertListEqual(report_aggregate.parse_errors_lines_list, [7, 11, 37, 41])
+            host_statistic_list = report_aggregate.report_list(100)
+            self.assertListEqual([url_statistic['count'] for url_statistic in host_statistic_list],
+                                 [url_statistic['count'] * 2
+                                  for url_statistic in url_statistic_list])
+            self.assertListEqual([call_args[0][0] for call_args in mock_logging.call_args_list],
+                                 ['host:{} log:{} lines:30, parsing errors:2'
+                                  .format(os.path.join(host, 'nginx'), log_filename)
+                                  for host, log_filename in zip(('web1', 'web2'),
+                                                                self.host_logs)])
+
+    def test_build_report_hosts(self):
+        report_filename = os.path.join(self.report_dir, 'report-2017.06.30.html')
+        build_report(self.config_dict, self.host_logs, report_filename)
+        self.assertTrue(os.path.exists(report_filename))
+        build_report(self.config_dict, self.host_logs[:1],
+                     os.path.join(self.report_dir, 'report-2017.06.29.html'))
+        self.assertTrue(os.path.exists(os.path.join(self.report_dir, 'report-2017.06.29.html')))
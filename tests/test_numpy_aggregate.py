@@ -0,0 +1,82 @@
+from unittest import TestCase, skipIf
+from unittest.mock import patch
+from LogAnalyzer import LogRecordGen, ParsedLogColumns, ReportAggregate, NumpyReportAggregate, \
+    TimeBucketAggregate, create_report_dict, create_report_aggregate, get_aggregate_options, \
+    REPORT_FIELDS
+from analyzer_config import load_test_config, LOG_LINE_TEMPLATE
+import LogAnalyzer
+import os
+import re
+
+
+class TestNumpyAggregate(TestCase):
+    test_log_filename = os.path.abspath('./data/tests/nginx-access-ui.log-20170630.log')
+    log_line_template = LOG_LINE_TEMPLATE
+    log_line_regexp = None
+    url_normalization = {'replace_ids': True, 'query_mode': 'strip', 'query_whitelist': [],
+                         'rules': []}
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.log_line_regexp = re.compile(cls.log_line_template)
+
+    def get_report_list(self, backend, top_records_no=100, **aggregate_options):
+        with LogRecordGen(self.__class__.test_log_filename, self.__class__.log_line_regexp, None,
+                          fields=REPORT_FIELDS) as log_record_gen:
+            return create_report_dict(log_record_gen, top_records_no, backend,
+                                      **aggregate_options)
+
+    @skipIf(LogAnalyzer.numpy is None, 'numpy is not installed')
+    def test_numpy_report_list(self):
+        for top_records_no in (100, 3):
+            self.assertListEqual(self.get_report_list('numpy', top_records_no),
+                                 self.get_report_list('python', top_records_no))
+        self.assertListEqual(
+            self.get_report_list('numpy', url_normalization=self.__class__.url_normalization),
+            self.get_report_list('python', url_normalization=self.__class__.url_normalization))
+        with LogRecordGen(self.__class__.test_log_filename, self.__class__.log_line_regexp,
+                          None) as log_record_gen:
+            self.assertListEqual(create_report_dict(log_record_gen, 100, 'numpy'),
+                                 self.get_report_list('python'))
+
+    @skipIf(LogAnalyzer.numpy is None, 'numpy is not installed')
+    def test_numpy_columns_and_conversion(self):
+        with LogRecordGen(self.__class__.test_log_filename, self.__class__.log_line_regexp, None,
+                          fields=REPORT_FIELDS) as log_record_gen:
+            parsed_columns = ParsedLogColumns.from_records(log_record_gen)
+        numpy_aggregate = NumpyReportAggregate()
+        numpy_aggregate.update(parsed_columns)
+        numpy_aggregate.update(parsed_columns)
+        report_aggregate = ReportAggregate()
+        report_aggregate.update(parsed_columns)
+        report_aggregate.update(parsed_columns)
+        self.assertListEqual(numpy_aggregate.report_list(100), report_aggregate.report_list(100))
+        self.assertEqual(numpy_aggregate.get_urls_count(), 25)
+        self.assertListEqual(numpy_aggregate.parse_errors_lines_list, [7, 11, 37, 41])
+        self.assertListEqual(numpy_aggregate.to_report_aggregate().report_list(100),
+                             report_aggregate.report_list(100))
+        self.assertEqual(numpy_aggregate.to_sketch_aggregate(200).report_list(100)[0]['count'], 8)
+
+    @skipIf(LogAnalyzer.numpy is None, 'numpy is not installed')
+    def test_numpy_unsupported_mode(self):
+        with self.assertRaises(ValueError):
+            NumpyReportAggregate('sketch')
+        with self.assertRaises(ValueError):
+            NumpyReportAggregate(top_urls_capacity=10)
+
+    def test_create_report_aggregate_fallback(self):
+        config_dict = load_test_config(aggregate_backend='numpy', report_stat_mode='sketch')
+        aggregate_options = get_aggregate_options(config_dict)
+        with patch('LogAnalyzer.logging.warning') as mock_logging:
+            self.assertIsInstance(create_report_aggregate(aggregate_options, backend='numpy'),
+                                  ReportAggregate)
+            mock_logging.assert_called_once()
+        with patch('LogAnalyzer.logging.warning') as mock_logging:
+            self.assertIsInstance(create_report_aggregate(aggregate_options, 30, 'numpy'),
+                                  TimeBucketAggregate)
+            mock_logging.assert_called_once()
+        aggregate_options['stat_mode'] = 'exact'
+        with patch('LogAnalyzer.numpy', None), patch('LogAnalyzer.logging.warning'):
+            self.assertIsInstance(create_report_aggregate(aggregate_options, backend='numpy'),
+                                  ReportAggregate)
+            self.assertIsInstance(self.get_report_list('numpy'), list)
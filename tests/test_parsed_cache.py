@@ -0,0 +1,90 @@
+from unittest import TestCase
+from unittest.mock import patch
+from LogAnalyzer import ParsedLogColumns, LogRecordGen, RunMetrics, load_parsed_columns, \
+    create_report_dict, REPORT_FIELDS
+from analyzer_config import load_test_config, LOG_LINE_TEMPLATE
+import os
+import re
+import shutil
+import tempfile
+
+
+class TestParsedCache(TestCase):
+    test_log_filename = os.path.abspath('./data/tests/nginx-access-ui.log-20170630.log')
+    log_line_template = LOG_LINE_TEMPLATE
+
+    def setUp(self) -> None:
+        self.log_dir = tempfile.mkdtemp()
+        self.log_filename = os.path.join(self.log_dir, 'nginx-access-ui.log-20170630.log')
+        shutil.copy(self.__class__.test_log_filename, self.log_filename)
+        self.config_dict = load_test_config()
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.log_dir)
+
+    def test_parsed_columns_report(self):
+        with LogRecordGen(self.log_filename, self.config_dict['log_line_parser'], None,
+                          fields=REPORT_FIELDS) as log_record_gen:
+            url_statistic_list = create_report_dict(log_record_gen, 100)
+        parsed_columns = load_parsed_columns(self.config_dict, self.log_filename, RunMetrics())
+        self.assertTrue(os.path.exists(self.log_filename + '.columns'))
+        self.assertEqual(len(parsed_columns.request_ids), 28)
+        self.assertEqual(len(parsed_columns.requests), 25)
+        self.assertEqual(parsed_columns.statuses[0], 200)
+        self.assertListEqual(parsed_columns.parse_errors_lines_list, [7, 11])
+        self.assertListEqual(create_report_dict(parsed_columns, 100), url_statistic_list)
+
+        run_metrics = RunMetrics()
+        with patch('LogAnalyzer.LogRecordGen') as mock_log_record_gen:
+            stored_columns = load_parsed_columns(self.config_dict, self.log_filename, run_metrics)
+            mock_log_record_gen.assert_not_called()
+        self.assertEqual(run_metrics.counters['parsed_cache_hit'], 1)
+        self.assertListEqual(create_report_dict(stored_columns, 100), url_statistic_list)
+        self.assertEqual(stored_columns.lines_count, 30)
+        self.assertListEqual(stored_columns.parse_errors_lines_list, [7, 11])
+
+    def test_parsed_cache_invalidation(self):
+        cache_dir = os.path.join(self.log_dir, 'cache')
+        self.config_dict['parsed_cache_dir'] = cache_dir
+        load_parsed_columns(self.config_dict, self.log_filename, RunMetrics())
+        self.assertListEqual(os.listdir(cache_dir), ['nginx-access-ui.log-20170630.log.columns'])
+
+        log_stat = os.stat(self.log_filename)
+        os.utime(self.log_filename, ns=(log_stat.st_atime_ns, log_stat.st_mtime_ns + 10 ** 9))
+        run_metrics = RunMetrics()
+        load_parsed_columns(self.config_dict, self.log_filename, run_metrics)
+        self.assertEqual(run_metrics.counters['parsed_cache_hit'], 0)
+
+        self.config_dict['log_line_parser'] = re.compile(self.__class__.log_line_template + '$')
+        run_metrics = RunMetrics()
+        load_parsed_columns(self.config_dict, self.log_filename, run_metrics)
+        self.assertEqual(run_metrics.counters['parsed_cache_hit'], 0)
+
+        with open(os.path.join(cache_dir, 'nginx-access-ui.log-20170630.log.columns'),
+                  mode='r+b') as cache_file:
+            cache_file.truncate(100)
+        with patch('LogAnalyzer.logging.exception'):
+            self.assertIsNone(ParsedLogColumns.load(
+                os.path.join(cache_dir, 'nginx-access-ui.log-20170630.log.columns'), None))
+
+    def test_parsed_cache_store_error_keeps_no_partial_file(self):
+        with LogRecordGen(self.log_filename, self.config_dict['log_line_parser'], None,
+                          fields=REPORT_FIELDS) as log_record_gen:
+            parsed_columns = ParsedLogColumns.from_records(log_record_gen)
+        cache_filename = os.path.join(self.log_dir, 'cache', 'log.columns')
+        # list column has no tofile, store fails after header is written
+        parsed_columns.statuses = list(parsed_columns.statuses)
+        with self.assertRaises(AttributeError):
+            parsed_columns.store(cache_filename, None)
+        self.assertListEqual(os.listdir(os.path.join(self.log_dir, 'cache')), [])
+
+    def test_parsed_cache_out_of_range_status(self):
+        with open(self.log_filename, mode='rb') as log_file:
+            log_lines = log_file.readlines()
+        log_lines[0] = log_lines[0].replace(b'" 200 ', b'" 70000 ', 1)
+        with open(self.log_filename, mode='wb') as log_file:
+            log_file.writelines(log_lines)
+        parsed_columns = load_parsed_columns(self.config_dict, self.log_filename, RunMetrics())
+        self.assertEqual(parsed_columns.statuses[0], 0)
+        self.assertEqual(parsed_columns.statuses[1], 200)
+        self.assertEqual(len(parsed_columns.request_ids), 28)
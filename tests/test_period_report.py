@@ -0,0 +1,60 @@
+from unittest import TestCase
+from LogAnalyzer import ReportAggregate, LogRecordGen, store_day_aggregate, load_day_aggregate, \
+    period_report
+from analyzer_config import load_test_config, LOG_LINE_TEMPLATE
+from datetime import date
+import json
+import os
+import re
+import shutil
+import tempfile
+
+
+class TestPeriodReport(TestCase):
+    test_log_filename = os.path.abspath('./data/tests/nginx-access-ui.log-20170630.log')
+    log_line_template = LOG_LINE_TEMPLATE
+
+    def setUp(self) -> None:
+        self.work_dir = tempfile.mkdtemp()
+        self.config_dict = load_test_config(
+            aggregate_store_dir=os.path.join(self.work_dir, 'aggregates'),
+            report_dir=self.work_dir,
+            report_size=100,
+        )
+        with LogRecordGen(self.__class__.test_log_filename,
+                          re.compile(self.__class__.log_line_template), 0.1) as log_record_gen:
+            self.report_aggregate = ReportAggregate()
+            self.report_aggregate.update(log_record_gen)
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.work_dir)
+
+    def test_store_day_aggregate(self):
+        store_day_aggregate(self.config_dict['aggregate_store_dir'], date(2017, 6, 30),
+                            self.report_aggregate.to_sketch_aggregate(200))
+        day_aggregate = load_day_aggregate(self.config_dict['aggregate_store_dir'],
+                                           date(2017, 6, 30))
+        self.assertEqual(day_aggregate.lines_count, 30)
+        self.assertEqual(day_aggregate.total_request_qty, 28)
+        for exact_dict, stored_dict in zip(self.report_aggregate.report_list(100),
+                                           day_aggregate.report_list(100)):
+            self.assertEqual(exact_dict['time_med'], stored_dict['time_med'])
+            self.assertEqual(exact_dict['time_sum'], stored_dict['time_sum'])
+        self.assertIsNone(load_day_aggregate(self.config_dict['aggregate_store_dir'],
+                                             date(2017, 6, 29)))
+
+    def test_period_report(self):
+        for day in (28, 30):
+            store_day_aggregate(self.config_dict['aggregate_store_dir'], date(2017, 6, day),
+                                self.report_aggregate.to_sketch_aggregate(200))
+        report_filename = period_report(self.config_dict, '2017-06-28', '2017-06-30')
+        self.assertEqual(report_filename,
+                         os.path.join(self.work_dir, 'report-2017.06.28-2017.06.30.html'))
+        with open(report_filename, mode='r', encoding='utf-8') as report_file:
+            report_text = report_file.read()
+        table_json = report_text[report_text.index('var table = ') + 12:]
+        url_statistic_list = json.loads(table_json[:table_json.index(';\n')])
+        self.assertEqual(url_statistic_list[0]['url'], '/api/v2/banner/25019908')
+        self.assertEqual(url_statistic_list[0]['count'], 8)
+        self.assertEqual(url_statistic_list[0]['time_med'], '1.282')
+        self.assertIsNone(period_report(self.config_dict, '2017-07-01', '2017-07-02'))
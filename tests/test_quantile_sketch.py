@@ -0,0 +1,84 @@
+from unittest import TestCase
+from LogAnalyzer import QuantileSketch, LogRecordGen, create_report_dict, STAT_MODE_SKETCH
+from array import array
+from statistics import median
+from analyzer_config import LOG_LINE_TEMPLATE
+import bisect
+import os
+import random
+import re
+
+
+class TestQuantileSketch(TestCase):
+    test_log_filename = os.path.abspath('./data/tests/nginx-access-ui.log-20170630.log')
+    log_line_template = LOG_LINE_TEMPLATE
+
+    def test_exact_before_compaction(self):
+        values = [0.5, 0.1, 0.3, 0.2]
+        sketch = QuantileSketch(10)
+        for value in values:
+            sketch.append(value)
+        self.assertEqual(sketch.quantile(0.5), median(values))
+        self.assertEqual(sketch.max, 0.5)
+        self.assertEqual(sketch.count, 4)
+
+    def test_bounded_size_and_rank_error(self):
+        generator = random.Random(1)
+        values = [generator.lognormvariate(0, 1) for _ in range(100000)]
+        sketch_list = [QuantileSketch(200) for _ in range(4)]
+        for value_no, value in enumerate(values):
+            sketch_list[value_no % 4].append(value)
+        sketch = sketch_list[0]
+        for other in sketch_list[1:]:
+            sketch.merge(other)
+        self.assertEqual(sketch.count, len(values))
+        self.assertEqual(sketch.max, max(values))
+        self.assertLess(sum(len(level) for level in sketch.levels), 3 * 200)
+        sorted_values = sorted(values)
+        for rank in (0.5, 0.9, 0.99):
+            actual_rank = bisect.bisect_left(sorted_values, sketch.quantile(rank)) / len(values)
+            self.assertLess(abs(actual_rank - rank), 0.01)
+
+    def test_append_rank_error(self):
+        for seed in range(5):
+            generator = random.Random(seed)
+            random.seed(seed)
+            values = [generator.lognormvariate(0, 1) for _ in range(100000)]
+            sketch = QuantileSketch(200)
+            for value in values:
+                sketch.append(value)
+            self.assertEqual(sketch.size, sum(len(level) for level in sketch.levels))
+            self.assertLess(sketch.size, 3 * 200)
+            sorted_values = sorted(values)
+            for rank in (0.5, 0.9, 0.99):
+                actual_rank = bisect.bisect_left(sorted_values, sketch.quantile(rank)) / len(values)
+                self.assertLess(abs(actual_rank - rank), 0.01)
+
+    def test_extend(self):
+        generator = random.Random(2)
+        values = array('d', (generator.lognormvariate(0, 1) for _ in range(100000)))
+        sketch = QuantileSketch(200).extend(values[:100]).extend(values[100:]).extend([])
+        self.assertEqual(sketch.count, len(values))
+        self.assertEqual(sketch.max, max(values))
+        self.assertAlmostEqual(sketch.sum, sum(values))
+        self.assertLess(sum(len(level) for level in sketch.levels), 3 * 200)
+        sorted_values = sorted(values)
+        for rank in (0.5, 0.9, 0.99):
+            actual_rank = bisect.bisect_left(sorted_values, sketch.quantile(rank)) / len(values)
+            self.assertLess(abs(actual_rank - rank), 0.01)
+        self.assertEqual(QuantileSketch(200).extend(values[:50]).quantile(0.5),
+                         median(values[:50]))
+
+    def test_create_report_dict_sketch_mode(self):
+        log_line_regexp = re.compile(self.__class__.log_line_template)
+        with LogRecordGen(self.__class__.test_log_filename, log_line_regexp, 0.1) \
+                as log_record_gen:
+            exact_list = create_report_dict(log_record_gen, 100)
+        with LogRecordGen(self.__class__.test_log_filename, log_line_regexp, 0.1) \
+                as log_record_gen:
+            sketch_list = create_report_dict(log_record_gen, 100, stat_mode=STAT_MODE_SKETCH)
+        for exact_dict, sketch_dict in zip(exact_list, sketch_list):
+            self.assertIn('time_p90', sketch_dict)
+            self.assertIn('time_p99', sketch_dict)
+            del sketch_dict['time_p90'], sketch_dict['time_p99']
+            self.assertDictEqual(exact_dict, sketch_dict)
@@ -0,0 +1,170 @@
+from unittest import TestCase
+from LogAnalyzer import render_report, render_chunked_report, write_report, atomic_write, \
+    read_report_data_path
+import json
+import os
+import tempfile
+from string import Template
+
+
+def load_report_data(data_filename):
+    """Return data of report data script reportDataLoaded("<file name>",<json>);"""
+    with open(data_filename, mode='r', encoding='utf-8') as data_file:
+        data_script = data_file.read()
+    prefix = 'reportDataLoaded({},'.format(json.dumps(os.path.basename(data_filename)))
+    assert data_script.startswith(prefix) and data_script.endswith(');\n'), data_script
+    return json.loads(data_script[len(prefix):-len(');\n')])
+
+
+class TestRenderReport(TestCase):
+    url_statistic_list = [
+        {'url': '/api/v2/banner/25019908', 'count': 4, 'time_sum': 4.123, 'time_med': '1.282'},
+        {'url': '/api/1/photo/"quoted"', 'count': 1, 'time_sum': 0.5, 'time_med': '0.500'},
+    ]
+
+    def test_render_report_same_as_template_substitute(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            template_path = os.path.join(temp_dir, 'report.html')
+            with open(template_path, mode='w', encoding='utf-8') as template_file:
+                template_file.write('<p>$$price</p>\n<script>\nvar table = $table_json;\n'
+                                    'var other = ${table_json};\nvar $$el = $unknown;\n</script>\n')
+            report_filename = os.path.join(temp_dir, 'report-2017.06.30.html')
+            render_report(template_path, report_filename, iter(self.__class__.url_statistic_list))
+            with open(template_path, mode='r', encoding='utf-8') as template_file:
+                expected_report = Template(template_file.read()).safe_substitute(
+                    table_json=json.dumps(self.__class__.url_statistic_list))
+            with open(report_filename, mode='r', encoding='utf-8') as report_file:
+                self.assertEqual(report_file.read(), expected_report)
+            self.assertListEqual(sorted(os.listdir(temp_dir)),
+                                 ['report-2017.06.30.html', 'report.html'])
+
+    def test_render_report_empty_list(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            report_filename = os.path.join(temp_dir, 'report.html')
+            render_report(os.path.abspath('./data/templates/report.html'), report_filename, [])
+            with open(report_filename, mode='r', encoding='utf-8') as report_file:
+                self.assertIn('var table = [];\n', report_file.read())
+
+    def test_render_report_error_keeps_no_partial_report(self):
+        def broken_gen():
+            yield self.__class__.url_statistic_list[0]
+            raise ValueError('broken statistic')
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            report_filename = os.path.join(temp_dir, 'report.html')
+            with self.assertRaises(ValueError):
+                render_report(os.path.abspath('./data/templates/report.html'), report_filename,
+                              broken_gen())
+            self.assertListEqual(os.listdir(temp_dir), [])
+
+    def test_atomic_write_concurrent_writers(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            filename = os.path.join(temp_dir, 'metrics.json')
+            with atomic_write(filename) as first_file, atomic_write(filename) as second_file:
+                self.assertNotEqual(first_file.name, second_file.name)
+                first_file.write('first')
+                second_file.write('second')
+            with open(filename, mode='r', encoding='utf-8') as result_file:
+                self.assertEqual(result_file.read(), 'first')
+            self.assertListEqual(os.listdir(temp_dir), ['metrics.json'])
+            plain_filename = os.path.join(temp_dir, 'plain.json')
+            open(plain_filename, mode='w').close()
+            self.assertEqual(os.stat(filename).st_mode, os.stat(plain_filename).st_mode)
+
+    def test_atomic_write_keeps_replaced_file_mode(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            filename = os.path.join(temp_dir, 'report.html')
+            with atomic_write(filename) as report_file:
+                report_file.write('first')
+            os.chmod(filename, 0o640)
+            with atomic_write(filename) as report_file:
+                report_file.write('second')
+            self.assertEqual(os.stat(filename).st_mode & 0o777, 0o640)
+
+    def test_render_chunked_report(self):
+        url_statistic_list = [
+            {'url': '/api/{}'.format(url_no), 'count': url_no % 3,
+             'time_perc': '{}%'.format(url_no)}
+            for url_no in (5, 40, 7, 100, 2)
+        ]
+        with tempfile.TemporaryDirectory() as temp_dir:
+            report_filename = os.path.join(temp_dir, 'report-2017.06.30.html')
+            render_chunked_report(os.path.abspath('./data/templates/report_chunked.html'),
+                                  report_filename, iter(url_statistic_list), 2)
+            with open(report_filename, mode='r', encoding='utf-8') as report_file:
+                report_text = report_file.read()
+            self.assertNotIn('$report_index', report_text)
+            index = json.loads(report_text.split('var index = ', 1)[1].split(';\n', 1)[0])
+            self.assertTrue(index['data_dir'].startswith('report-2017.06.30.data.'))
+            self.assertListEqual(sorted(os.listdir(temp_dir)),
+                                 [index['data_dir'], 'report-2017.06.30.html'])
+            self.assertEqual(os.stat(os.path.join(temp_dir, index['data_dir'])).st_mode,
+                             os.stat(temp_dir).st_mode)
+            self.assertListEqual(index['columns'], ['url', 'count', 'time_perc'])
+            self.assertEqual(index['rows'], 5)
+            self.assertListEqual(index['chunks'], ['chunk-00000.js', 'chunk-00001.js',
+                                                   'chunk-00002.js'])
+            data_dir = os.path.join(temp_dir, index['data_dir'])
+            rows = []
+            for chunk_filename in index['chunks']:
+                rows.extend(load_report_data(os.path.join(data_dir, chunk_filename)))
+            self.assertListEqual(rows, [[url_statistic['url'], url_statistic['count'],
+                                         url_statistic['time_perc']]
+                                        for url_statistic in url_statistic_list])
+            self.assertListEqual(
+                load_report_data(os.path.join(data_dir, index['orderings']['time_perc'])),
+                [4, 0, 2, 1, 3])
+            self.assertListEqual(
+                load_report_data(os.path.join(data_dir, index['orderings']['count'])),
+                [1, 2, 3, 0, 4])
+            self.assertListEqual(
+                load_report_data(os.path.join(data_dir, index['orderings']['url'])),
+                [3, 4, 1, 0, 2])
+
+    def test_render_chunked_report_replaces_data(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            report_filename = os.path.join(temp_dir, 'report.html')
+            config_dict = {
+                'report_chunk_rows': 1,
+                'report_template_path': os.path.abspath('./data/templates/report.html'),
+                'report_chunked_template_path':
+                    os.path.abspath('./data/templates/report_chunked.html'),
+            }
+            write_report(config_dict, report_filename, self.__class__.url_statistic_list)
+            previous_data_path = read_report_data_path(report_filename)
+            write_report(config_dict, report_filename, self.__class__.url_statistic_list[:1])
+            data_path = read_report_data_path(report_filename)
+            self.assertNotEqual(data_path, previous_data_path)
+            self.assertListEqual(sorted(os.listdir(data_path)),
+                                 ['chunk-00000.js', 'order-00.js', 'order-01.js',
+                                  'order-02.js', 'order-03.js'])
+            self.assertListEqual(sorted(os.listdir(temp_dir)),
+                                 [os.path.basename(data_path), 'report.html'])
+
+    def test_render_chunked_report_error_keeps_previous_data(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            report_filename = os.path.join(temp_dir, 'report.html')
+            template_path = os.path.abspath('./data/templates/report_chunked.html')
+            render_chunked_report(template_path, report_filename,
+                                  self.__class__.url_statistic_list, 1)
+            data_path = read_report_data_path(report_filename)
+            with self.assertRaises(FileNotFoundError):
+                render_chunked_report(os.path.join(temp_dir, 'missing.html'), report_filename,
+                                      self.__class__.url_statistic_list, 1)
+            self.assertEqual(read_report_data_path(report_filename), data_path)
+            self.assertListEqual(sorted(os.listdir(temp_dir)),
+                                 [os.path.basename(data_path), 'report.html'])
+
+    def test_write_inline_report_removes_chunked_data(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            report_filename = os.path.join(temp_dir, 'report.html')
+            config_dict = {
+                'report_chunk_rows': 1,
+                'report_template_path': os.path.abspath('./data/templates/report.html'),
+                'report_chunked_template_path':
+                    os.path.abspath('./data/templates/report_chunked.html'),
+            }
+            write_report(config_dict, report_filename, self.__class__.url_statistic_list)
+            config_dict['report_chunk_rows'] = 0
+            write_report(config_dict, report_filename, self.__class__.url_statistic_list)
+            self.assertListEqual(os.listdir(temp_dir), ['report.html'])
@@ -0,0 +1,69 @@
+from unittest import TestCase
+from LogAnalyzer import RunMetrics, build_report, store_run_metrics
+from analyzer_config import load_test_config
+import gzip
+import json
+import os
+import shutil
+import tempfile
+
+
+class TestRunMetrics(TestCase):
+    test_log_filename = os.path.abspath('./data/tests/nginx-access-ui.log-20170630.log')
+
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.mkdtemp()
+        self.config_dict = load_test_config(
+            report_size=100,
+            log_parse_error_threshold=0.1,
+            metrics_path=os.path.join(self.temp_dir, 'metrics', 'analyzer_metrics.json'),
+            metrics_prometheus_path=os.path.join(self.temp_dir, 'log_analyzer.prom'),
+        )
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.temp_dir)
+
+    def test_build_report_metrics(self):
+        gzip_filename = os.path.join(self.temp_dir, 'nginx-access-ui.log-20170630.gz')
+        with open(self.__class__.test_log_filename, mode='rb') as log_file:
+            with gzip.open(gzip_filename, mode='wb') as gzip_file:
+                gzip_file.write(log_file.read())
+        run_metrics = RunMetrics()
+        build_report(self.config_dict, gzip_filename,
+                     os.path.join(self.temp_dir, 'report-2017.06.30.html'), run_metrics)
+        metrics_dict = run_metrics.to_dict()
+        self.assertEqual(metrics_dict['mode'], 'daily')
+        self.assertEqual(metrics_dict['status'], 'ok')
+        self.assertSetEqual(set(metrics_dict['stages_seconds']),
+                            {'parse_aggregate', 'decompress', 'sort', 'render'})
+        counters = metrics_dict['counters']
+        self.assertEqual(counters['bytes_read'], os.path.getsize(gzip_filename))
+        self.assertEqual(counters['lines'], 30)
+        self.assertEqual(counters['parse_errors'], 2)
+        self.assertEqual(counters['distinct_urls'], 25)
+        self.assertEqual(counters['reports_created'], 1)
+        self.assertGreater(counters['lines_per_second'], 0)
+
+    def test_store_run_metrics(self):
+        run_metrics = RunMetrics()
+        with run_metrics.stage('render'):
+            pass
+        with run_metrics.stage('render'):
+            pass
+        run_metrics.add('lines', 10)
+        run_metrics.add('lines', 20)
+        run_metrics.status = 'failed'
+        store_run_metrics(self.config_dict, run_metrics)
+        with open(self.config_dict['metrics_path'], mode='r', encoding='utf-8') as metrics_file:
+            metrics_dict = json.load(metrics_file)
+        self.assertEqual(metrics_dict['status'], 'failed')
+        self.assertListEqual(list(metrics_dict['stages_seconds']), ['render'])
+        self.assertEqual(metrics_dict['counters']['lines'], 30)
+        with open(self.config_dict['metrics_prometheus_path'], mode='r',
+                  encoding='utf-8') as prometheus_file:
+            prometheus_lines = prometheus_file.read().splitlines()
+        self.assertIn('log_analyzer_run_success{mode="daily"} 0', prometheus_lines)
+        self.assertIn('log_analyzer_lines{mode="daily"} 30', prometheus_lines)
+        self.assertTrue(any(line.startswith('log_analyzer_stage_seconds{mode="daily",'
+                                            'stage="render"} ') for line in prometheus_lines))
+        self.assertFalse(any(filename.endswith('.tmp') for filename in os.listdir(self.temp_dir)))
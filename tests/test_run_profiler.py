@@ -0,0 +1,60 @@
+from unittest import TestCase
+from LogAnalyzer import RunMetrics, RunProfiler, is_profiled_run, store_run_profile
+import os
+import pstats
+import tempfile
+import tracemalloc
+
+
+class TestRunProfiler(TestCase):
+    def test_run_profile_files(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            config_dict = {'internal_log_path': os.path.join(temp_dir, 'analyzer.log')}
+            run_metrics = RunMetrics()
+            run_metrics.profiler = RunProfiler(top_allocations=3)
+            run_metrics.profiler.start()
+            try:
+                with run_metrics.stage('aggregate'):
+                    request_times = [[float(value)] * 10 for value in range(1000)]
+                with run_metrics.stage('render'):
+                    pass
+            finally:
+                run_metrics.profiler.stop()
+            self.assertFalse(tracemalloc.is_tracing())
+            self.assertEqual(len(request_times), 1000)
+            self.assertListEqual([stage_name for stage_name, _, _ in
+                                  run_metrics.profiler.stage_allocations],
+                                 ['aggregate', 'render'])
+            self.assertIn('aggregate', run_metrics.stages)
+            store_run_profile(config_dict, run_metrics, run_metrics.profiler)
+
+            profile_filenames = sorted(os.listdir(temp_dir))
+            self.assertEqual(len(profile_filenames), 2)
+            alloc_filename, pstats_filename = profile_filenames
+            self.assertRegex(pstats_filename, r'^profile-[0-9]{8}-[0-9]{6}-daily\.pstats$')
+            self.assertEqual(alloc_filename, pstats_filename[:-len('.pstats')] + '.alloc.txt')
+            self.assertTrue(pstats.Stats(os.path.join(temp_dir, pstats_filename)).total_calls)
+            with open(os.path.join(temp_dir, alloc_filename), mode='r',
+                      encoding='utf-8') as alloc_file:
+                alloc_lines = alloc_file.read().splitlines()
+            stage_line_no = alloc_lines.index(
+                next(line for line in alloc_lines if line.startswith('stage aggregate:')))
+            self.assertIn('test_run_profiler.py', alloc_lines[stage_line_no + 1])
+            self.assertTrue(any(line.startswith('stage render:') for line in alloc_lines))
+
+    def test_is_profiled_run(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            config_dict = {'internal_log_path': os.path.join(temp_dir, 'analyzer.log'),
+                           'profile_every_nth_run': 0,
+                           'is_launch': True}
+            self.assertFalse(is_profiled_run(config_dict))
+            config_dict['profile_every_nth_run'] = 1
+            self.assertTrue(is_profiled_run(config_dict))
+            self.assertListEqual(os.listdir(temp_dir), [])
+
+            config_dict['profile_every_nth_run'] = 3
+            self.assertListEqual([is_profiled_run(config_dict) for _ in range(7)],
+                                 [True, False, False, True, False, False, True])
+            config_dict['is_launch'] = False
+            self.assertFalse(is_profiled_run(config_dict))
+            self.assertListEqual(os.listdir(temp_dir), ['profile_run_counter.json'])
@@ -0,0 +1,91 @@
+from unittest import TestCase
+from LogAnalyzer import LogRecordGen, TimeLocalBucketer, TimeBucketAggregate, \
+    create_report_dict, parallel_aggregate, iter_report_records, REPORT_FIELDS, TIME_BUCKET_FIELDS
+from analyzer_config import LOG_LINE_TEMPLATE
+import os
+import re
+import shutil
+import tempfile
+
+
+class TestTimeBuckets(TestCase):
+    test_log_filename = os.path.abspath('./data/tests/nginx-access-ui.log-20170630.log')
+    log_line_template = LOG_LINE_TEMPLATE
+
+    def setUp(self) -> None:
+        self.log_dir = tempfile.mkdtemp()
+        self.log_filename = os.path.join(self.log_dir, 'nginx-access-ui.log-20170630.log')
+        with open(self.__class__.test_log_filename, mode='rt', encoding='utf-8') as log_file:
+            log_lines = log_file.readlines()
+        with open(self.log_filename, mode='wt', encoding='utf-8') as log_file:
+            log_file.writelines(log_lines[:15])
+            log_file.writelines(line.replace('29/Jun/2017:03:50', '29/Jun/2017:04:05')
+                                for line in log_lines[15:])
+        self.log_line_regexp = re.compile(self.__class__.log_line_template)
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.log_dir)
+
+    def test_time_local_bucketer(self):
+        time_bucket = TimeLocalBucketer(60)
+        self.assertEqual(time_bucket('29/Jun/2017:03:50:22 +0300'), '2017-06-29 03:00')
+        self.assertEqual(time_bucket('29/Jun/2017:03:50:23 +0300'), '2017-06-29 03:00')
+        self.assertEqual(len(time_bucket.cache), 1)
+        self.assertEqual(TimeLocalBucketer(15)('29/Jun/2017:03:50:22 +0300'), '2017-06-29 03:45')
+        self.assertEqual(TimeLocalBucketer(1440)('29/Jun/2017:03:50:22 +0300'),
+                         '2017-06-29 00:00')
+        self.assertEqual(time_bucket('29/Foo/2017:03:50:22 +0300'), 'unknown')
+        self.assertEqual(time_bucket('-'), 'unknown')
+        with self.assertRaises(ValueError):
+            TimeLocalBucketer(0)
+
+    def test_time_bucket_report(self):
+        with LogRecordGen(self.log_filename, self.log_line_regexp, 0.1) as log_record_gen:
+            url_statistic_list = create_report_dict(log_record_gen, 100)
+        with LogRecordGen(self.log_filename, self.log_line_regexp, 0.1,
+                          fields=TIME_BUCKET_FIELDS) as log_record_gen:
+            bucket_statistic_list = create_report_dict(log_record_gen, 100,
+                                                       time_bucket_minutes=60)
+        self.assertListEqual([url_statistic['time_bucket'] for url_statistic
+                              in bucket_statistic_list],
+                             sorted(url_statistic['time_bucket'] for url_statistic
+                                    in bucket_statistic_list))
+        bucket_counts = dict()
+        for url_statistic in bucket_statistic_list:
+            bucket_counts[url_statistic['time_bucket']] = \
+                bucket_counts.get(url_statistic['time_bucket'], 0) + url_statistic['count']
+        self.assertDictEqual(bucket_counts, {'2017-06-29 03:00': 13, '2017-06-29 04:00': 15})
+        self.assertEqual(sum(bucket_counts.values()),
+                         sum(url_statistic['count'] for url_statistic in url_statistic_list))
+
+        with LogRecordGen(self.log_filename, self.log_line_regexp, 0.1,
+                          fields=TIME_BUCKET_FIELDS, use_mmap=True) as log_record_gen:
+            self.assertListEqual(create_report_dict(log_record_gen, 100, time_bucket_minutes=60),
+                                 bucket_statistic_list)
+
+    def test_time_bucket_parallel_aggregate(self):
+        with LogRecordGen(self.log_filename, self.log_line_regexp, 0.1,
+                          fields=TIME_BUCKET_FIELDS) as log_record_gen:
+            time_bucket_aggregate = TimeBucketAggregate(30)
+            time_bucket_aggregate.update(log_record_gen)
+        report_aggregate = parallel_aggregate(self.log_filename, self.log_line_regexp, 3,
+                                              time_bucket_minutes=30)
+        self.assertListEqual(report_aggregate.report_list(5), time_bucket_aggregate.report_list(5))
+        self.assertListEqual(report_aggregate.parse_errors_lines_list, [7, 11])
+        self.assertEqual(report_aggregate.get_urls_count(), 25)
+        sketch_aggregate = report_aggregate.to_sketch_aggregate(200)
+        self.assertEqual(sketch_aggregate.total_request_qty, 28)
+        self.assertEqual(sketch_aggregate.lines_count, 30)
+
+    def test_iter_report_records(self):
+        with LogRecordGen(self.log_filename, self.log_line_regexp, 0.1) as log_record_gen:
+            dict_records = list(iter_report_records(log_record_gen, TIME_BUCKET_FIELDS))
+        with LogRecordGen(self.log_filename, self.log_line_regexp, 0.1,
+                          fields=TIME_BUCKET_FIELDS) as log_record_gen:
+            tuple_records = list(iter_report_records(log_record_gen, TIME_BUCKET_FIELDS))
+        with LogRecordGen(self.log_filename, self.log_line_regexp, 0.1,
+                          fields=TIME_BUCKET_FIELDS) as log_record_gen:
+            report_records = list(iter_report_records(log_record_gen, REPORT_FIELDS))
+        self.assertEqual(len(dict_records), 28)
+        self.assertListEqual(tuple_records, dict_records)
+        self.assertListEqual(report_records, [record[:2] for record in dict_records])
@@ -0,0 +1,47 @@
+from unittest import TestCase
+from LogAnalyzer import UrlNormalizer, LogRecordGen, create_report_dict, \
+    URL_QUERY_STRIP, URL_QUERY_WHITELIST
+from analyzer_config import LOG_LINE_TEMPLATE
+import os
+import re
+
+
+class TestUrlNormalizer(TestCase):
+    test_log_filename = os.path.abspath('./data/tests/nginx-access-ui.log-20170630.log')
+    log_line_template = LOG_LINE_TEMPLATE
+
+    def test_replace_ids(self):
+        url_normalizer = UrlNormalizer()
+        self.assertEqual(url_normalizer('/api/v2/banner/25019354'), '/api/v2/banner/{id}')
+        self.assertEqual(url_normalizer('/api/v2/slot/4705/groups'), '/api/v2/slot/{id}/groups')
+        self.assertEqual(url_normalizer('/agency/3b81f63526fa8/'), '/agency/{id}/')
+        self.assertEqual(url_normalizer('/banner/6f1e3c50-5e3c-4e4b-9a4c-1c2b3d4e5f60'),
+                         '/banner/{id}')
+        self.assertEqual(url_normalizer('/export/2017-06-29/'), '/export/2017-06-29/')
+        self.assertIsNone(url_normalizer(None))
+
+    def test_query_modes(self):
+        url_line = '/api/1/photogenic_banners/list/?server_name=WIN7RB4&page=2'
+        self.assertEqual(UrlNormalizer(replace_ids=False)(url_line), url_line)
+        self.assertEqual(UrlNormalizer(query_mode=URL_QUERY_STRIP)(url_line),
+                         '/api/{id}/photogenic_banners/list/')
+        self.assertEqual(UrlNormalizer(query_mode=URL_QUERY_WHITELIST,
+                                       query_whitelist=['page'])(url_line),
+                         '/api/{id}/photogenic_banners/list/?page=2')
+
+    def test_rules_and_cache(self):
+        url_normalizer = UrlNormalizer(replace_ids=False, rules=[[r'^/api/v\d+/', '/api/']],
+                                       cache_size=2)
+        self.assertEqual(url_normalizer('/api/v2/banner/1'), '/api/banner/1')
+        url_normalizer('/api/v2/banner/2')
+        url_normalizer('/api/v2/banner/3')
+        self.assertLessEqual(len(url_normalizer.cache), 2)
+
+    def test_create_report_dict(self):
+        with LogRecordGen(self.__class__.test_log_filename,
+                          re.compile(self.__class__.log_line_template), 0.1) as log_record_gen:
+            url_statistic_list = create_report_dict(
+                log_record_gen, 100,
+                url_normalization={'query_mode': URL_QUERY_STRIP})
+        self.assertEqual(url_statistic_list[0]['url'], '/api/v2/banner/{id}')
+        self.assertEqual(url_statistic_list[0]['count'], 14)